@@ -0,0 +1,186 @@
+import heapq
+import itertools
+import threading
+import time
+from functools import wraps
+from typing import Callable, Dict, Optional, Tuple
+from flask import request, jsonify
+from config import Config
+from llm_client import LatencyTracker
+
+# Lower value = admitted first when requests queue for a concurrency slot
+PRIORITIES = {"chat": 0, "analyze": 1}
+
+BUCKET_IDLE_SEC = 600
+
+
+class TokenBucket:
+    def __init__(self, rate_per_sec: float, burst: float):
+        self.rate = rate_per_sec
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Consume one token; returns 0 on success or the seconds until a token is available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Per-client rate limits plus a global concurrency cap with a priority queue and load shedding"""
+
+    def __init__(self, max_concurrent: int = Config.ADMISSION_MAX_CONCURRENT,
+                 queue_target_sec: float = Config.ADMISSION_QUEUE_TARGET_SEC,
+                 rate_limits: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.max_concurrent = max_concurrent
+        self.queue_target_sec = queue_target_sec
+        # route class -> (requests per minute, burst)
+        self.rate_limits = rate_limits or {
+            "analyze": (Config.RATE_LIMIT_ANALYZE_PER_MIN, Config.RATE_LIMIT_ANALYZE_BURST),
+            "chat": (Config.RATE_LIMIT_CHAT_PER_MIN, Config.RATE_LIMIT_CHAT_BURST)
+        }
+        self.service_times = LatencyTracker()
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._buckets_lock = threading.Lock()
+        self._last_prune = time.monotonic()
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._counters = {"admitted": 0, "rate_limited": 0, "shed_early": 0, "shed_timeout": 0, "bypassed": 0}
+
+    def check_rate(self, route_class: str, client: str) -> float:
+        """Return 0 if the client is within its rate limit, else the seconds to wait"""
+        if route_class not in self.rate_limits:
+            return 0.0
+        per_minute, burst = self.rate_limits[route_class]
+        with self._buckets_lock:
+            self._prune_buckets()
+            bucket = self._buckets.get((route_class, client))
+            if bucket is None:
+                bucket = self._buckets[(route_class, client)] = TokenBucket(per_minute / 60.0, burst)
+            retry_after = bucket.take()
+        if retry_after:
+            self._count("rate_limited")
+        return retry_after
+
+    def _prune_buckets(self):
+        now = time.monotonic()
+        if now - self._last_prune < BUCKET_IDLE_SEC:
+            return
+        self._last_prune = now
+        for key in [k for k, b in self._buckets.items() if now - b.updated > BUCKET_IDLE_SEC]:
+            del self._buckets[key]
+
+    def _estimated_wait(self, ahead: int) -> float:
+        typical = self.service_times.percentile(50)
+        if typical is None:
+            return 0.0
+        return (ahead + 1) * typical / self.max_concurrent
+
+    def acquire(self, route_class: str) -> Optional[float]:
+        """Wait for a concurrency slot; returns the queue wait in seconds, or None if the request is shed"""
+        priority = PRIORITIES.get(route_class, len(PRIORITIES))
+        started = time.monotonic()
+        with self._cond:
+            if self._active < self.max_concurrent and not self._waiters:
+                self._active += 1
+                self._counters["admitted"] += 1
+                return 0.0
+
+            # Reject up front when the queue ahead of us already exceeds the latency target
+            ahead = sum(1 for waiter in self._waiters if waiter[0] <= priority)
+            if self._estimated_wait(ahead) > self.queue_target_sec:
+                self._counters["shed_early"] += 1
+                return None
+
+            entry = (priority, next(self._sequence))
+            heapq.heappush(self._waiters, entry)
+            deadline = started + self.queue_target_sec
+            while True:
+                if self._active < self.max_concurrent and self._waiters[0] is entry:
+                    heapq.heappop(self._waiters)
+                    self._active += 1
+                    self._counters["admitted"] += 1
+                    self._cond.notify_all()
+                    return time.monotonic() - started
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._counters["shed_timeout"] += 1
+                    self._cond.notify_all()
+                    return None
+                self._cond.wait(remaining)
+
+    def release(self, service_time: float):
+        self.service_times.record(service_time)
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def retry_after(self) -> int:
+        with self._cond:
+            queued = len(self._waiters)
+        return max(1, int(round(self._estimated_wait(queued) or self.queue_target_sec)))
+
+    def _count(self, name: str):
+        with self._cond:
+            self._counters[name] += 1
+
+    def stats(self) -> Dict[str, object]:
+        with self._cond:
+            return {
+                **self._counters,
+                "active": self._active,
+                "queued": len(self._waiters),
+                "max_concurrent": self.max_concurrent,
+                "queue_target_sec": self.queue_target_sec,
+                "service_time_sec": self.service_times.summary()
+            }
+
+    def guard(self, route_class: str, bypass: Optional[Callable[[], bool]] = None):
+        """Decorate a Flask view so it passes rate limiting and admission before running.
+
+        Requests for which bypass() is true run directly: they take no token or slot, and their
+        service time is not recorded, so they neither queue behind nor skew the LLM-bound requests."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if bypass is not None and bypass():
+                    self._count("bypassed")
+                    return view(*args, **kwargs)
+                retry_after = self.check_rate(route_class, client_key())
+                if retry_after:
+                    return _reject(429, "Too many requests. Please slow down.", retry_after)
+                if self.acquire(route_class) is None:
+                    return _reject(503, "The service is busy. Please try again shortly.", self.retry_after())
+                started = time.monotonic()
+                try:
+                    return view(*args, **kwargs)
+                finally:
+                    self.release(time.monotonic() - started)
+            return wrapper
+        return decorator
+
+
+def client_key() -> str:
+    if Config.ADMISSION_TRUST_FORWARDED:
+        forwarded = request.headers.get("X-Forwarded-For")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.remote_addr or "unknown"
+
+
+def _reject(status: int, message: str, retry_after: float):
+    # "response" is what the chat UI renders; "error" is what the analysis form shows
+    response = jsonify({"error": message, "response": message})
+    response.status_code = status
+    response.headers["Retry-After"] = str(max(1, int(round(retry_after + 0.5))))
+    return response
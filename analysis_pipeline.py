@@ -0,0 +1,85 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from typing import Any, Callable, Dict, List, Tuple
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Retrieval query for each risk area covered by the Risk Mirror report
+RISK_AREA_QUERIES = {
+    "finance": {
+        "liquidity": "emergency fund liquidity cash flow months of expenses",
+        "debt": "debt to income ratio credit borrowing repayment",
+        "investment": "investment risk tolerance asset allocation portfolio",
+        "income": "income stability job security career",
+        "retirement": "retirement savings planning 401k IRA"
+    },
+    "health": {
+        "cardiovascular": "heart disease blood pressure cholesterol smoking cardiovascular",
+        "metabolic": "BMI weight obesity metabolic health",
+        "lifestyle": "exercise physical activity fitness lifestyle",
+        "sleep": "sleep rest hours wellness",
+        "stress": "stress management mental health coping"
+    }
+}
+
+
+class AnalysisPipeline:
+    """Runs the independent stages of /analyze concurrently and keeps persistence off the request path"""
+
+    def __init__(self, kb, max_workers: int = Config.PIPELINE_MAX_WORKERS,
+                 persistence_workers: int = Config.PIPELINE_PERSISTENCE_WORKERS):
+        self.kb = kb
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline")
+        self._persistence_executor = ThreadPoolExecutor(max_workers=persistence_workers, thread_name_prefix="persist")
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def start_retrieval(self, domain: str, top_k: int = Config.RAG_TOP_K_PER_AREA) -> List[Future]:
+        """Retrieve the guidelines of every risk area of the domain in one batched lookup"""
+        queries = list(RISK_AREA_QUERIES.get(domain, {}).values())
+        if self.kb is None or not queries:
+            return []
+        return [self._executor.submit(self.kb.retrieve_many, queries, domain, top_k)]
+
+    def collect_retrieval(self, futures: List[Future],
+                          timeout: float = Config.RAG_RETRIEVAL_TIMEOUT_SEC) -> List[Dict[str, Any]]:
+        """Merge the retrieved documents in risk-area order, skipping duplicates and slow or failed lookups"""
+        done, not_done = wait(futures, timeout=timeout)
+        if not_done:
+            logger.warning(f"{len(not_done)} guideline retrievals exceeded {timeout}s; continuing without them")
+        documents = []
+        seen = set()
+        for future in futures:
+            if future not in done:
+                continue
+            try:
+                area_results = future.result()
+            except Exception as e:
+                logger.error(f"Guideline retrieval failed: {e}")
+                continue
+            for results in area_results:
+                for doc in results:
+                    if doc["_id"] not in seen:
+                        seen.add(doc["_id"])
+                        documents.append(doc)
+        return documents
+
+    def context_for_prompt(self, domain: str, documents: List[Dict[str, Any]]) -> Tuple[str, Dict[str, int]]:
+        if self.kb is None:
+            return "", {}
+        query = " ".join(RISK_AREA_QUERIES.get(domain, {}).values())
+        return self.kb.pack_documents_for_prompt(documents, query)
+
+    def persist(self, fn: Callable, *args, **kwargs) -> Future:
+        """Run a write in the background; failures are logged rather than surfaced to the request"""
+        future = self._persistence_executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(_log_persistence_error)
+        return future
+
+
+def _log_persistence_error(future: Future):
+    error = future.exception()
+    if error is not None:
+        logger.error(f"Background persistence failed: {error}")
@@ -0,0 +1,208 @@
+import re
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from pymongo import ASCENDING, ReplaceOne
+from pymongo.errors import PyMongoError
+from config import Config
+from risk_rules import CompiledRuleset, RiskRules
+
+logger = logging.getLogger(__name__)
+
+MIN_SCORE = 1.0
+MAX_SCORE = 10.0
+CATEGORY_KEYS = {"High Risk": "high", "Moderate Risk": "moderate", "Low Risk": "low"}
+UNRATED = "unrated"
+# Ruleset category comparisons as aggregation operators
+MONGO_COMPARISONS = {"lt": "$lt", "le": "$lte", "gt": "$gt", "ge": "$gte", "eq": "$eq"}
+
+
+def category_key(label: str) -> str:
+    """Rollup field name for a ruleset category label"""
+    return CATEGORY_KEYS.get(label) or re.sub(r"[^a-z0-9]+", "_", label.lower()).strip("_") or UNRATED
+
+
+def category_switch(ruleset: CompiledRuleset) -> Any:
+    """The ruleset's category ladder as an aggregation expression over $risk_score, first match wins"""
+    *bands, last = ruleset.category_bands
+    branches = []
+    for band in bands:
+        predicates = [(op, band[op]) for op in MONGO_COMPARISONS if op in band]
+        predicates += list(band.get("when", {}).get("score", {}).items())
+        branches.append({
+            "case": {"$and": [{MONGO_COMPARISONS[op]: ["$risk_score", operand]} for op, operand in predicates]},
+            "then": category_key(band["label"])
+        })
+    default = category_key(last["label"])
+    return {"$switch": {"branches": branches, "default": default}} if branches else default
+
+
+class RiskAnalytics:
+    """Maintains per-domain, per-day rollups of assessment risk scores.
+
+    Scores are counted under the category the domain's current ruleset gives them."""
+
+    def __init__(self, db, rules: RiskRules, bin_width: float = Config.ANALYTICS_BIN_WIDTH):
+        self.assessments_collection = db.assessments
+        self.rollups_collection = db.risk_rollups
+        self.rules = rules
+        self.bin_width = bin_width
+        self.num_bins = int(round((MAX_SCORE - MIN_SCORE) / bin_width))
+        # Rollups and rebuilds still work without the indexes, only slower
+        try:
+            self.rollups_collection.create_index([("domain", ASCENDING), ("day", ASCENDING)])
+            self.assessments_collection.create_index([("timestamp", ASCENDING)])
+        except PyMongoError as e:
+            logger.warning(f"Could not create the analytics indexes: {e}")
+
+    def _bin(self, score: float) -> int:
+        return max(0, min(int((score - MIN_SCORE) / self.bin_width), self.num_bins - 1))
+
+    def record_assessment(self, domain: str, risk_score: float, timestamp: Optional[datetime] = None):
+        """Fold one assessment into its day's rollup with a single upsert"""
+        timestamp = timestamp or datetime.now()
+        day = timestamp.strftime("%Y-%m-%d")
+        self.rollups_collection.update_one(
+            {"_id": f"{domain}:{day}"},
+            {
+                "$inc": {
+                    "count": 1,
+                    "sum_score": risk_score,
+                    f"histogram.{self._bin(risk_score)}": 1,
+                    f"categories.{category_key(self.rules.get(domain).category(risk_score))}": 1
+                },
+                "$min": {"min_score": risk_score},
+                "$max": {"max_score": risk_score},
+                "$set": {"domain": domain, "day": day, "bin_width": self.bin_width, "updated_at": datetime.now()}
+            },
+            upsert=True
+        )
+
+    def rebuild(self, since: Optional[datetime] = None) -> int:
+        """Recompute rollups from assessments with an aggregation pipeline; returns the number of days written"""
+        self.rules.maybe_reload()
+        category = {"$switch": {
+            "branches": [{"case": {"$eq": ["$domain", domain]}, "then": category_switch(ruleset)}
+                         for domain, ruleset in self.rules.rulesets.items()],
+            "default": UNRATED
+        }}
+        match = {"risk_score": {"$type": "number"}, "timestamp": {"$type": "date"}}
+        if since:
+            match["timestamp"]["$gte"] = since.replace(hour=0, minute=0, second=0, microsecond=0)
+        pipeline = [
+            {"$match": match},
+            {"$project": {
+                "domain": 1,
+                "risk_score": 1,
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+                "bin": {"$min": [
+                    self.num_bins - 1,
+                    {"$max": [0, {"$floor": {"$divide": [{"$subtract": ["$risk_score", MIN_SCORE]}, self.bin_width]}}]}
+                ]},
+                "category": category
+            }},
+            {"$group": {
+                "_id": {"domain": "$domain", "day": "$day", "bin": "$bin", "category": "$category"},
+                "count": {"$sum": 1},
+                "sum_score": {"$sum": "$risk_score"},
+                "min_score": {"$min": "$risk_score"},
+                "max_score": {"$max": "$risk_score"}
+            }}
+        ]
+
+        rollups = {}
+        for group in self.assessments_collection.aggregate(pipeline, allowDiskUse=True):
+            key = group["_id"]
+            rollup_id = f"{key['domain']}:{key['day']}"
+            rollup = rollups.setdefault(rollup_id, {
+                "_id": rollup_id,
+                "domain": key["domain"],
+                "day": key["day"],
+                "bin_width": self.bin_width,
+                "count": 0,
+                "sum_score": 0.0,
+                "min_score": group["min_score"],
+                "max_score": group["max_score"],
+                "histogram": {},
+                "categories": {},
+                "updated_at": datetime.now()
+            })
+            bin_key = str(int(key["bin"]))
+            rollup["count"] += group["count"]
+            rollup["sum_score"] += group["sum_score"]
+            rollup["min_score"] = min(rollup["min_score"], group["min_score"])
+            rollup["max_score"] = max(rollup["max_score"], group["max_score"])
+            rollup["histogram"][bin_key] = rollup["histogram"].get(bin_key, 0) + group["count"]
+            rollup["categories"][key["category"]] = rollup["categories"].get(key["category"], 0) + group["count"]
+
+        if rollups:
+            self.rollups_collection.bulk_write(
+                [ReplaceOne({"_id": rollup_id}, rollup, upsert=True) for rollup_id, rollup in rollups.items()],
+                ordered=False
+            )
+        logger.info(f"Rebuilt {len(rollups)} risk rollup documents")
+        return len(rollups)
+
+    def query(self, domain: Optional[str] = None, start_day: Optional[str] = None,
+              end_day: Optional[str] = None) -> Dict[str, Any]:
+        """Read the rollups for a day range and merge them into a dashboard summary"""
+        query = {}
+        if domain:
+            query["domain"] = domain
+        if start_day or end_day:
+            query["day"] = {}
+            if start_day:
+                query["day"]["$gte"] = start_day
+            if end_day:
+                query["day"]["$lte"] = end_day
+        days = list(self.rollups_collection.find(query, {"_id": 0, "updated_at": 0}).sort("day", ASCENDING))
+
+        for day in days:
+            day["mean_score"] = day["sum_score"] / day["count"] if day.get("count") else None
+        return {
+            "days": days,
+            "summary": self._merge(days)
+        }
+
+    def _merge(self, days: List[Dict[str, Any]]) -> Dict[str, Any]:
+        count = sum(day.get("count", 0) for day in days)
+        histogram = [0] * self.num_bins
+        categories = {key: 0 for key in CATEGORY_KEYS.values()}
+        for day in days:
+            for bin_key, bin_count in day.get("histogram", {}).items():
+                histogram[int(bin_key)] += bin_count
+            for category, category_count in day.get("categories", {}).items():
+                categories[category] = categories.get(category, 0) + category_count
+        min_score = min((day["min_score"] for day in days if "min_score" in day), default=None)
+        max_score = max((day["max_score"] for day in days if "max_score" in day), default=None)
+        return {
+            "count": count,
+            "mean_score": sum(day.get("sum_score", 0) for day in days) / count if count else None,
+            "min_score": min_score,
+            "max_score": max_score,
+            "categories": categories,
+            "histogram": [
+                {"from": MIN_SCORE + i * self.bin_width, "to": MIN_SCORE + (i + 1) * self.bin_width, "count": n}
+                for i, n in enumerate(histogram)
+            ],
+            "percentiles": {f"p{p}": self._percentile(histogram, count, p, min_score, max_score)
+                            for p in (50, 90, 95, 99)}
+        }
+
+    def _percentile(self, histogram: List[int], count: int, p: float,
+                    low: Optional[float] = None, high: Optional[float] = None) -> Optional[float]:
+        """Estimate a percentile by linear interpolation inside the histogram bin that contains it.
+
+        The estimate is clamped to the observed [low, high] range, since a bin is wider than its scores."""
+        if not count:
+            return None
+        low = MIN_SCORE if low is None else low
+        high = MAX_SCORE if high is None else high
+        target = count * p / 100
+        cumulative = 0
+        for i, bin_count in enumerate(histogram):
+            if bin_count and cumulative + bin_count >= target:
+                fraction = (target - cumulative) / bin_count
+                return round(min(max(MIN_SCORE + (i + fraction) * self.bin_width, low), high), 3)
+            cumulative += bin_count
+        return high
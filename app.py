@@ -1,33 +1,75 @@
-from flask import Flask, render_template_string, request, jsonify
+from flask import Flask, render_template_string, request, jsonify, Response, stream_with_context
 from ai21 import AI21Client
 from ai21.models.chat import ChatMessage
 import os
+import time
 from dotenv import load_dotenv
 from pymongo import MongoClient
-from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime, timedelta
+from config import Config
+from llm_client import ResilientLLM, LLMUnavailableError
+from report_generator import generate_report, REPORT_TEMPLATES
+from model_router import ModelRouter
+from whatif import evaluate_whatif
+from risk_rules import RiskRules
+from analytics import RiskAnalytics
+from export import export_fields, stream_export
+from analysis_pipeline import AnalysisPipeline
+from index_snapshot import build_snapshot, SnapshotBusyError
+from admission import AdmissionController
+from chat_store import ChatStore
+from serialization import FastJSONProvider, stream_json_list, accepts_gzip, gzip_chunks
+import database
+
+try:
+    from knowledge_base import kb
+except Exception as e:
+    print(f"Knowledge base unavailable, analyses will not be grounded: {str(e)}")
+    kb = None
 
 # Load environment variables from .env file
 load_dotenv()
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 
-# Initialize AI21 client
-client = AI21Client(api_key=os.getenv("AI21_API_KEY"))
+# Initialize AI21 client behind deadlines, hedging and a circuit breaker
+client = AI21Client(
+    api_key=os.getenv("AI21_API_KEY"),
+    api_host=Config.AI21_API_HOST,
+    timeout_sec=Config.LLM_TIMEOUT_SEC,
+    num_retries=0
+)
+llm = ResilientLLM(client)
+router = ModelRouter()
 
 # Initialize MongoDB
 mongo_client = MongoClient(os.getenv("MONGODB_URL"))
 db = mongo_client[os.getenv("DB_NAME")]
 assessments_collection = db.assessments
 users_collection = db.users
+risk_rules = RiskRules()
+analytics = RiskAnalytics(db, risk_rules)
+export_sources = database.export_sources(db)
+try:
+    database.ensure_export_indexes(export_sources.values())
+except Exception as e:
+    # Exports still work without the indexes, only slower
+    print(f"Could not create export indexes: {str(e)}")
+chat_store = ChatStore(db)
+pipeline = AnalysisPipeline(kb)
+admission = AdmissionController()
+
+# Per-process health counters, reset in each forked worker
+worker_state = {"started_at": time.time(), "requests": 0}
+
+def _reset_worker_state():
+    worker_state["started_at"] = time.time()
+    worker_state["requests"] = 0
 
-# Global chat context for the session
-chat_context = {
-    "domain": None,
-    "personal_data": None,
-    "messages": [],
-    "user_id": None,
-    "assessment_id": None
-}
+os.register_at_fork(after_in_child=_reset_worker_state)
 
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -450,6 +492,7 @@ HTML_TEMPLATE = """
             document.getElementById('health-form').style.display = 'none';
             document.getElementById(domain + '-form').style.display = 'block';
         }
+        let assessmentId = null;
         function submitForm(event, domain) {
             event.preventDefault();
             const formData = {};
@@ -474,6 +517,7 @@ HTML_TEMPLATE = """
                 if (data.error) {
                     alert('Error: ' + data.error);
                 } else {
+                    assessmentId = data.assessment_id;
                     document.getElementById(domain + '-form').style.display = 'none';
                     document.getElementById('chat-container').style.display = 'block';
                     addBotMessage(data.analysis);
@@ -497,7 +541,7 @@ HTML_TEMPLATE = """
                 fetch('/chat', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ message: message })
+                    body: JSON.stringify({ message: message, assessment_id: assessmentId })
                 })
                 .then(response => response.json())
                 .then(data => { addBotMessage(data.response); })
@@ -534,6 +578,7 @@ HTML_TEMPLATE = """
             chat.scrollTop = chat.scrollHeight;
         }
         function backToMenu() {
+            assessmentId = null;
             document.getElementById('chat-messages').innerHTML = '';
             document.getElementById('chat-container').style.display = 'none';
             document.getElementById('main-menu').style.display = 'block';
@@ -556,95 +601,60 @@ HTML_TEMPLATE = """
 </html>
 """
 
-def calculate_financial_risk_score(data):
-    score = 5.0 # base
+def persist_assessment(assessment_data, previous_user_future):
+    assessments_collection.insert_one(assessment_data)
     try:
-        age = int(data.get('age', 35))
-        if age < 30: score += 0.5
-        elif age > 55: score -= 0.5
-        income = float(data.get('income', 0))
-        expenses = float(data.get('monthly_expenses', 0)) * 12
-        if income > 0 and expenses > 0:
-            ratio = expenses / income
-            if ratio > 0.8: score += 1.0
-            elif ratio < 0.5: score -= 0.5
-        emergency_fund = float(data.get('emergency_fund', 0))
-        monthly_expenses = float(data.get('monthly_expenses', 0))
-        if monthly_expenses > 0:
-            months_covered = emergency_fund / monthly_expenses
-            if months_covered < 3: score += 1.0
-            elif months_covered > 6: score -= 0.5
-        liabilities = float(data.get('liabilities', 0))
-        if income > 0:
-            debt_ratio = liabilities / income
-            if debt_ratio > 0.4: score += 1.0
-            elif debt_ratio < 0.2: score -= 0.3
-        tolerance = data.get('tolerance', 'moderate')
-        time_horizon = int(data.get('time_horizon', 10))
-        if tolerance == 'aggressive' and time_horizon < 5: score += 0.8
-        elif tolerance == 'conservative' and time_horizon > 20: score += 0.3
-        savings_rate = float(data.get('savings_rate', 10))
-        if savings_rate < 10: score += 0.7
-        elif savings_rate > 20: score -= 0.5
-    except (ValueError, TypeError):
-        pass
-    return max(1.0, min(10.0, score))
-
-def calculate_health_risk_score(data):
-    score = 5.0
+        analytics.record_assessment(assessment_data["domain"], assessment_data["risk_score"], assessment_data["timestamp"])
+    except Exception as e:
+        print(f"Analytics rollup error: {str(e)}")
+    user_data_doc = {
+        "user_id": assessment_data["user_id"],
+        "name": assessment_data["personal_data"].get('name', ''),
+        "domain": assessment_data["domain"],
+        "created_at": datetime.now(),
+        "last_assessment": str(assessment_data["_id"])
+    }
     try:
-        height = float(data.get('height', 170)) / 100
-        weight = float(data.get('weight', 70))
-        bmi = weight / (height ** 2)
-        if bmi < 18.5 or bmi > 30: score += 1.5
-        elif bmi > 25: score += 0.8
-        elif 18.5 <= bmi <= 24.9: score -= 0.5
-        age = int(data.get('age', 35))
-        if age > 65: score += 1.0
-        elif age > 50: score += 0.5
-        elif age < 30: score -= 0.3
-        exercise = data.get('exercise', 'none')
-        if exercise == 'none': score += 1.2
-        elif exercise == 'light': score += 0.3
-        elif exercise in ['moderate','heavy']: score -= 0.5
-        smoking = data.get('smoking', 'never')
-        if smoking == 'regular': score += 2.0
-        elif smoking == 'occasional': score += 1.0
-        elif smoking == 'former': score += 0.3
-        alcohol = data.get('alcohol', 'none')
-        if alcohol == 'heavy': score += 1.0
-        elif alcohol == 'moderate': score += 0.3
-        stress = int(data.get('stress', 5))
-        if stress >= 8: score += 1.0
-        elif stress >= 6: score += 0.5
-        elif stress <= 3: score -= 0.3
-        sleep = float(data.get('sleep', 7))
-        if sleep < 6 or sleep > 9: score += 0.8
-        elif 7 <= sleep <= 8: score -= 0.3
-        family_history = data.get('family_history', 'none')
-        if family_history == 'multiple': score += 1.0
-        elif family_history in ['heart','diabetes','cancer']: score += 0.5
-        diet = data.get('diet', 'average')
-        if diet == 'poor': score += 0.8
-        elif diet == 'excellent': score -= 0.5
-    except (ValueError, TypeError):
-        pass
-    return max(1.0, min(10.0, score))
+        previous_user = previous_user_future.result()
+        if previous_user:
+            user_data_doc["previous_assessment"] = previous_user.get("last_assessment")
+    except Exception as e:
+        print(f"User lookup error: {str(e)}")
+    users_collection.insert_one(user_data_doc)
 
 @app.route('/')
 def home():
     return render_template_string(HTML_TEMPLATE)
 
+def fast_mode_requested():
+    """mode=fast analyses are answered from the template report without calling the LLM"""
+    body = request.get_json(silent=True)
+    return isinstance(body, dict) and body.get('mode') == 'fast'
+
 @app.route('/analyze', methods=['POST'])
+@admission.guard("analyze", bypass=fast_mode_requested)
 def analyze():
     try:
         data = request.json
         domain = data['domain']
         personal_data = data['data']
+        if domain not in risk_rules.rulesets:
+            return jsonify({"error": f"Unknown domain: {domain}"}), 400
+        if domain not in REPORT_TEMPLATES:
+            # A ruleset file alone makes a domain scorable, not describable: /whatif serves it
+            return jsonify({"error": f"No analysis report is available for domain '{domain}'; use /whatif to score it"}), 400
         user_id = f"{personal_data.get('name', 'user')}_{int(datetime.now().timestamp())}"
+        # Stage 1: guideline retrieval for every risk area and the user lookup run while the score is computed
+        retrieval_futures = pipeline.start_retrieval(domain)
+        previous_user_future = pipeline.submit(
+            users_collection.find_one,
+            {"name": personal_data.get('name', ''), "domain": domain},
+            sort=[("created_at", -1)]
+        )
+        ruleset = risk_rules.get(domain)
+        risk_score = ruleset.score(personal_data)
+        risk_category = ruleset.category(risk_score)
         if domain == 'finance':
-            risk_score = calculate_financial_risk_score(personal_data)
-            risk_category = "High Risk" if risk_score > 7 else "Moderate Risk" if risk_score > 4 else "Low Risk"
             system_prompt = f"""You are an elite financial risk assessment expert working for MUFG's GenAI division.
 
 Analyze the following personal financial data and provide a comprehensive "Risk Mirror" report that includes:
@@ -675,9 +685,7 @@ Analyze the following personal financial data and provide a comprehensive "Risk
 - Financial technology integration suggestions
 
 Present this as a professional, comprehensive financial analysis leveraging MUFG's expertise in wealth management and risk assessment. Be specific with numbers and actionable recommendations."""
-        else:
-            risk_score = calculate_health_risk_score(personal_data)
-            risk_category = "High Risk" if risk_score > 7 else "Moderate Risk" if risk_score > 4 else "Low Risk"
+        elif domain == 'health':
             system_prompt = f"""You are an elite health risk assessment expert working for MUFG's GenAI wellness division.
 
 Analyze the following personal health data and provide a comprehensive "Risk Mirror" report that includes:
@@ -708,89 +716,332 @@ Analyze the following personal health data and provide a comprehensive "Risk Mir
 - Corporate wellness program integration
 
 Present this as a professional, comprehensive health analysis leveraging MUFG's commitment to employee and client wellness. Include specific, actionable health recommendations."""
-        chat_context['domain'] = domain
-        chat_context['personal_data'] = personal_data
-        chat_context['messages'] = []
-        chat_context['user_id'] = user_id
+        # Stage 2: ground the prompt in the retrieved guidelines
+        documents = pipeline.collect_retrieval(retrieval_futures)
+        guideline_context, context_stats = pipeline.context_for_prompt(domain, documents)
+        # The packer returns a placeholder when nothing fits; only real guidelines ground the prompt
+        has_context = context_stats.get("documents_used", 0) > 0
+        if has_context:
+            system_prompt += f"\n\n{guideline_context}"
         user_data_text = "\n".join([f"📋 {k.replace('_', ' ').title()}: {v}" for k, v in personal_data.items() if v])
         messages = [
             ChatMessage(role="system", content=system_prompt),
             ChatMessage(role="user", content=f"Please analyze my {domain} profile:\n\n{user_data_text}")
         ]
-        response = client.chat.completions.create(
-            messages=messages,
-            model="jamba-large",
-            max_tokens=2048,
-            temperature=0.7
-        )
-        analysis = response.choices[0].message.content
-        chat_context['messages'] = messages
-        chat_context['messages'].append(ChatMessage(role="assistant", content=analysis))
+        # mode=fast answers instantly from the template report; the LLM narrative can be requested later
+        report_source = "llm"
+        if data.get('mode') == 'fast':
+            analysis, _ = generate_report(domain, personal_data, risk_score, risk_category, documents)
+            report_source = "template"
+        else:
+            try:
+                decision = router.route("analyze", domain=domain)
+                started = time.perf_counter()
+                response = llm.create(
+                    messages=messages,
+                    model=decision.model,
+                    max_tokens=decision.max_tokens,
+                    temperature=0.7
+                )
+                router.record(decision, time.perf_counter() - started, response)
+                analysis = response.choices[0].message.content
+            except LLMUnavailableError as e:
+                if not Config.REPORT_FALLBACK_ENABLED:
+                    raise
+                print(f"Analysis degraded to template report: {str(e)}")
+                analysis, _ = generate_report(domain, personal_data, risk_score, risk_category, documents)
+                report_source = "fallback"
+        messages.append(ChatMessage(role="assistant", content=analysis))
+        assessment_id = ObjectId()
         assessment_data = {
+            "_id": assessment_id,
             "user_id": user_id,
             "domain": domain,
             "personal_data": personal_data,
             "risk_score": risk_score,
             "analysis": analysis,
-            "timestamp": datetime.now(),
-            "chat_history": []
+            "report_source": report_source,
+            "guidelines": [doc['title'] for doc in documents],
+            "timestamp": datetime.now()
         }
-        result = assessments_collection.insert_one(assessment_data)
-        chat_context['assessment_id'] = str(result.inserted_id)
-        user_data_doc = {
-            "user_id": user_id,
-            "name": personal_data.get('name', ''),
-            "domain": domain,
-            "created_at": datetime.now(),
-            "last_assessment": str(result.inserted_id)
-        }
-        users_collection.insert_one(user_data_doc)
-        return jsonify({"analysis": analysis, "risk_score": risk_score})
+        # Stage 3: persist in the background so the response does not wait on the writes
+        pipeline.persist(persist_assessment, assessment_data, previous_user_future)
+        # Follow-ups can land on any worker, so the chat session is stored rather than kept in this process.
+        # Chat turns answer from this prompt, so they are grounded only if guidelines were packed into it
+        try:
+            chat_store.start_session(
+                assessment_id, domain,
+                [{"role": message.role, "content": message.content} for message in messages],
+                has_context
+            )
+        except Exception as e:
+            print(f"Chat session error: {str(e)}")
+        return jsonify({
+            "assessment_id": str(assessment_id),
+            "analysis": analysis,
+            "risk_score": risk_score,
+            "report_source": report_source,
+            "guidelines": assessment_data["guidelines"]
+        })
+    except LLMUnavailableError as e:
+        print(f"Analysis error: {str(e)}")
+        return jsonify({"error": "The analysis service is temporarily unavailable. Please try again shortly."}), 503
     except Exception as e:
         print(f"Analysis error: {str(e)}")
         return jsonify({"error": f"Analysis failed: {str(e)}"}), 500
 
 @app.route('/chat', methods=['POST'])
+@admission.guard("chat")
 def chat():
+    data = request.get_json(silent=True) or {}
+    user_message = data.get('message')
+    assessment_id = data.get('assessment_id')
+    if not user_message or not assessment_id:
+        return jsonify({"response": "Please run an analysis before asking follow-up questions."}), 400
     try:
-        user_message = request.json['message']
-        chat_context['messages'].append(ChatMessage(role="user", content=user_message))
-        response = client.chat.completions.create(
-            messages=chat_context['messages'],
-            model="jamba-large",
-            max_tokens=1024,
+        session = chat_store.load_session(assessment_id)
+        if session is None:
+            return jsonify({"response": "This analysis has no chat session. Please run the analysis again."}), 404
+        messages = [ChatMessage(role=message['role'], content=message['content']) for message in session['messages']]
+        for turn in session['turns']:
+            messages.append(ChatMessage(role="user", content=turn['user_message']))
+            messages.append(ChatMessage(role="assistant", content=turn['bot_response']))
+        messages.append(ChatMessage(role="user", content=user_message))
+        decision = router.route(
+            "chat",
+            message=user_message,
+            domain=session['domain'],
+            has_context=session['has_context']
+        )
+        started = time.perf_counter()
+        response = llm.create(
+            messages=messages,
+            model=decision.model,
+            max_tokens=decision.max_tokens,
             temperature=0.7
         )
+        router.record(decision, time.perf_counter() - started, response)
         bot_response = response.choices[0].message.content
-        chat_context['messages'].append(ChatMessage(role="assistant", content=bot_response))
-        if chat_context.get('assessment_id'):
-            assessments_collection.update_one(
-                {"_id": chat_context['assessment_id']},
-                {
-                    "$push": {
-                        "chat_history": {
-                            "user_message": user_message,
-                            "bot_response": bot_response,
-                            "timestamp": datetime.now()
-                        }
-                    }
-                }
-            )
+        # Stored before responding: the next turn may be served by another worker and reads its history from here
+        try:
+            chat_store.append_turn(assessment_id, user_message, bot_response, datetime.now())
+        except Exception as e:
+            print(f"Chat history error: {str(e)}")
         return jsonify({"response": bot_response})
+    except InvalidId:
+        return jsonify({"response": "Unknown analysis. Please run the analysis again."}), 400
+    except LLMUnavailableError as e:
+        print(f"Chat error: {str(e)}")
+        return jsonify({"response": "I'm having trouble reaching the analysis service right now. Please try again in a moment."}), 503
     except Exception as e:
         print(f"Chat error: {str(e)}")
         return jsonify({"response": f"I apologize, but I encountered an error: {str(e)}. Please try rephrasing your question."})
 
+@app.route('/chat/history/<assessment_id>')
+def get_chat_history(assessment_id):
+    try:
+        before = request.args.get('before')
+        page = chat_store.get_turns(
+            assessment_id,
+            limit=min(request.args.get('limit', 20, type=int), 200),
+            before=datetime.fromisoformat(before) if before else None
+        )
+        return jsonify(page)
+    except (InvalidId, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/whatif', methods=['POST'])
+def whatif():
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            raise ValueError("expected a JSON object body")
+        result = evaluate_whatif(risk_rules.get(data['domain']), data.get('data', {}), data['sweep'])
+        return jsonify(result)
+    except (KeyError, ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid what-if request: {str(e)}"}), 400
+    except Exception as e:
+        print(f"What-if error: {str(e)}")
+        return jsonify({"error": f"What-if failed: {str(e)}"}), 500
+
 @app.route('/history/<user_id>')
 def get_user_history(user_id):
     try:
-        assessments = list(assessments_collection.find(
+        assessments = assessments_collection.find(
             {"user_id": user_id},
-            {"_id": 1, "domain": 1, "risk_score": 1, "timestamp": 1}
-        ).sort("timestamp", -1))
-        return jsonify({"history": assessments})
+            {"_id": 1, "domain": 1, "risk_score": 1, "timestamp": 1},
+            batch_size=Config.EXPORT_BATCH_SIZE
+        ).sort("timestamp", -1)
+        return stream_json_list("history", assessments)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/export/history')
+def export_history():
+    try:
+        export_format = request.args.get('format', 'ndjson')
+        source = request.args.get('source', 'analyses')
+        if source not in export_sources:
+            raise ValueError(f"Unknown export source: {source}")
+        start = request.args.get('start')
+        end = request.args.get('end')
+        fields = export_fields(export_format, request.args.get('fields'))
+        compress = request.args.get('gzip', 'false').lower() in ('1', 'true')
+        docs = database.iter_analysis_history(
+            export_sources[source],
+            domain=request.args.get('domain'),
+            user_id=request.args.get('user_id'),
+            start=datetime.fromisoformat(start) if start else None,
+            end=datetime.fromisoformat(end) if end else None,
+            fields=fields
+        )
+        body = stream_export(docs, export_format, fields, compress)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    mimetype = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    filename = f"{source}_export.{export_format}"
+    headers = {"Vary": "Accept-Encoding"}
+    if compress:
+        mimetype = "application/gzip"
+        filename += ".gz"
+    elif accepts_gzip():
+        # Transparent transfer compression; the client still saves the plain file
+        body = gzip_chunks(body)
+        headers["Content-Encoding"] = "gzip"
+    headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers=headers
+    )
+
+@app.before_request
+def count_request():
+    worker_state["requests"] += 1
+
+@app.route('/healthz')
+def healthz():
+    return jsonify({
+        "status": "ok",
+        "pid": os.getpid(),
+        "uptime_sec": round(time.time() - worker_state["started_at"], 1),
+        "requests": worker_state["requests"],
+        "knowledge_base": kb is not None,
+        "embedding_model": bool(kb is not None and kb.embedding_model is not None),
+        "llm_breaker": llm.breaker.state
+    })
+
+@app.route('/analytics/risk')
+def get_risk_analytics():
+    try:
+        return jsonify(analytics.query(
+            domain=request.args.get('domain'),
+            start_day=request.args.get('start'),
+            end_day=request.args.get('end')
+        ))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/admin/analytics/rebuild', methods=['POST'])
+def rebuild_risk_analytics():
+    try:
+        days = request.args.get('days', type=int)
+        since = datetime.now() - timedelta(days=days) if days else None
+        return jsonify({"rollups_written": analytics.rebuild(since)})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/admin/index/snapshot', methods=['POST'])
+def build_index_snapshot():
+    if kb is None:
+        return jsonify({"error": "Knowledge base unavailable"}), 503
+    try:
+        version = build_snapshot(kb.embeddings_collection, model_name=Config.EMBEDDING_MODEL)
+        return jsonify({"version": version})
+    except SnapshotBusyError as e:
+        return jsonify({"error": str(e)}), 409
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/admin/add_document', methods=['POST'])
+def add_document():
+    if kb is None:
+        return jsonify({"error": "Knowledge base unavailable"}), 503
+    try:
+        data = request.json
+        doc_id = kb.add_document(data['domain'], data['title'], data['content'], data['category'], data.get('tags', []))
+        return jsonify({"document_id": str(doc_id)}), 201
+    except KeyError as e:
+        return jsonify({"error": f"Missing field: {e.args[0]}"}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/admin/documents/<document_id>', methods=['PUT'])
+def update_document(document_id):
+    if kb is None:
+        return jsonify({"error": "Knowledge base unavailable"}), 503
+    try:
+        data = request.json or {}
+        fields = {k: data[k] for k in ('title', 'content', 'category', 'tags') if k in data}
+        if not fields:
+            return jsonify({"error": "Nothing to update"}), 400
+        if not kb.update_document(document_id, **fields):
+            return jsonify({"error": "Document not found"}), 404
+        return jsonify({"document_id": document_id, "updated": sorted(fields)})
+    except InvalidId as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/admin/documents/<document_id>', methods=['DELETE'])
+def delete_document(document_id):
+    if kb is None:
+        return jsonify({"error": "Knowledge base unavailable"}), 503
+    try:
+        if not kb.delete_document(document_id):
+            return jsonify({"error": "Document not found"}), 404
+        return jsonify({"document_id": document_id, "deleted": True})
+    except InvalidId as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/admin/index/compact', methods=['POST'])
+def compact_index():
+    if kb is None or kb.live_index is None:
+        return jsonify({"error": "Index sync disabled"}), 503
+    try:
+        return jsonify(kb.live_index.compact())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/admin/index/sync_stats')
+def get_index_sync_stats():
+    if kb is None or kb.live_index is None:
+        return jsonify({"error": "Index sync disabled"}), 503
+    return jsonify(kb.live_index.stats())
+
+@app.route('/admin/llm_stats')
+def get_llm_stats():
+    return jsonify(llm.stats())
+
+@app.route('/admin/admission_stats')
+def get_admission_stats():
+    return jsonify(admission.stats())
+
+@app.route('/admin/routing_stats')
+def get_routing_stats():
+    return jsonify(router.summary())
+
+@app.route('/admin/risk_rules')
+def get_risk_rules():
+    return jsonify(risk_rules.summary())
+
+@app.route('/admin/risk_rules/reload', methods=['POST'])
+def reload_risk_rules():
+    return jsonify({"reloaded": risk_rules.maybe_reload(force=True), "rules": risk_rules.summary()})
+
 if __name__ == "__main__":
     app.run(debug=True, use_reloader=False, host='0.0.0.0', port=5000)
@@ -0,0 +1,218 @@
+import time
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Per-category centroids and keyword profiles for two-stage retrieval: a query is first routed to
+# the few categories of its domain whose centroid (or keyword profile) matches it best, and only
+# the documents in those partitions are ranked.
+
+
+def select_categories(ranked: List[Tuple[float, str, int]], route_categories: int,
+                      min_candidates: int) -> Optional[List[str]]:
+    """Pick the categories to search from (score, category, doc_count) tuples.
+
+    Takes the route_categories best, then keeps adding the next best until the partitions hold
+    at least min_candidates documents. Returns None when routing would not narrow the search."""
+    if route_categories <= 0 or len(ranked) <= route_categories:
+        return None
+    ranked = sorted(ranked, key=lambda entry: entry[0], reverse=True)
+    selected = []
+    candidates = 0
+    for score, category, count in ranked:
+        if len(selected) >= route_categories and candidates >= min_candidates:
+            break
+        selected.append(category)
+        candidates += count
+    return selected if len(selected) < len(ranked) else None
+
+
+def keyword_route_score(query_keywords: Set[str], keyword_counts: Dict[str, int], doc_count: int) -> float:
+    """Expected keyword overlap between the query and a document of the category"""
+    if not doc_count:
+        return 0.0
+    return sum(keyword_counts.get(keyword, 0) for keyword in query_keywords) / doc_count
+
+
+def route_by_keywords(profiles: List[Tuple[str, int, Dict[str, int], int]], query_keywords: Set[str],
+                      route_categories: int, min_candidates: int) -> Optional[List[str]]:
+    """Keyword routing over (category, doc_count, keyword_counts, keyword_docs) profiles"""
+    if route_categories <= 0:
+        return None
+    # Categories sharing no keyword with the query cannot contribute a match
+    ranked = [(keyword_route_score(query_keywords, counts, docs), category, count)
+              for category, count, counts, docs in profiles]
+    ranked = [entry for entry in ranked if entry[0] > 0]
+    if not ranked:
+        return []
+    selected = select_categories(ranked, route_categories, min_candidates) or [c for _, c, _ in ranked]
+    return selected if len(selected) < len(profiles) else None
+
+
+class CategoryStats:
+    """Running totals of one (domain, category) partition: document counts, embedding sum, keyword counts"""
+
+    __slots__ = ("count", "embedded", "vector_sum", "keyword_counts", "keyword_docs")
+
+    def __init__(self):
+        self.count = 0
+        self.embedded = 0
+        self.vector_sum: Optional[np.ndarray] = None
+        self.keyword_counts: Dict[str, int] = {}
+        self.keyword_docs = 0
+
+    def copy(self) -> "CategoryStats":
+        other = CategoryStats()
+        other.count, other.embedded, other.keyword_docs = self.count, self.embedded, self.keyword_docs
+        other.vector_sum = None if self.vector_sum is None else self.vector_sum.copy()
+        other.keyword_counts = dict(self.keyword_counts)
+        return other
+
+    def add(self, vector: Optional[np.ndarray], keywords: Optional[Set[str]], sign: int = 1):
+        self.count += sign
+        if vector is not None:
+            self.embedded += sign
+            if self.vector_sum is None:
+                self.vector_sum = np.zeros(vector.shape[0], dtype=np.float64)
+            self.vector_sum += sign * vector
+        if keywords is not None:
+            self.keyword_docs += sign
+            for keyword in keywords:
+                self.keyword_counts[keyword] = self.keyword_counts.get(keyword, 0) + sign
+
+
+class CategoryProfile:
+    __slots__ = ("category", "count", "centroid", "keyword_counts", "keyword_docs")
+
+    def __init__(self, category: str, count: int, centroid: Optional[np.ndarray],
+                 keyword_counts: Dict[str, int], keyword_docs: int):
+        self.category = category
+        self.count = count
+        self.centroid = centroid
+        self.keyword_counts = keyword_counts
+        self.keyword_docs = keyword_docs
+
+
+def _normalized(vector: Iterable[float]) -> Optional[np.ndarray]:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else None
+
+
+class CategoryCentroids:
+    """Category centroids kept in Mongo and updated with atomic increments as documents change.
+
+    Each document of category_centroids stores the running sum of its documents' normalized
+    embeddings and per-keyword document counts, so a document change never rereads the partition."""
+
+    def __init__(self, db, refresh_sec: float = Config.CATEGORY_CENTROID_REFRESH_SEC):
+        self.centroids_collection = db.category_centroids
+        self.refresh_sec = refresh_sec
+        self._cache: Dict[str, Tuple[float, List[CategoryProfile]]] = {}
+        self._lock = threading.Lock()
+        self.centroids_collection.create_index("domain")
+
+    def record(self, domain: str, category: str, embedding: Optional[Iterable[float]] = None,
+               keywords: Optional[Iterable[str]] = None, sign: int = 1):
+        """Fold one document into its category's centroid and keyword profile (sign=-1 removes it)"""
+        increments = {"count": sign}
+        if embedding is not None:
+            vector = _normalized(embedding)
+            if vector is not None:
+                increments["embedded"] = sign
+                increments.update({f"vector_sum.{i}": sign * float(v) for i, v in enumerate(vector)})
+        if keywords is not None:
+            increments["keyword_docs"] = sign
+            increments.update({f"keyword_counts.{keyword}": sign for keyword in keywords})
+        self.centroids_collection.update_one(
+            {"_id": f"{domain}:{category}"},
+            {"$inc": increments, "$setOnInsert": {"domain": domain, "category": category}},
+            upsert=True
+        )
+        self.invalidate(domain)
+
+    def invalidate(self, domain: Optional[str] = None):
+        with self._lock:
+            if domain is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(domain, None)
+
+    def profiles(self, domain: str) -> List[CategoryProfile]:
+        """Category profiles of the domain, cached for refresh_sec"""
+        now = time.monotonic()
+        cached = self._cache.get(domain)
+        if cached and now - cached[0] < self.refresh_sec:
+            return cached[1]
+        profiles = []
+        for row in self.centroids_collection.find({"domain": domain}):
+            if row.get("count", 0) <= 0:
+                continue
+            vector_sum = row.get("vector_sum") or {}
+            centroid = None
+            if row.get("embedded", 0) > 0 and vector_sum:
+                centroid = _normalized([vector_sum[str(i)] for i in range(len(vector_sum))])
+            keyword_counts = {k: v for k, v in (row.get("keyword_counts") or {}).items() if v > 0}
+            profiles.append(CategoryProfile(row["category"], row["count"], centroid,
+                                            keyword_counts, row.get("keyword_docs", 0)))
+        with self._lock:
+            self._cache[domain] = (now, profiles)
+        return profiles
+
+    def route(self, domain: str, query_embedding: Optional[np.ndarray] = None,
+              query_keywords: Optional[Set[str]] = None,
+              route_categories: int = Config.RETRIEVAL_ROUTE_CATEGORIES,
+              min_candidates: int = 0) -> Optional[List[str]]:
+        """Categories to search for the query, or None to search the whole domain"""
+        profiles = self.profiles(domain)
+        if query_embedding is not None:
+            query = _normalized(query_embedding)
+            if query is None or any(p.centroid is None or p.centroid.shape != query.shape for p in profiles):
+                return None
+            ranked = [(float(p.centroid @ query), p.category, p.count) for p in profiles]
+        elif query_keywords is not None:
+            return route_by_keywords(
+                [(p.category, p.count, p.keyword_counts, p.keyword_docs) for p in profiles],
+                query_keywords, route_categories, min_candidates
+            )
+        else:
+            return None
+        return select_categories(ranked, route_categories, min_candidates)
+
+    def rebuild(self, embeddings_collection) -> int:
+        """Recompute every centroid from the embeddings collection; returns the number of categories"""
+        sums: Dict[Tuple[str, str], Dict[str, object]] = {}
+        rows = embeddings_collection.find({"deleted": {"$ne": True}},
+                                          {"domain": 1, "category": 1, "embedding": 1, "keywords": 1})
+        for row in rows:
+            entry = sums.setdefault((row.get("domain"), row.get("category")), {
+                "count": 0, "embedded": 0, "vector_sum": None, "keyword_docs": 0, "keyword_counts": {}
+            })
+            entry["count"] += 1
+            vector = _normalized(row["embedding"]) if row.get("embedding") else None
+            if vector is not None:
+                entry["embedded"] += 1
+                entry["vector_sum"] = vector.astype(np.float64) if entry["vector_sum"] is None \
+                    else entry["vector_sum"] + vector
+            if "keywords" in row:
+                entry["keyword_docs"] += 1
+                for keyword in row["keywords"]:
+                    entry["keyword_counts"][keyword] = entry["keyword_counts"].get(keyword, 0) + 1
+
+        self.centroids_collection.delete_many({})
+        for (domain, category), entry in sums.items():
+            vector_sum = entry.pop("vector_sum")
+            self.centroids_collection.insert_one({
+                "_id": f"{domain}:{category}",
+                "domain": domain,
+                "category": category,
+                **entry,
+                "vector_sum": {str(i): float(v) for i, v in enumerate(vector_sum)} if vector_sum is not None else {}
+            })
+        self.invalidate()
+        logger.info(f"Rebuilt {len(sums)} category centroids")
+        return len(sums)
@@ -0,0 +1,103 @@
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class ChatStore:
+    """Stores chat turns in fixed-size buckets per assessment instead of one ever-growing array.
+
+    The session an analysis starts (its prompt and report) is stored alongside, keyed by the assessment id,
+    so any worker process can serve the follow-up turns."""
+
+    def __init__(self, db, bucket_size: int = Config.CHAT_BUCKET_SIZE):
+        self.buckets_collection = db.chat_buckets
+        self.sessions_collection = db.chat_sessions
+        self.bucket_size = bucket_size
+        # Serves both the "open bucket" upsert filter and the newest-first reads; chat works without them, only slower
+        try:
+            self.buckets_collection.create_index([("assessment_id", ASCENDING), ("count", ASCENDING)])
+            self.buckets_collection.create_index([("assessment_id", ASCENDING), ("end_ts", DESCENDING)])
+        except PyMongoError as e:
+            logger.warning(f"Could not create the chat bucket indexes: {e}")
+        # At most one open bucket per assessment, so concurrent first appends cannot both start one
+        try:
+            self.buckets_collection.create_index(
+                "assessment_id", name=f"open_bucket_{bucket_size}", unique=True,
+                partialFilterExpression={"count": {"$lt": bucket_size}}
+            )
+        except PyMongoError as e:
+            logger.warning(f"Could not create the open chat bucket index: {e}")
+
+    def start_session(self, assessment_id, domain: str, messages: List[Dict[str, str]], has_context: bool):
+        """Save the messages an analysis opened with; follow-up turns are read back from the buckets"""
+        self.sessions_collection.replace_one(
+            {"_id": ObjectId(assessment_id)},
+            {"domain": domain, "messages": messages, "has_context": has_context, "created_at": datetime.now()},
+            upsert=True
+        )
+
+    def load_session(self, assessment_id, max_turns: int = Config.CHAT_CONTEXT_TURNS) -> Optional[Dict[str, Any]]:
+        """Return the session with its most recent max_turns turns, oldest first, or None if it was never started"""
+        session = self.sessions_collection.find_one({"_id": ObjectId(assessment_id)})
+        if session is None:
+            return None
+        session["turns"] = self.get_turns(assessment_id, limit=max_turns)["turns"] if max_turns else []
+        return session
+
+    def append_turn(self, assessment_id, user_message: str, bot_response: str,
+                    timestamp: Optional[datetime] = None):
+        """Append one turn to the assessment's open bucket, starting a new bucket when it is full.
+
+        Pass the time the turn happened: appends run in the background and may land out of order,
+        so turns are kept sorted by timestamp and the bucket's span only ever widens."""
+        timestamp = timestamp or datetime.now()
+        update = {
+            "$push": {"turns": {
+                "$each": [{"user_message": user_message, "bot_response": bot_response, "timestamp": timestamp}],
+                "$sort": {"timestamp": 1}
+            }},
+            "$inc": {"count": 1},
+            "$min": {"start_ts": timestamp},
+            "$max": {"end_ts": timestamp}
+        }
+        query = {"assessment_id": ObjectId(assessment_id), "count": {"$lt": self.bucket_size}}
+        try:
+            self.buckets_collection.update_one(query, update, upsert=True)
+        except DuplicateKeyError:
+            # Another append opened the bucket between our match and insert; it matches now
+            self.buckets_collection.update_one(query, update, upsert=True)
+
+    def get_turns(self, assessment_id, limit: int = 20, before: Optional[datetime] = None) -> Dict[str, Any]:
+        """Return up to limit turns older than before, oldest first, plus the cursor for the next page"""
+        query = {"assessment_id": ObjectId(assessment_id)}
+        if before:
+            query["start_ts"] = {"$lt": before}
+        # A page spans at most two buckets more than limit / bucket_size
+        bucket_limit = limit // self.bucket_size + 2
+        turns = []
+        has_more = False
+        buckets_read = 0
+        for bucket in self.buckets_collection.find(query, {"turns": 1}).sort("end_ts", DESCENDING).limit(bucket_limit):
+            buckets_read += 1
+            for turn in reversed(bucket["turns"]):
+                if before and turn["timestamp"] >= before:
+                    continue
+                if len(turns) == limit:
+                    has_more = True
+                    break
+                turns.append(turn)
+            if has_more:
+                break
+        # Running out of fetched buckets may leave older ones unread
+        has_more = has_more or buckets_read == bucket_limit
+        turns.reverse()
+        return {
+            "turns": turns,
+            "next_before": turns[0]["timestamp"].isoformat() if has_more and turns else None
+        }
@@ -6,4 +6,78 @@ load_dotenv()
 class Config:
     AI21_API_KEY = os.getenv("AI21_API_KEY")
     MONGODB_URI = os.getenv("MONGODB_URI")
-    DB_NAME = os.getenv("DB_NAME")
\ No newline at end of file
+    DB_NAME = os.getenv("DB_NAME")
+    # AI21 call resilience
+    AI21_API_HOST = os.getenv("AI21_API_HOST")
+    LLM_TIMEOUT_SEC = float(os.getenv("LLM_TIMEOUT_SEC", "30"))
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "1"))
+    LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+    LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+    LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+    LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+    LLM_BREAKER_RESET_SEC = float(os.getenv("LLM_BREAKER_RESET_SEC", "30"))
+    LLM_MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", "16"))
+
+    # Serve the deterministic template report when the LLM is unavailable
+    REPORT_FALLBACK_ENABLED = os.getenv("REPORT_FALLBACK_ENABLED", "true").lower() == "true"
+
+    # Model tiering: JSON overrides for model_router.DEFAULT_TIERS / DEFAULT_RULES
+    LLM_TIERS = os.getenv("LLM_TIERS")
+    LLM_ROUTING_RULES = os.getenv("LLM_ROUTING_RULES")
+
+    # Upper bound on grid points evaluated by a single /whatif request
+    WHATIF_MAX_SCENARIOS = int(os.getenv("WHATIF_MAX_SCENARIOS", "250000"))
+
+    # Risk scoring rules: <domain>.json files here override risk_rules.DEFAULT_RULESETS and are reloaded on change
+    RISK_RULES_DIR = os.getenv("RISK_RULES_DIR", "rules")
+    RISK_RULES_CHECK_SEC = float(os.getenv("RISK_RULES_CHECK_SEC", "10"))
+
+    # Width of the risk score histogram bins kept in analytics rollups
+    ANALYTICS_BIN_WIDTH = float(os.getenv("ANALYTICS_BIN_WIDTH", "0.5"))
+
+    # Streaming export tuning
+    EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+    EXPORT_CHUNK_BYTES = int(os.getenv("EXPORT_CHUNK_BYTES", "65536"))
+
+    # Approximate token budget for retrieved guidelines in LLM prompts
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "800"))
+
+    # /analyze pipeline: concurrent retrieval and background persistence
+    PIPELINE_MAX_WORKERS = int(os.getenv("PIPELINE_MAX_WORKERS", "16"))
+    PIPELINE_PERSISTENCE_WORKERS = int(os.getenv("PIPELINE_PERSISTENCE_WORKERS", "4"))
+    RAG_TOP_K_PER_AREA = int(os.getenv("RAG_TOP_K_PER_AREA", "2"))
+    RAG_RETRIEVAL_TIMEOUT_SEC = float(os.getenv("RAG_RETRIEVAL_TIMEOUT_SEC", "2"))
+
+    # Retrieval index snapshots shared by all worker processes on a node
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    INDEX_SNAPSHOT_DIR = os.getenv("INDEX_SNAPSHOT_DIR", "index_snapshots")
+    INDEX_SNAPSHOT_CHECK_SEC = float(os.getenv("INDEX_SNAPSHOT_CHECK_SEC", "5"))
+
+    # Admission control for the LLM-backed routes (limits apply per worker process)
+    ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "8"))
+    ADMISSION_QUEUE_TARGET_SEC = float(os.getenv("ADMISSION_QUEUE_TARGET_SEC", "5"))
+    ADMISSION_TRUST_FORWARDED = os.getenv("ADMISSION_TRUST_FORWARDED", "false").lower() == "true"
+    RATE_LIMIT_ANALYZE_PER_MIN = float(os.getenv("RATE_LIMIT_ANALYZE_PER_MIN", "10"))
+    RATE_LIMIT_ANALYZE_BURST = float(os.getenv("RATE_LIMIT_ANALYZE_BURST", "3"))
+    RATE_LIMIT_CHAT_PER_MIN = float(os.getenv("RATE_LIMIT_CHAT_PER_MIN", "30"))
+    RATE_LIMIT_CHAT_BURST = float(os.getenv("RATE_LIMIT_CHAT_BURST", "10"))
+
+    # Chat turns stored per bucket document, and how many recent turns a follow-up sends to the LLM
+    CHAT_BUCKET_SIZE = int(os.getenv("CHAT_BUCKET_SIZE", "50"))
+    CHAT_CONTEXT_TURNS = int(os.getenv("CHAT_CONTEXT_TURNS", "20"))
+
+    # Two-stage retrieval: rank documents only in the categories whose centroids best match the query
+    RETRIEVAL_ROUTE_CATEGORIES = int(os.getenv("RETRIEVAL_ROUTE_CATEGORIES", "2"))
+    CATEGORY_CENTROID_REFRESH_SEC = float(os.getenv("CATEGORY_CENTROID_REFRESH_SEC", "30"))
+
+    # Per-worker index sync: tail the embeddings collection instead of rereading it per query
+    INDEX_SYNC_ENABLED = os.getenv("INDEX_SYNC_ENABLED", "true").lower() == "true"
+    INDEX_SYNC_CHANGE_STREAMS = os.getenv("INDEX_SYNC_CHANGE_STREAMS", "true").lower() == "true"
+    INDEX_SYNC_POLL_SEC = float(os.getenv("INDEX_SYNC_POLL_SEC", "2"))
+    INDEX_SYNC_LOOKBACK_SEC = float(os.getenv("INDEX_SYNC_LOOKBACK_SEC", "30"))
+
+    # Index compaction once deleted or superseded rows pass this fraction of all rows
+    INDEX_COMPACTION_THRESHOLD = float(os.getenv("INDEX_COMPACTION_THRESHOLD", "0.2"))
+    INDEX_COMPACTION_LEASE_SEC = float(os.getenv("INDEX_COMPACTION_LEASE_SEC", "600"))
+    INDEX_COMPACTION_RETRY_SEC = float(os.getenv("INDEX_COMPACTION_RETRY_SEC", "30"))
+    INDEX_TOMBSTONE_RETENTION_SEC = float(os.getenv("INDEX_TOMBSTONE_RETENTION_SEC", "604800"))
@@ -0,0 +1,112 @@
+import re
+from typing import List, Dict, Any, Optional, Tuple, Set
+
+STOP_WORDS = {
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was',
+    'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may',
+    'might', 'must', 'can', 'this', 'that', 'these', 'those', 'i', 'you', 'it', 'we', 'they', 'my', 'your', 'our',
+    'their', 'its', 'what', 'how', 'why', 'when', 'which'
+}
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9(\"'])")
+
+HEADER = "Use the following verified guidelines for your analysis:\n\n"
+EMPTY_CONTEXT = "No specific guidelines available. Use general best practices."
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the LLM token count (about four characters per token for English)"""
+    return max(1, (len(text) + 3) // 4) if text else 0
+
+
+def _terms(text: str) -> Set[str]:
+    return {word for word in re.findall(r"[a-z0-9%]+", text.lower()) if word not in STOP_WORDS and len(word) > 2}
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in SENTENCE_SPLIT.split(text or "") if sentence.strip()]
+
+
+def unpacked_length(documents: List[Dict[str, Any]]) -> int:
+    """Token estimate of the plain concatenation of every document"""
+    return estimate_tokens(HEADER + "".join(f"{i}. {doc['title']}:\n{doc['content']}\n\n" for i, doc in enumerate(documents, 1)))
+
+
+def pack_documents(documents: List[Dict[str, Any]], query: Optional[str] = None, token_budget: int = 800,
+                   duplicate_threshold: float = 0.8) -> Tuple[str, Dict[str, int]]:
+    """Build a prompt context under token_budget from the most query-relevant, non-duplicate sentences.
+
+    Documents are expected in retrieval rank order. Returns the context text and packing statistics.
+    """
+    original_tokens = unpacked_length(documents) if documents else 0
+    if not documents:
+        return EMPTY_CONTEXT, {"original_tokens": 0, "packed_tokens": estimate_tokens(EMPTY_CONTEXT), "tokens_saved": 0,
+                               "documents_used": 0, "duplicates_removed": 0}
+
+    query_terms = _terms(query or "")
+    kept_terms: List[Set[str]] = []
+    candidates = []  # (doc_rank, sentence_index, score, sentence, tokens)
+    duplicates_removed = 0
+    for rank, doc in enumerate(documents):
+        for index, sentence in enumerate(split_sentences(doc.get("content", ""))):
+            terms = _terms(sentence)
+            if any(_jaccard(terms, seen) >= duplicate_threshold for seen in kept_terms):
+                duplicates_removed += 1
+                continue
+            kept_terms.append(terms)
+            # Query overlap dominates; earlier documents and leading sentences break ties
+            relevance = len(terms & query_terms) / (len(query_terms) or 1)
+            score = relevance - 0.01 * rank - 0.001 * index
+            candidates.append((rank, index, score, sentence, estimate_tokens(sentence) + 1))
+
+    used_tokens = estimate_tokens(HEADER)
+    titles_charged = set()
+    selected = set()
+
+    def try_select(candidate) -> bool:
+        nonlocal used_tokens
+        rank = candidate[0]
+        cost = candidate[4]
+        if rank not in titles_charged:
+            cost += estimate_tokens(f"{len(titles_charged) + 1}. {documents[rank]['title']}:\n") + 1
+        if used_tokens + cost > token_budget:
+            return False
+        used_tokens += cost
+        titles_charged.add(rank)
+        selected.add((candidate[0], candidate[1]))
+        return True
+
+    # First give every document its best sentence, in rank order, then fill the rest by score
+    best_per_doc = {}
+    for candidate in candidates:
+        if candidate[0] not in best_per_doc or candidate[2] > best_per_doc[candidate[0]][2]:
+            best_per_doc[candidate[0]] = candidate
+    for rank in sorted(best_per_doc):
+        try_select(best_per_doc[rank])
+    for candidate in sorted(candidates, key=lambda c: c[2], reverse=True):
+        if (candidate[0], candidate[1]) not in selected:
+            try_select(candidate)
+
+    parts = [HEADER]
+    used_docs = 0
+    for rank, doc in enumerate(documents):
+        sentences = [c[3] for c in candidates if (c[0], c[1]) in selected and c[0] == rank]
+        if not sentences:
+            continue
+        used_docs += 1
+        parts.append(f"{used_docs}. {doc['title']}:\n{' '.join(sentences)}\n\n")
+    context = "".join(parts) if used_docs else EMPTY_CONTEXT
+
+    packed_tokens = estimate_tokens(context)
+    return context, {
+        "original_tokens": original_tokens,
+        "packed_tokens": packed_tokens,
+        "tokens_saved": max(0, original_tokens - packed_tokens),
+        "documents_used": used_docs,
+        "duplicates_removed": duplicates_removed
+    }
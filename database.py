@@ -1,4 +1,8 @@
-from pymongo import MongoClient
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from pymongo import MongoClient, ASCENDING
+from pymongo.collection import Collection
+from pymongo.database import Database
 from config import Config
 
 client = MongoClient(Config.MONGODB_URI)
@@ -6,10 +10,52 @@ db = client[Config.DB_NAME]
 
 risk_analysis_collection = db["risk_analyses"]
 
+def export_sources(database: Database) -> Dict[str, Collection]:
+    """Collections /export/history can read, taken from the database the caller writes to"""
+    return {
+        "analyses": database["risk_analyses"],
+        "assessments": database["assessments"]
+    }
+
 def save_analysis(analysis_data):
     """Save risk analysis to MongoDB"""
     return risk_analysis_collection.insert_one(analysis_data)
 
 def get_analysis_history():
     """Get all previous risk analyses"""
-    return list(risk_analysis_collection.find({}, {"_id": 0}))
\ No newline at end of file
+    return list(risk_analysis_collection.find({}, {"_id": 0}))
+
+def iter_analysis_history(collection: Collection, domain: Optional[str] = None, user_id: Optional[str] = None,
+                          start: Optional[datetime] = None, end: Optional[datetime] = None,
+                          fields: Optional[List[str]] = None,
+                          batch_size: int = Config.EXPORT_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+    """Stream analyses matching the filters from a cursor without loading them all into memory.
+
+    fields, when given, is the projection: only those top-level fields leave the server."""
+    query = {}
+    if domain:
+        query["domain"] = domain
+    if user_id:
+        query["user_id"] = user_id
+    if start or end:
+        query["timestamp"] = {}
+        if start:
+            query["timestamp"]["$gte"] = start
+        if end:
+            query["timestamp"]["$lt"] = end
+    projection = {field: 1 for field in fields} if fields else {}
+    projection.setdefault("_id", 0)
+    cursor = collection.find(query, projection, batch_size=batch_size)
+    if start or end:
+        cursor = cursor.sort("timestamp", ASCENDING)
+    try:
+        for doc in cursor:
+            yield doc
+    finally:
+        cursor.close()
+
+def ensure_export_indexes(collections: Iterable[Collection]):
+    """Index the fields export filters on"""
+    for collection in collections:
+        collection.create_index([("domain", ASCENDING), ("timestamp", ASCENDING)])
+        collection.create_index([("user_id", ASCENDING), ("timestamp", ASCENDING)])
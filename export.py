@@ -0,0 +1,80 @@
+import io
+import csv
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+from config import Config
+from serialization import dumps, gzip_chunks
+
+
+# CSV needs its header before the first row, so without a fields parameter it uses the assessment schema
+DEFAULT_CSV_FIELDS = ["user_id", "domain", "risk_score", "report_source", "timestamp", "personal_data",
+                      "guidelines", "analysis"]
+
+
+def export_fields(export_format: str, fields: Optional[str] = None) -> Optional[List[str]]:
+    """Columns to export from a comma-separated fields parameter; None exports whole documents"""
+    if not fields:
+        return DEFAULT_CSV_FIELDS if export_format == "csv" else None
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    invalid = [name for name in names if name.startswith("$") or "." in name]
+    if invalid or not names:
+        raise ValueError(f"fields must be top-level field names: {fields}")
+    return names
+
+
+def _chunked(lines: Iterable[Union[str, bytes]], chunk_bytes: int) -> Iterator[bytes]:
+    """Group small encoded lines into chunks of roughly chunk_bytes"""
+    buffer = []
+    size = 0
+    for line in lines:
+        data = line if isinstance(line, bytes) else line.encode("utf-8")
+        buffer.append(data)
+        size += len(data)
+        if size >= chunk_bytes:
+            yield b"".join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def ndjson_lines(docs: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    for doc in docs:
+        yield dumps(doc) + b"\n"
+
+
+def csv_lines(docs: Iterable[Dict[str, Any]], fields: Optional[List[str]] = None) -> Iterator[str]:
+    """Render docs as CSV rows under a fixed header (fields, else DEFAULT_CSV_FIELDS); missing values are empty"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields or DEFAULT_CSV_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for doc in docs:
+        row = {
+            key: dumps(value).decode("utf-8") if isinstance(value, (dict, list))
+            else value.isoformat() if isinstance(value, datetime)
+            else value
+            for key, value in doc.items()
+        }
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def stream_export(docs: Iterable[Dict[str, Any]], export_format: str = "ndjson",
+                  fields: Optional[List[str]] = None, compress: bool = False,
+                  chunk_bytes: int = Config.EXPORT_CHUNK_BYTES) -> Iterator[bytes]:
+    """Encode documents as NDJSON or CSV byte chunks with constant memory use.
+
+    Field selection is the query's projection; fields here only fixes the CSV header."""
+    if export_format == "csv":
+        lines = csv_lines(docs, fields)
+    elif export_format == "ndjson":
+        lines = ndjson_lines(docs)
+    else:
+        raise ValueError(f"Unsupported export format: {export_format}")
+    chunks = _chunked(lines, chunk_bytes)
+    return gzip_chunks(chunks) if compress else chunks
@@ -0,0 +1,43 @@
+import gc
+import os
+import sys
+import multiprocessing
+
+# Production serving: the app, the embedding model and the knowledge base are loaded once in the
+# master and shared copy-on-write with the forked workers. Reload gracefully with `kill -HUP <master pid>`.
+
+bind = os.getenv("WEB_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.getenv("WEB_THREADS", "4"))
+worker_class = "gthread"
+preload_app = True
+
+# LLM calls can take tens of seconds; let the per-call deadline fire before the worker is killed
+timeout = int(os.getenv("WEB_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+# Recycle workers periodically to bound memory growth; jitter avoids restarting them all at once
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "5000"))
+max_requests_jitter = int(os.getenv("WEB_MAX_REQUESTS_JITTER", "500"))
+
+accesslog = os.getenv("WEB_ACCESS_LOG", "-")
+errorlog = "-"
+
+
+def pre_fork(server, worker):
+    # Move everything loaded so far into the permanent generation so the collector never writes
+    # to those pages in the workers, keeping them shared copy-on-write
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # One inference thread per worker process; the workers already use every core between them
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(int(os.getenv("EMBEDDING_THREADS", "1")))
+    server.log.info(f"Worker {worker.pid} started")
+
+
+def worker_abort(worker):
+    worker.log.warning(f"Worker {worker.pid} aborted after exceeding the {timeout}s timeout")
@@ -0,0 +1,520 @@
+import os
+import re
+import json
+import time
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from bisect import bisect_left, bisect_right
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+import numpy as np
+from pymongo.errors import DuplicateKeyError
+from config import Config
+from category_index import CategoryStats, select_categories, route_by_keywords
+from sequences import current_sequence, EMBEDDINGS_SEQUENCE
+
+logger = logging.getLogger(__name__)
+
+# Versioned on-disk snapshot of the retrieval index. One builder writes
+#   index-v<N>.npy          float32 matrix of L2-normalized embeddings, one row per document, grouped by domain then category
+#   index-v<N>.<array>.npy  per-row document ids and embedding flags, keywords as vocabulary positions with
+#                           per-row offsets, the id sort order, and per-partition embedding sums
+#   index-v<N>.json         build metadata and the (domain, category) partitions: row spans and keyword counts
+#   CURRENT                 the version workers should serve
+# Workers np.load(mmap_mode="r") every array, so per-row data lives once in the node's page cache however
+# many workers map it; a worker's heap holds only per-partition totals.
+# Builders on a host take a lease in the locks collection, and every version number is claimed by
+# creating its metadata file exclusively, so two builders can never write the same version.
+
+CURRENT_FILE = "CURRENT"
+KEEP_VERSIONS = 2
+VERSION_PATTERN = re.compile(r"^index-v(\d+)\.json$")
+FILE_PATTERN = re.compile(r"^index-v(\d+)\.")
+SNAPSHOT_FORMAT = 2
+ARRAYS = ("ids", "id_order", "embedded", "keyword_ids", "keyword_offsets", "vocabulary", "sums")
+
+
+class SnapshotBusyError(RuntimeError):
+    """Raised when another process is already building a snapshot into the same directory"""
+
+
+def _paths(directory: str, version: int) -> Tuple[str, str]:
+    return (os.path.join(directory, f"index-v{version}.npy"),
+            os.path.join(directory, f"index-v{version}.json"))
+
+
+def _array_path(directory: str, version: int, name: str) -> str:
+    return os.path.join(directory, f"index-v{version}.{name}.npy")
+
+
+def _encode(values: Iterable[str]) -> np.ndarray:
+    """Fixed-width UTF-8 byte strings; unlike object arrays, numpy can memory-map them"""
+    return np.array([str(value).encode("utf-8") for value in values], dtype=bytes)
+
+
+def _read_current(directory: str) -> Optional[int]:
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as f:
+            return int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _claim_version(directory: str) -> int:
+    """Reserve the next unused version by creating its metadata file; O_EXCL makes the claim atomic"""
+    versions = [int(match.group(1)) for match in map(VERSION_PATTERN.match, os.listdir(directory)) if match]
+    version = max(versions + [_read_current(directory) or 0]) + 1
+    while True:
+        try:
+            os.close(os.open(_paths(directory, version)[1], os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return version
+        except FileExistsError:
+            version += 1
+
+
+def _lease_id(directory: str) -> str:
+    return f"index_snapshot:{socket.gethostname()}:{os.path.abspath(directory)}"
+
+
+def build_lease_held(database, directory: str) -> bool:
+    """Return True if a builder currently holds the directory's lease"""
+    return database.locks.find_one({"_id": _lease_id(directory), "expires_at": {"$gte": datetime.now()}}) is not None
+
+
+@contextmanager
+def build_lease(database, directory: str) -> Iterator[None]:
+    """Hold the per-host lease on a snapshot directory; raises SnapshotBusyError if another builder has it"""
+    lease = _lease_id(directory)
+    holder = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    now = datetime.now()
+    try:
+        database.locks.find_one_and_update(
+            {"_id": lease, "expires_at": {"$lt": now}},
+            {"$set": {"expires_at": now + timedelta(seconds=Config.INDEX_COMPACTION_LEASE_SEC), "holder": holder}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        raise SnapshotBusyError(f"Another process is building a snapshot in {directory}")
+    try:
+        yield
+    finally:
+        database.locks.delete_one({"_id": lease, "holder": holder})
+
+
+def build_snapshot(embeddings_collection, directory: str = Config.INDEX_SNAPSHOT_DIR,
+                   model_name: Optional[str] = None) -> int:
+    """Write a new snapshot version from the embeddings collection and publish it; returns the version.
+
+    Raises SnapshotBusyError if another builder on this host holds the directory's lease."""
+    os.makedirs(directory, exist_ok=True)
+    with build_lease(embeddings_collection.database, directory):
+        return _build_snapshot(embeddings_collection, directory, model_name)
+
+
+def _build_snapshot(embeddings_collection, directory: str, model_name: Optional[str]) -> int:
+    version = _claim_version(directory)
+    # Rows written after this point carry a higher sequence and reach workers through the index sync
+    max_seq = current_sequence(embeddings_collection.database, EMBEDDINGS_SEQUENCE)
+
+    document_ids, keys, keywords, vectors = [], [], [], []
+    # Sorting by domain and category keeps each partition's rows contiguous, so a query scores slice views of the map
+    cursor = embeddings_collection.find(
+        {"deleted": {"$ne": True}}, {"document_id": 1, "domain": 1, "category": 1, "embedding": 1, "keywords": 1}
+    ).sort([("domain", 1), ("category", 1), ("_id", 1)])
+    for row in cursor:
+        document_ids.append(str(row["document_id"]))
+        keys.append((row.get("domain"), row.get("category")))
+        keywords.append(sorted({str(keyword) for keyword in row.get("keywords", [])}))
+        vectors.append(row.get("embedding"))
+
+    dim = next((len(v) for v in vectors if v), 0)
+    matrix = np.zeros((len(vectors), dim), dtype=np.float32)
+    has_embedding = np.zeros(len(vectors), dtype=bool)
+    for i, vector in enumerate(vectors):
+        if vector and len(vector) == dim:
+            matrix[i] = vector
+            has_embedding[i] = True
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+
+    # Keywords as positions in the sorted vocabulary, row i's being keyword_ids[offsets[i]:offsets[i + 1]]
+    flat_keywords = _encode(keyword for row_keywords in keywords for keyword in row_keywords)
+    vocabulary = np.unique(flat_keywords)
+    keyword_ids = np.searchsorted(vocabulary, flat_keywords).astype(np.int32)
+    keyword_offsets = np.zeros(len(keywords) + 1, dtype=np.int64)
+    keyword_offsets[1:] = np.cumsum([len(row_keywords) for row_keywords in keywords], dtype=np.int64)
+
+    partitions = []
+    for row, key in enumerate(keys):
+        if partitions and (partitions[-1]["domain"], partitions[-1]["category"]) == key:
+            partitions[-1]["end"] = row + 1
+        else:
+            partitions.append({"domain": key[0], "category": key[1], "start": row, "end": row + 1})
+    # Rows without an embedding are zero in the matrix, so whole spans can be summed
+    sums = np.zeros((len(partitions), dim), dtype=np.float64)
+    for n, partition in enumerate(partitions):
+        start, end = partition["start"], partition["end"]
+        sums[n] = matrix[start:end].sum(axis=0, dtype=np.float64)
+        keyword_counts: Dict[str, int] = {}
+        for row_keywords in keywords[start:end]:
+            for keyword in row_keywords:
+                keyword_counts[keyword] = keyword_counts.get(keyword, 0) + 1
+        partition.update(embedded=int(has_embedding[start:end].sum()),
+                         keyword_docs=sum(1 for row_keywords in keywords[start:end] if row_keywords),
+                         keyword_counts=keyword_counts)
+
+    ids = _encode(document_ids)
+    arrays = {"ids": ids, "id_order": np.argsort(ids, kind="stable"), "embedded": has_embedding,
+              "keyword_ids": keyword_ids, "keyword_offsets": keyword_offsets, "vocabulary": vocabulary, "sums": sums}
+    matrix_path, meta_path = _paths(directory, version)
+    np.save(matrix_path, matrix)
+    for name in ARRAYS:
+        np.save(_array_path(directory, version, name), arrays[name])
+    # The metadata file was claimed empty; it is written last, so a complete one means a complete version
+    with open(meta_path, "w") as f:
+        json.dump({
+            "format": SNAPSHOT_FORMAT,
+            "version": version,
+            "created_at": datetime.now().isoformat(),
+            "model": model_name,
+            "dim": dim,
+            "max_seq": max_seq,
+            "partitions": partitions
+        }, f)
+
+    # Publish atomically so readers never see a half-written pointer; skip it if a newer version
+    # was published into a shared directory meanwhile
+    if version <= (_read_current(directory) or 0):
+        logger.info(f"Index snapshot v{version} superseded before publishing")
+        return version
+    tmp_path = os.path.join(directory, f"{CURRENT_FILE}.{version}.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(str(version))
+    os.replace(tmp_path, os.path.join(directory, CURRENT_FILE))
+
+    # Workers that still map an older version keep it alive until they swap; unlinking is safe
+    for name in os.listdir(directory):
+        match = FILE_PATTERN.match(name)
+        if match and int(match.group(1)) <= version - KEEP_VERSIONS:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+    logger.info(f"Published index snapshot v{version} with {len(document_ids)} documents")
+    return version
+
+
+class LazyIds:
+    """Document ids of result positions, resolved only for the positions a top-k result reads"""
+
+    __slots__ = ("_lookup", "_size")
+
+    def __init__(self, lookup: Callable[[int], str], size: int):
+        self._lookup = lookup
+        self._size = size
+
+    def __getitem__(self, position) -> str:
+        return self._lookup(int(position))
+
+    def __len__(self) -> int:
+        return self._size
+
+
+def top_k_per_query(scores: np.ndarray, ids: Sequence[str], top_k: int) -> List[List[Tuple[float, str]]]:
+    """Best (score, id) pairs for each column of a rows x queries score matrix, skipping -inf entries"""
+    k = min(top_k, scores.shape[0])
+    if k <= 0:
+        return [[] for _ in range(scores.shape[1])]
+    top = np.argpartition(-scores, k - 1, axis=0)[:k] if k < scores.shape[0] \
+        else np.tile(np.arange(scores.shape[0])[:, None], (1, scores.shape[1]))
+    results = []
+    for column in range(scores.shape[1]):
+        column_top = top[:, column][np.argsort(-scores[top[:, column], column])]
+        results.append([(float(scores[i, column]), ids[i]) for i in column_top if np.isfinite(scores[i, column])])
+    return results
+
+
+def keyword_overlaps(row_keywords: Sequence[Optional[Set[str]]], query_keywords: List[Set[str]]) -> np.ndarray:
+    """rows x queries keyword overlap counts, in one pass over the rows through a keyword -> queries postings map"""
+    postings: Dict[str, List[int]] = {}
+    for column, keywords in enumerate(query_keywords):
+        for keyword in keywords:
+            postings.setdefault(keyword, []).append(column)
+    overlaps = np.zeros((len(row_keywords), len(query_keywords)), dtype=np.int32)
+    for n, keywords in enumerate(row_keywords):
+        for keyword in keywords or ():
+            columns = postings.get(keyword)
+            if columns:
+                overlaps[n, columns] += 1
+    return overlaps
+
+
+def keyword_top_k(overlaps: np.ndarray, ids: Sequence[str], top_k: int) -> List[List[Tuple[int, str]]]:
+    """Per query, the top_k (overlap, id) pairs with a positive overlap, ordered like keyword_search"""
+    results = []
+    for column in range(overlaps.shape[1]):
+        scores = [(int(overlaps[n, column]), ids[n]) for n in np.flatnonzero(overlaps[:, column])]
+        scores.sort(reverse=True)
+        results.append(scores[:top_k])
+    return results
+
+
+def route_mask(labels: np.ndarray, categories: List[str], routes: List[Optional[List[str]]]) -> np.ndarray:
+    """labels x queries mask of the rows (or spans) each query was routed to; labels index categories"""
+    allowed = np.array([[route is None or category in route for route in routes] for category in categories],
+                       dtype=bool).reshape(len(categories), len(routes))
+    return allowed[labels]
+
+
+class IndexSnapshot:
+    """Read-only view of one snapshot version; per-row data stays memory-mapped"""
+
+    def __init__(self, directory: str, version: int):
+        matrix_path, meta_path = _paths(directory, version)
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"snapshot format {meta.get('format', 1)} is not {SNAPSHOT_FORMAT}; rebuild it")
+        self.version = version
+        self.model = meta["model"]
+        self.dim = meta["dim"]
+        self.max_seq = meta.get("max_seq", 0)
+        self.matrix = np.load(matrix_path, mmap_mode="r")
+        arrays = {name: np.load(_array_path(directory, version, name), mmap_mode="r") for name in ARRAYS}
+        self.ids = arrays["ids"]
+        self.id_order = arrays["id_order"]
+        self.has_embedding = arrays["embedded"]
+        self.keyword_ids = arrays["keyword_ids"]
+        self.keyword_offsets = arrays["keyword_offsets"]
+        self.vocabulary = arrays["vocabulary"]
+        self.size = len(self.ids)
+        self._build_category_partitions(meta["partitions"], arrays["sums"])
+
+    def _build_category_partitions(self, partitions: List[Dict], sums: np.ndarray):
+        """Row spans, totals, centroid and keyword profile of every (domain, category) partition"""
+        self.category_spans: Dict[str, Dict[str, List[Tuple[int, int]]]] = {}
+        self.domain_ranges: Dict[str, Tuple[int, int]] = {}
+        self.category_stats: Dict[str, Dict[str, CategoryStats]] = {}
+        self._partition_starts: List[int] = []
+        self._partition_keys: List[Tuple[str, str]] = []
+        for n, partition in enumerate(partitions):
+            domain, category = partition["domain"], partition["category"]
+            start, end = partition["start"], partition["end"]
+            self.category_spans.setdefault(domain, {}).setdefault(category, []).append((start, end))
+            first, last = self.domain_ranges.get(domain, (start, end))
+            self.domain_ranges[domain] = (min(first, start), max(last, end))
+            self._partition_starts.append(start)
+            self._partition_keys.append((domain, category))
+
+            stats = self.category_stats.setdefault(domain, {}).setdefault(category, CategoryStats())
+            stats.count += end - start
+            stats.keyword_docs += partition["keyword_docs"]
+            for keyword, count in partition["keyword_counts"].items():
+                stats.keyword_counts[keyword] = stats.keyword_counts.get(keyword, 0) + count
+            if partition["embedded"]:
+                stats.embedded += partition["embedded"]
+                span_sum = np.array(sums[n], dtype=np.float64)
+                stats.vector_sum = span_sum if stats.vector_sum is None else stats.vector_sum + span_sum
+
+        self.category_centroids: Dict[str, Dict[str, np.ndarray]] = {}
+        self.category_keywords: Dict[str, Dict[str, Tuple[Dict[str, int], int]]] = {}
+        for domain, categories in self.category_stats.items():
+            for category, stats in categories.items():
+                if stats.vector_sum is not None:
+                    norm = np.linalg.norm(stats.vector_sum)
+                    if norm:
+                        self.category_centroids.setdefault(domain, {})[category] = \
+                            (stats.vector_sum / norm).astype(np.float32)
+                self.category_keywords.setdefault(domain, {})[category] = (stats.keyword_counts, stats.count)
+
+    def document_id(self, row: int) -> str:
+        return self.ids[row].decode("utf-8")
+
+    def row_of(self, document_id: str) -> Optional[int]:
+        """Row of a document, by binary search over the ids in sorted order"""
+        key = document_id.encode("utf-8")
+        i = bisect_left(self.id_order, key, key=lambda row: self.ids[row])
+        if i < self.size and self.ids[self.id_order[i]] == key:
+            return int(self.id_order[i])
+        return None
+
+    def partition_of(self, row: int) -> Tuple[str, str]:
+        """(domain, category) of a row"""
+        return self._partition_keys[bisect_right(self._partition_starts, row) - 1]
+
+    def row_keywords(self, row: int) -> Set[str]:
+        positions = self.keyword_ids[self.keyword_offsets[row]:self.keyword_offsets[row + 1]]
+        return {keyword.decode("utf-8") for keyword in self.vocabulary[positions]}
+
+    def _vocabulary_positions(self, keywords: Set[str]) -> np.ndarray:
+        """Positions of the keywords the snapshot's vocabulary holds"""
+        if not keywords or not len(self.vocabulary):
+            return np.zeros(0, dtype=np.int64)
+        encoded = _encode(keywords)
+        positions = np.minimum(np.searchsorted(self.vocabulary, encoded), len(self.vocabulary) - 1)
+        return positions[self.vocabulary[positions] == encoded]
+
+    def keyword_overlaps(self, start: int, end: int, query_keywords: List[Set[str]]) -> np.ndarray:
+        """(end - start) x queries keyword overlap counts of a row span, read from the mapped keyword ids"""
+        offsets = np.asarray(self.keyword_offsets[start:end + 1])
+        flat = self.keyword_ids[offsets[0]:offsets[-1]]
+        overlaps = np.zeros((end - start, len(query_keywords)), dtype=np.int32)
+        for column, keywords in enumerate(query_keywords):
+            positions = self._vocabulary_positions(keywords)
+            if len(positions):
+                # A row lists each keyword once, so hits between its offsets count its overlap
+                hits = np.concatenate([[0], np.cumsum(np.isin(flat, positions))])
+                overlaps[:, column] = hits[offsets[1:] - offsets[0]] - hits[offsets[:-1] - offsets[0]]
+        return overlaps
+
+    def span_ids(self, spans: List[Tuple[int, ...]]) -> LazyIds:
+        """Ids of positions into the concatenated rows of the spans"""
+        offsets = np.cumsum([0] + [span[1] - span[0] for span in spans]).tolist()
+
+        def lookup(position: int) -> str:
+            n = bisect_right(offsets, position) - 1
+            return self.document_id(spans[n][0] + position - offsets[n])
+        return LazyIds(lookup, offsets[-1])
+
+    def _partition_size(self, domain: str, category: str) -> int:
+        return sum(end - start for start, end in self.category_spans[domain][category])
+
+    def route(self, query: np.ndarray, domain: str, top_k: int,
+              route_categories: int = Config.RETRIEVAL_ROUTE_CATEGORIES) -> Optional[List[str]]:
+        """Categories whose centroids best match the normalized query, or None to score the whole domain"""
+        categories = self.category_spans.get(domain, {})
+        centroids = self.category_centroids.get(domain, {})
+        if len(centroids) < len(categories):
+            return None
+        ranked = [(float(centroids[c] @ query), c, self._partition_size(domain, c)) for c in categories]
+        return select_categories(ranked, route_categories, top_k)
+
+    def spans(self, domain: str, categories: Optional[List[str]] = None) -> List[Tuple[int, int]]:
+        """Row ranges of the domain, or of the given categories within it"""
+        if categories is None:
+            return [self.domain_ranges[domain]] if domain in self.domain_ranges else []
+        spans = self.category_spans.get(domain, {})
+        return [span for category in categories for span in spans.get(category, [])]
+
+    def search(self, query_embedding: np.ndarray, domain: str, top_k: int,
+               route: bool = True) -> List[Tuple[float, str]]:
+        """Cosine similarity of the query against the embedded documents of its best-matching categories"""
+        if domain not in self.domain_ranges:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if not norm or query.shape[0] != self.dim:
+            return []
+        query = query / norm
+        spans = self.spans(domain, self.route(query, domain, top_k) if route else None)
+        scores = np.concatenate([self.matrix[start:end] @ query for start, end in spans])
+        scores[~np.concatenate([self.has_embedding[start:end] for start, end in spans])] = -np.inf
+        ids = self.span_ids(spans)
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), ids[i]) for i in top if np.isfinite(scores[i])]
+
+    def _keyword_profiles(self, domain: str) -> List[Tuple[str, int, Dict[str, int], int]]:
+        return [(category, self._partition_size(domain, category), counts, docs)
+                for category, (counts, docs) in self.category_keywords.get(domain, {}).items()]
+
+    def keyword_search(self, query_keywords: set, domain: str, top_k: int,
+                       route: bool = True) -> List[Tuple[int, str]]:
+        if domain not in self.domain_ranges:
+            return []
+        categories = None
+        if route:
+            categories = route_by_keywords(self._keyword_profiles(domain), query_keywords,
+                                           Config.RETRIEVAL_ROUTE_CATEGORIES, top_k)
+        scores = []
+        for start, end in self.spans(domain, categories):
+            overlaps = self.keyword_overlaps(start, end, [query_keywords])[:, 0]
+            scores.extend((int(overlaps[n]), self.document_id(start + n)) for n in np.flatnonzero(overlaps))
+        scores.sort(reverse=True)
+        return scores[:top_k]
+
+    def _batch_spans(self, domain: str,
+                     routes: List[Optional[List[str]]]) -> Tuple[List[Tuple[int, int, int]], np.ndarray]:
+        """Row spans of every category some query was routed to, each labelled with its category's index,
+        and the categories x queries mask of each query's own categories"""
+        spans = self.category_spans.get(domain, {})
+        categories = list(spans) if any(route is None for route in routes) \
+            else list(dict.fromkeys(category for route in routes for category in route))
+        labelled = [(start, end, i) for i, category in enumerate(categories) for start, end in spans.get(category, [])]
+        return labelled, route_mask(np.arange(len(categories)), categories, routes)
+
+    def search_many(self, query_embeddings: np.ndarray, domain: str, top_k: int,
+                    route: bool = True) -> List[List[Tuple[float, str]]]:
+        """search for a batch of queries: each is routed on its own, then every routed span is scored in place"""
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        if domain not in self.domain_ranges or queries.shape[1] != self.dim:
+            return [[] for _ in range(len(queries))]
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = np.divide(queries, norms, out=np.zeros_like(queries), where=norms > 0)
+        routes = [self.route(query, domain, top_k) if route else None for query in queries]
+        spans, allowed = self._batch_spans(domain, routes)
+        if not spans:
+            return [[] for _ in range(len(queries))]
+        scores = np.concatenate([self.matrix[start:end] @ queries.T for start, end, _ in spans])
+        mask = np.concatenate([self.has_embedding[start:end, None] & allowed[label][None, :]
+                               for start, end, label in spans])
+        scores[~(mask & (norms[:, 0] > 0)[None, :])] = -np.inf
+        return top_k_per_query(scores, self.span_ids(spans), top_k)
+
+    def keyword_search_many(self, query_keywords: List[Set[str]], domain: str, top_k: int,
+                            route: bool = True) -> List[List[Tuple[int, str]]]:
+        """keyword_search for a batch of queries in a single pass over the routed spans"""
+        if domain not in self.domain_ranges:
+            return [[] for _ in query_keywords]
+        profiles = self._keyword_profiles(domain)
+        routes = [route_by_keywords(profiles, keywords, Config.RETRIEVAL_ROUTE_CATEGORIES, top_k) if route else None
+                  for keywords in query_keywords]
+        spans, allowed = self._batch_spans(domain, routes)
+        if not spans:
+            return [[] for _ in query_keywords]
+        overlaps = np.concatenate([self.keyword_overlaps(start, end, query_keywords) * allowed[label][None, :]
+                                   for start, end, label in spans])
+        return keyword_top_k(overlaps, self.span_ids(spans), top_k)
+
+
+class SnapshotIndex:
+    """Serves the newest published snapshot, hot-swapping when the builder publishes a new version"""
+
+    def __init__(self, directory: str = Config.INDEX_SNAPSHOT_DIR,
+                 check_interval: float = Config.INDEX_SNAPSHOT_CHECK_SEC):
+        self.directory = directory
+        self.check_interval = check_interval
+        self.current: Optional[IndexSnapshot] = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self.maybe_reload(force=True)
+
+    def maybe_reload(self, force: bool = False) -> Optional[IndexSnapshot]:
+        """Return the snapshot to serve, loading a newer version if one was published"""
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return self.current
+        with self._lock:
+            if not force and now - self._last_check < self.check_interval:
+                return self.current
+            self._last_check = now
+            version = _read_current(self.directory)
+            if version is not None and (self.current is None or version != self.current.version):
+                try:
+                    self.current = IndexSnapshot(self.directory, version)
+                    logger.info(f"Loaded index snapshot v{version}")
+                except (OSError, ValueError, KeyError) as e:
+                    logger.error(f"Failed to load index snapshot v{version}: {e}")
+        return self.current
+
+
+if __name__ == "__main__":
+    from pymongo import MongoClient
+    db = MongoClient(Config.MONGODB_URI)[Config.DB_NAME]
+    try:
+        print(f"Published index snapshot v{build_snapshot(db.embeddings, model_name=Config.EMBEDDING_MODEL)}")
+    except SnapshotBusyError as e:
+        raise SystemExit(str(e))
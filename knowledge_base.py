@@ -1,11 +1,17 @@
 import os
 import json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 import numpy as np
 import logging
 from pymongo import MongoClient
+from bson import ObjectId
 from config import Config
+from context_packer import pack_documents
+from index_snapshot import SnapshotIndex, keyword_overlaps, keyword_top_k, route_mask, top_k_per_query
+from category_index import CategoryCentroids
+from live_index import LiveIndex
+from sequences import next_sequence, EMBEDDINGS_SEQUENCE
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -31,7 +37,7 @@ class KnowledgeBase:
         if SENTENCE_TRANSFORMERS_AVAILABLE:
             try:
                 logger.info("Initializing sentence transformer model...")
-                self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+                self.embedding_model = SentenceTransformer(Config.EMBEDDING_MODEL)
                 logger.info("Sentence transformer model loaded successfully")
             except Exception as e:
                 logger.error(f"Failed to load sentence transformer model: {e}")
@@ -40,6 +46,28 @@ class KnowledgeBase:
         
         # Initialize with default knowledge base
         self._initialize_default_knowledge()
+        
+        # Per-category centroids route each query to a few partitions of its domain
+        self.embeddings_collection.create_index([("domain", 1), ("category", 1)])
+        self.category_centroids = CategoryCentroids(self.db)
+        if self.category_centroids.centroids_collection.count_documents({}) == 0 \
+                and self.embeddings_collection.count_documents({}) > 0:
+            self.category_centroids.rebuild(self.embeddings_collection)
+        
+        # Memory-mapped index snapshot shared by every worker on the node (None until one is built)
+        self.snapshot = SnapshotIndex()
+        
+        # Each worker keeps the snapshot plus later changes in memory, tailing the embeddings collection
+        self.embeddings_collection.create_index("seq")
+        self.embeddings_collection.create_index("updated_at")
+        self._backfill_sequences()
+        self.live_index = None
+        if Config.INDEX_SYNC_ENABLED:
+            self.live_index = LiveIndex(
+                self.embeddings_collection,
+                self.snapshot,
+                model_name=Config.EMBEDDING_MODEL if self.embedding_model else None
+            )
     
     def _initialize_default_knowledge(self):
         """Initialize the knowledge base with default financial and health documents"""
@@ -134,23 +162,23 @@ class KnowledgeBase:
             if self.embedding_model:
                 try:
                     embedding = self.embedding_model.encode(doc["content"]).tolist()
-                    self.embeddings_collection.insert_one({
+                    self.embeddings_collection.insert_one(self._stamp({
                         "document_id": doc_id,
                         "embedding": embedding,
                         "domain": doc["domain"],
                         "category": doc["category"]
-                    })
+                    }))
                 except Exception as e:
                     logger.error(f"Failed to create embedding for document {doc['title']}: {e}")
             else:
                 # Store keywords for keyword-based retrieval
                 keywords = self._extract_keywords(doc["content"])
-                self.embeddings_collection.insert_one({
+                self.embeddings_collection.insert_one(self._stamp({
                     "document_id": doc_id,
                     "keywords": keywords,
                     "domain": doc["domain"],
                     "category": doc["category"]
-                })
+                }))
     
     def add_document(self, domain: str, title: str, content: str, category: str, tags: List[str]):
         """Add a new document to the knowledge base"""
@@ -166,41 +194,113 @@ class KnowledgeBase:
         doc_id = self.documents_collection.insert_one(doc).inserted_id
         
         # Create and store embedding or keywords
+        row = self._index_row(doc_id, domain, category, content)
+        if row is not None:
+            self.embeddings_collection.insert_one(row)
+            self._record_centroid(row)
+            self._apply_locally(row)
+        
+        return doc_id
+    
+    def update_document(self, document_id, title: Optional[str] = None, content: Optional[str] = None,
+                        category: Optional[str] = None, tags: Optional[List[str]] = None) -> bool:
+        """Revise a document; a new content or category replaces its embeddings row. Returns False if not found"""
+        doc_id = ObjectId(document_id)
+        existing = self.documents_collection.find_one({"_id": doc_id})
+        if existing is None:
+            return False
+        changes = {k: v for k, v in {"title": title, "content": content, "category": category, "tags": tags}.items()
+                   if v is not None}
+        changes["updated_at"] = datetime.now()
+        self.documents_collection.update_one({"_id": doc_id}, {"$set": changes})
+        
+        if content is not None or category is not None:
+            row = self._index_row(doc_id, existing["domain"], category or existing["category"],
+                                  content if content is not None else existing["content"])
+            if row is not None:
+                previous = self.embeddings_collection.find_one_and_replace({"document_id": doc_id}, row, upsert=True)
+                if previous is not None and not previous.get("deleted"):
+                    self._record_centroid(previous, sign=-1)
+                self._record_centroid(row)
+                self._apply_locally(row)
+        return True
+    
+    def delete_document(self, document_id) -> bool:
+        """Remove a document; its embeddings row becomes a deleted marker until compaction purges it"""
+        doc_id = ObjectId(document_id)
+        existing = self.documents_collection.find_one_and_delete({"_id": doc_id})
+        if existing is None:
+            return False
+        # Workers that poll cannot observe a removed row, so the row is replaced by a small marker
+        row = self._stamp({
+            "document_id": doc_id,
+            "domain": existing["domain"],
+            "category": existing["category"],
+            "deleted": True
+        })
+        previous = self.embeddings_collection.find_one_and_replace({"document_id": doc_id}, row)
+        if previous is not None and not previous.get("deleted"):
+            self._record_centroid(previous, sign=-1)
+        self._apply_locally(row)
+        return True
+    
+    def _index_row(self, doc_id, domain: str, category: str, content: str) -> Optional[Dict[str, Any]]:
+        """Build a document's embeddings row: its embedding, or its keywords without a model"""
+        row = {"document_id": doc_id, "domain": domain, "category": category}
         if self.embedding_model:
             try:
-                embedding = self.embedding_model.encode(content).tolist()
-                self.embeddings_collection.insert_one({
-                    "document_id": doc_id,
-                    "embedding": embedding,
-                    "domain": domain,
-                    "category": category
-                })
+                row["embedding"] = self.embedding_model.encode(content).tolist()
             except Exception as e:
-                logger.error(f"Failed to create embedding for new document: {e}")
+                logger.error(f"Failed to create embedding for document {doc_id}: {e}")
+                return None
         else:
-            keywords = self._extract_keywords(content)
-            self.embeddings_collection.insert_one({
-                "document_id": doc_id,
-                "keywords": keywords,
-                "domain": domain,
-                "category": category
-            })
-        
-        return doc_id
+            row["keywords"] = self._extract_keywords(content)
+        return self._stamp(row)
+    
+    def _record_centroid(self, row: Dict[str, Any], sign: int = 1):
+        self.category_centroids.record(row["domain"], row["category"], embedding=row.get("embedding"),
+                                       keywords=row.get("keywords"), sign=sign)
+    
+    def _stamp(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Give an embeddings row the next sequence number so other workers can pick it up"""
+        row["seq"] = next_sequence(self.db, EMBEDDINGS_SEQUENCE)
+        row["updated_at"] = datetime.now()
+        return row
+    
+    def _apply_locally(self, row: Dict[str, Any]):
+        # Read-your-writes in this worker; the others get the row from the change feed
+        if self.live_index is not None:
+            self.live_index.apply(row)
+    
+    def _backfill_sequences(self):
+        """Number embeddings rows written before sequencing existed"""
+        for row in self.embeddings_collection.find({"seq": {"$exists": False}}, {"_id": 1}):
+            self.embeddings_collection.update_one(
+                {"_id": row["_id"], "seq": {"$exists": False}},
+                {"$set": {"seq": next_sequence(self.db, EMBEDDINGS_SEQUENCE), "updated_at": datetime.now()}}
+            )
     
     def retrieve_relevant_documents(self, query: str, domain: str, top_k: int = 3) -> List[Dict[str, Any]]:
         """Retrieve relevant documents based on semantic similarity or keyword matching"""
         
-        # Get all documents for the domain
-        stored_docs = list(self.embeddings_collection.find({"domain": domain}))
+        # Serve from this worker's incrementally synced index once it has loaded
+        state = self.live_index.current() if self.live_index is not None else None
+        if state is not None:
+            return self._live_retrieval(state, query, domain, top_k)
         
-        if not stored_docs:
-            return []
+        # Serve from the shared snapshot when one covers this domain
+        snapshot = self.snapshot.maybe_reload()
+        if snapshot is not None and domain in snapshot.domain_ranges:
+            return self._snapshot_retrieval(snapshot, query, domain, top_k)
         
         if self.embedding_model:
-            # Use semantic similarity
+            # Use semantic similarity within the categories closest to the query
             try:
-                query_embedding = self.embedding_model.encode(query).tolist()
+                query_embedding = self.embedding_model.encode(query)
+                categories = self.category_centroids.route(domain, query_embedding=query_embedding, min_candidates=top_k)
+                stored_docs = self._partition_rows(domain, categories)
+                if not stored_docs:
+                    return []
                 similarities = []
                 for emb_doc in stored_docs:
                     if "embedding" in emb_doc:
@@ -217,9 +317,131 @@ class KnowledgeBase:
             # Use keyword-based retrieval
             return self._keyword_based_retrieval(query, domain, top_k)
         
-        # Get the actual documents
-        documents = list(self.documents_collection.find({"_id": {"$in": top_doc_ids}}))
-        return documents
+        # Get the actual documents in ranking order
+        return self._fetch_documents(top_doc_ids)
+    
+    def retrieve_many(self, queries: List[str], domain: str, top_k: int = 3) -> List[List[Dict[str, Any]]]:
+        """Retrieve the relevant documents of several queries at once, one result list per query.
+
+        The queries are encoded in one batch and scored together, and all matched documents come
+        back in a single fetch, so a multi-section report costs about as much as one lookup."""
+        if not queries:
+            return []
+        state = self.live_index.current() if self.live_index is not None else None
+        snapshot = self.snapshot.maybe_reload() if state is None else None
+        if state is not None:
+            ranked = self._live_retrieval_many(state, queries, domain, top_k)
+        elif snapshot is not None and domain in snapshot.domain_ranges:
+            ranked = self._snapshot_retrieval_many(snapshot, queries, domain, top_k)
+        else:
+            return self._fetch_many(self._legacy_retrieval_many(queries, domain, top_k))
+        return self._fetch_many([[ObjectId(doc_id) for _, doc_id in results] for results in ranked])
+    
+    def _live_retrieval_many(self, state, queries: List[str], domain: str, top_k: int) -> List[List[Tuple[Any, str]]]:
+        if self.embedding_model and state.dim:
+            try:
+                return state.search_many(self.embedding_model.encode(queries), domain, top_k)
+            except Exception as e:
+                logger.error(f"Live index batch semantic search failed: {e}")
+        return state.keyword_search_many([set(self._extract_keywords(q)) for q in queries], domain, top_k)
+    
+    def _snapshot_retrieval_many(self, snapshot, queries: List[str], domain: str,
+                                 top_k: int) -> List[List[Tuple[Any, str]]]:
+        if self.embedding_model and snapshot.dim and snapshot.model in (None, Config.EMBEDDING_MODEL):
+            try:
+                return snapshot.search_many(self.embedding_model.encode(queries), domain, top_k)
+            except Exception as e:
+                logger.error(f"Snapshot batch semantic search failed: {e}")
+        return snapshot.keyword_search_many([set(self._extract_keywords(q)) for q in queries], domain, top_k)
+    
+    def _legacy_retrieval_many(self, queries: List[str], domain: str, top_k: int) -> List[List[Any]]:
+        """Ranked document ids per query from one read of the routed partitions of the embeddings collection"""
+        if self.embedding_model:
+            try:
+                embeddings = np.atleast_2d(np.asarray(self.embedding_model.encode(queries), dtype=np.float32))
+                routes = [self.category_centroids.route(domain, query_embedding=e, min_candidates=top_k)
+                          for e in embeddings]
+                rows = self._partition_rows_many(domain, routes)
+                dim = embeddings.shape[1]
+                rows = [row for row in rows if row.get("embedding") and len(row["embedding"]) == dim]
+                if not rows:
+                    return [[] for _ in queries]
+                matrix = np.array([row["embedding"] for row in rows], dtype=np.float32)
+                matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+                embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+                scores = matrix @ embeddings.T
+                scores[~self._route_mask(rows, routes)] = -np.inf
+                ranked = top_k_per_query(scores, [row["document_id"] for row in rows], top_k)
+                return [[doc_id for _, doc_id in results] for results in ranked]
+            except Exception as e:
+                logger.error(f"Batch semantic search failed: {e}")
+        
+        query_keywords = [set(self._extract_keywords(q)) for q in queries]
+        routes = [self.category_centroids.route(domain, query_keywords=k, min_candidates=top_k) for k in query_keywords]
+        rows = [row for row in self._partition_rows_many(domain, routes) if "keywords" in row]
+        overlaps = keyword_overlaps([set(row["keywords"]) for row in rows], query_keywords)
+        overlaps[~self._route_mask(rows, routes)] = 0
+        ranked = keyword_top_k(overlaps, [row["document_id"] for row in rows], top_k)
+        return [[doc_id for _, doc_id in results] for results in ranked]
+    
+    def _partition_rows_many(self, domain: str, routes: List[Optional[List[str]]]) -> List[Dict[str, Any]]:
+        """Embedding rows of every category some query was routed to"""
+        if any(route is None for route in routes):
+            return self._partition_rows(domain, None)
+        categories = sorted({category for route in routes for category in route})
+        return self._partition_rows(domain, categories) if categories else []
+    
+    def _route_mask(self, rows: List[Dict[str, Any]], routes: List[Optional[List[str]]]) -> np.ndarray:
+        categories = sorted({row.get("category") for row in rows}, key=str)
+        index = {category: i for i, category in enumerate(categories)}
+        labels = np.array([index[row.get("category")] for row in rows], dtype=np.int64)
+        return route_mask(labels, categories, routes)
+    
+    def _partition_rows(self, domain: str, categories: Optional[List[str]]) -> List[Dict[str, Any]]:
+        """Embedding rows of the domain, limited to the routed categories when given"""
+        query = {"domain": domain, "deleted": {"$ne": True}}
+        if categories is not None:
+            query["category"] = {"$in": categories}
+        return list(self.embeddings_collection.find(query))
+    
+    def _live_retrieval(self, state, query: str, domain: str, top_k: int) -> List[Dict[str, Any]]:
+        """Rank documents against the synced in-memory index without querying the embeddings collection"""
+        ranked = None
+        if self.embedding_model and state.dim:
+            try:
+                ranked = state.search(self.embedding_model.encode(query), domain, top_k)
+            except Exception as e:
+                logger.error(f"Live index semantic search failed: {e}")
+        if ranked is None:
+            ranked = state.keyword_search(set(self._extract_keywords(query)), domain, top_k)
+        return self._fetch_documents([ObjectId(doc_id) for _, doc_id in ranked])
+    
+    def _snapshot_retrieval(self, snapshot, query: str, domain: str, top_k: int) -> List[Dict[str, Any]]:
+        """Rank documents against the memory-mapped snapshot instead of scanning Mongo"""
+        ranked = None
+        if self.embedding_model and snapshot.dim and snapshot.model in (None, Config.EMBEDDING_MODEL):
+            try:
+                ranked = snapshot.search(self.embedding_model.encode(query), domain, top_k)
+            except Exception as e:
+                logger.error(f"Snapshot semantic search failed: {e}")
+        if ranked is None:
+            ranked = snapshot.keyword_search(set(self._extract_keywords(query)), domain, top_k)
+        return self._fetch_documents([ObjectId(doc_id) for _, doc_id in ranked])
+    
+    def _fetch_documents(self, doc_ids: List[Any]) -> List[Dict[str, Any]]:
+        """Fetch documents by id in one query, preserving the ranking order"""
+        if not doc_ids:
+            return []
+        by_id = {doc["_id"]: doc for doc in self.documents_collection.find({"_id": {"$in": doc_ids}})}
+        return [by_id[doc_id] for doc_id in doc_ids if doc_id in by_id]
+    
+    def _fetch_many(self, ranked_ids: List[List[Any]]) -> List[List[Dict[str, Any]]]:
+        """Fetch the documents of several rankings in one query, preserving each ranking's order"""
+        doc_ids = list({doc_id for ids in ranked_ids for doc_id in ids})
+        if not doc_ids:
+            return [[] for _ in ranked_ids]
+        by_id = {doc["_id"]: doc for doc in self.documents_collection.find({"_id": {"$in": doc_ids}})}
+        return [[by_id[doc_id] for doc_id in ids if doc_id in by_id] for ids in ranked_ids]
     
     def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
         """Calculate cosine similarity between two vectors"""
@@ -241,8 +463,9 @@ class KnowledgeBase:
         """Retrieve documents based on keyword matching"""
         query_keywords = set(self._extract_keywords(query))
         
-        # Get all documents for the domain
-        stored_docs = list(self.embeddings_collection.find({"domain": domain}))
+        # Get the documents of the categories whose keyword profiles match the query
+        categories = self.category_centroids.route(domain, query_keywords=query_keywords, min_candidates=top_k)
+        stored_docs = self._partition_rows(domain, categories) if categories != [] else []
         
         if not stored_docs:
             return []
@@ -260,24 +483,27 @@ class KnowledgeBase:
         scores.sort(reverse=True)
         top_doc_ids = [doc_id for _, doc_id in scores[:top_k]]
         
-        # Get the actual documents
-        documents = list(self.documents_collection.find({"_id": {"$in": top_doc_ids}}))
-        return documents
+        # Get the actual documents in ranking order
+        return self._fetch_documents(top_doc_ids)
     
     def get_documents_by_category(self, domain: str, category: str) -> List[Dict[str, Any]]:
         """Get documents by domain and category"""
         return list(self.documents_collection.find({"domain": domain, "category": category}))
     
-    def format_documents_for_prompt(self, documents: List[Dict[str, Any]]) -> str:
+    def format_documents_for_prompt(self, documents: List[Dict[str, Any]], query: Optional[str] = None,
+                                    token_budget: Optional[int] = None) -> str:
         """Format retrieved documents for inclusion in LLM prompt"""
-        if not documents:
-            return "No specific guidelines available. Use general best practices."
-        
-        formatted = "Use the following verified guidelines for your analysis:\n\n"
-        for i, doc in enumerate(documents, 1):
-            formatted += f"{i}. {doc['title']}:\n{doc['content']}\n\n"
-        
+        formatted, _ = self.pack_documents_for_prompt(documents, query, token_budget)
         return formatted
+    
+    def pack_documents_for_prompt(self, documents: List[Dict[str, Any]], query: Optional[str] = None,
+                                  token_budget: Optional[int] = None) -> Tuple[str, Dict[str, int]]:
+        """Pack documents into a token-budgeted prompt context and report the tokens saved"""
+        formatted, stats = pack_documents(documents, query, token_budget or Config.CONTEXT_TOKEN_BUDGET)
+        if stats["tokens_saved"]:
+            logger.info(f"Packed {len(documents)} documents into {stats['packed_tokens']} tokens "
+                        f"(saved {stats['tokens_saved']}, dropped {stats['duplicates_removed']} duplicate passages)")
+        return formatted, stats
 
 # Global knowledge base instance
 kb = KnowledgeBase()
@@ -0,0 +1,569 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Set, Tuple
+import numpy as np
+from pymongo.errors import ConnectionFailure, PyMongoError
+from config import Config
+from category_index import CategoryStats, select_categories, route_by_keywords
+from index_snapshot import (IndexSnapshot, LazyIds, SnapshotIndex, SnapshotBusyError, build_lease_held,
+                            build_snapshot, keyword_overlaps, keyword_top_k, route_mask, top_k_per_query)
+
+logger = logging.getLogger(__name__)
+
+# Per-worker retrieval index kept current without reloading the corpus. The published snapshot is
+# the base; rows of the embeddings collection written after it (sequence > snapshot max_seq) are
+# appended to an in-memory delta, and superseded base rows are masked out. Changes arrive through
+# a Mongo change stream on replica sets, otherwise by polling the indexed seq/updated_at fields.
+#
+# Updates and deletes are O(1): the document's current row is flagged dead (a tombstone) and, for an
+# update, the new version is appended. Once tombstones pass INDEX_COMPACTION_THRESHOLD of all rows,
+# compaction rebuilds dense arrays: a fresh snapshot when base rows are masked, else a new delta.
+#
+# One sync thread writes; request threads read without locking. A reader may see a row appended
+# or masked slightly early, never a half-written row: rows are filled before the size is bumped.
+#
+# Base rows are read in place from the snapshot's mapped arrays; a state holds only the base tombstone
+# mask and per-partition totals for them. A state keeps no raw rows. Adopting a base (or compacting) builds a new state by re-reading the
+# rows changed since that base from Mongo, which holds exactly one current row per document, so
+# memory follows the number of documents rather than the history of changes.
+
+
+class IndexState:
+    """Base snapshot rows plus appended delta rows, with tombstones for superseded documents"""
+
+    def __init__(self, base: Optional[IndexSnapshot] = None):
+        self.base = base
+        self.base_seq = base.max_seq if base else 0
+        base_size = base.size if base else 0
+        self.base_alive = np.ones(base_size, dtype=bool)
+        self.dim = base.dim if base else 0
+
+        self.matrix = np.zeros((16, self.dim), dtype=np.float32)
+        self.alive = np.zeros(16, dtype=bool)
+        self.has_embedding = np.zeros(16, dtype=bool)
+        self.size = 0
+        self.document_ids: List[str] = []
+        self.domains: List[str] = []
+        self.categories: List[str] = []
+        self.keywords: List[Optional[Set[str]]] = []
+        # domain -> category -> delta rows
+        self.partitions: Dict[str, Dict[str, List[int]]] = {}
+        self.stats: Dict[str, Dict[str, CategoryStats]] = {}
+        # document id -> its live delta row; base rows are looked up in the snapshot
+        self.locations: Dict[str, int] = {}
+        self.doc_seq: Dict[str, int] = {}
+        self.base_tombstones = 0
+        self.delta_tombstones = 0
+        self.last_seq = self.base_seq
+        if base:
+            self._index_base()
+
+    def _index_base(self):
+        # Start from the partition totals the snapshot computed when it was loaded; removals adjust copies
+        for domain, categories in self.base.category_stats.items():
+            for category, stats in categories.items():
+                self.stats.setdefault(domain, {})[category] = stats.copy()
+
+    def _base_row(self, doc_id: str) -> Optional[int]:
+        """The document's base row while it is still live there"""
+        row = self.base.row_of(doc_id) if self.base is not None else None
+        return row if row is not None and self.base_alive[row] else None
+
+    def _stats(self, domain: str, category: str) -> CategoryStats:
+        return self.stats.setdefault(domain, {}).setdefault(category, CategoryStats())
+
+    @property
+    def tombstones(self) -> int:
+        return self.base_tombstones + self.delta_tombstones
+
+    @property
+    def tombstone_ratio(self) -> float:
+        total = len(self.base_alive) + self.size
+        return self.tombstones / total if total else 0.0
+
+    @property
+    def live_rows(self) -> int:
+        return int(self.base_alive.sum()) + int(self.alive[:self.size].sum())
+
+    def apply(self, row: Dict[str, Any]) -> bool:
+        """Apply one embeddings row; returns False if an equal or newer version was already applied"""
+        doc_id = str(row["document_id"])
+        seq = row.get("seq", 0)
+        known = self.doc_seq.get(doc_id)
+        if known is None:
+            known = self.base_seq if self._base_row(doc_id) is not None else -1
+        if seq <= known:
+            return False
+        if row.get("deleted") and seq <= self.base_seq and doc_id not in self.locations \
+                and self._base_row(doc_id) is None:
+            # A delete the base already reflects; nothing to mask and nothing to remember
+            return False
+        self.doc_seq[doc_id] = seq
+        self.last_seq = max(self.last_seq, seq)
+        self._remove(doc_id)
+        if not row.get("deleted"):
+            self._append(doc_id, row)
+        return True
+
+    def _remove(self, doc_id: str):
+        row = self.locations.pop(doc_id, None)
+        if row is not None:
+            self.alive[row] = False
+            vector = self.matrix[row].astype(np.float64) if self.has_embedding[row] else None
+            self._stats(self.domains[row], self.categories[row]).add(vector, self.keywords[row], sign=-1)
+            self.delta_tombstones += 1
+            return
+        row = self._base_row(doc_id)
+        if row is None:
+            return
+        base = self.base
+        self.base_alive[row] = False
+        vector = np.asarray(base.matrix[row], dtype=np.float64) if base.has_embedding[row] else None
+        self._stats(*base.partition_of(row)).add(vector, base.row_keywords(row) or None, sign=-1)
+        self.base_tombstones += 1
+
+    def _append(self, doc_id: str, row: Dict[str, Any]):
+        domain, category = row.get("domain"), row.get("category")
+        vector = None
+        if row.get("embedding"):
+            vector = np.asarray(row["embedding"], dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            if not self.dim:
+                self.dim = vector.shape[0]
+                self.matrix = np.zeros((len(self.alive), self.dim), dtype=np.float32)
+            vector = vector / norm if norm and vector.shape[0] == self.dim else None
+        keywords = set(row["keywords"]) if "keywords" in row else None
+
+        index = self.size
+        if index == len(self.alive):
+            self._grow()
+        if vector is not None:
+            self.matrix[index] = vector
+        self.has_embedding[index] = vector is not None
+        self.document_ids.append(doc_id)
+        self.domains.append(domain)
+        self.categories.append(category)
+        self.keywords.append(keywords)
+        self.alive[index] = True
+        self.size = index + 1
+        self.partitions.setdefault(domain, {}).setdefault(category, []).append(index)
+        self.locations[doc_id] = index
+        self._stats(domain, category).add(vector.astype(np.float64) if vector is not None else None, keywords)
+
+    def _grow(self):
+        # Readers may hold the old arrays; build new ones and swap the references
+        capacity = len(self.alive) * 2
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[:self.size] = self.matrix[:self.size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self.size] = self.alive[:self.size]
+        has_embedding = np.zeros(capacity, dtype=bool)
+        has_embedding[:self.size] = self.has_embedding[:self.size]
+        self.matrix, self.has_embedding, self.alive = matrix, has_embedding, alive
+
+    def route(self, domain: str, top_k: int, query: Optional[np.ndarray] = None,
+              query_keywords: Optional[Set[str]] = None) -> Optional[List[str]]:
+        """Categories to search for the query, or None to search the whole domain"""
+        stats = {c: s for c, s in self.stats.get(domain, {}).items() if s.count > 0}
+        if query is not None:
+            if any(s.embedded <= 0 or s.vector_sum is None for s in stats.values()):
+                return None
+            ranked = []
+            for category, s in stats.items():
+                norm = np.linalg.norm(s.vector_sum)
+                ranked.append((float(s.vector_sum @ query / norm) if norm else -1.0, category, s.count))
+            return select_categories(ranked, Config.RETRIEVAL_ROUTE_CATEGORIES, top_k)
+        profiles = [(category, s.count, s.keyword_counts, s.keyword_docs) for category, s in stats.items()]
+        return route_by_keywords(profiles, query_keywords or set(), Config.RETRIEVAL_ROUTE_CATEGORIES, top_k)
+
+    def delta_view(self) -> Tuple[int, np.ndarray, np.ndarray, np.ndarray]:
+        """Size and arrays of the delta as of now; the arrays are at least size rows long"""
+        # Read size first: arrays are only ever replaced by larger ones before size grows
+        size = self.size
+        return size, self.matrix, self.alive, self.has_embedding
+
+    def _delta_rows(self, domain: str, categories: Optional[List[str]], size: int, alive: np.ndarray) -> np.ndarray:
+        partitions = self.partitions.get(domain, {})
+        names = list(partitions) if categories is None else categories
+        rows = np.array([row for category in names for row in partitions.get(category, [])], dtype=np.int64)
+        if not len(rows):
+            return rows
+        rows = rows[rows < size]
+        return rows[alive[rows]]
+
+    def _position_ids(self, base_spans: List[Tuple[int, ...]], delta_rows: np.ndarray) -> LazyIds:
+        """Ids of positions into the base spans' rows followed by the delta rows"""
+        offsets = np.cumsum([0] + [span[1] - span[0] for span in base_spans]).tolist()
+
+        def lookup(position: int) -> str:
+            if position >= offsets[-1]:
+                return self.document_ids[delta_rows[position - offsets[-1]]]
+            n = bisect_right(offsets, position) - 1
+            return self.base.document_id(base_spans[n][0] + position - offsets[n])
+        return LazyIds(lookup, offsets[-1] + len(delta_rows))
+
+    def search(self, query_embedding: np.ndarray, domain: str, top_k: int) -> List[Tuple[float, str]]:
+        """Top documents by cosine similarity across the base and delta rows of the routed categories"""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if not norm or query.shape[0] != self.dim:
+            return []
+        query = query / norm
+        categories = self.route(domain, top_k, query=query)
+
+        scores = []
+        base = self.base
+        base_spans = base.spans(domain, categories) if base is not None else []
+        for start, end in base_spans:
+            span_scores = base.matrix[start:end] @ query
+            span_scores[~(base.has_embedding[start:end] & self.base_alive[start:end])] = -np.inf
+            scores.append(span_scores)
+        size, matrix, alive, has_embedding = self.delta_view()
+        rows = self._delta_rows(domain, categories, size, alive)
+        if len(rows):
+            delta_scores = matrix[rows] @ query
+            delta_scores[~has_embedding[rows]] = -np.inf
+            scores.append(delta_scores)
+        if not scores:
+            return []
+        scores = np.concatenate(scores)
+        ids = self._position_ids(base_spans, rows)
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), ids[i]) for i in top if np.isfinite(scores[i])]
+
+    def keyword_search(self, query_keywords: Set[str], domain: str, top_k: int) -> List[Tuple[int, str]]:
+        categories = self.route(domain, top_k, query_keywords=query_keywords)
+        if categories == []:
+            return []
+        scores = []
+        base = self.base
+        if base is not None:
+            for start, end in base.spans(domain, categories):
+                overlaps = base.keyword_overlaps(start, end, [query_keywords])[:, 0]
+                overlaps[~self.base_alive[start:end]] = 0
+                scores.extend((int(overlaps[n]), base.document_id(start + n)) for n in np.flatnonzero(overlaps))
+        size, _, alive, _ = self.delta_view()
+        for row in self._delta_rows(domain, categories, size, alive):
+            overlap = len(query_keywords & (self.keywords[row] or set()))
+            if overlap > 0:
+                scores.append((overlap, self.document_ids[row]))
+        scores.sort(reverse=True)
+        return scores[:top_k]
+
+    def _batch_spans(self, domain: str, routes: List[Optional[List[str]]], size: int, alive: np.ndarray
+                     ) -> Tuple[List[Tuple[int, int, int]], np.ndarray, np.ndarray, np.ndarray]:
+        """Base row spans and live delta rows of every category some query was routed to, each labelled
+        with its category's index, and the categories x queries mask of each query's own categories"""
+        base = self.base
+        base_spans = base.category_spans.get(domain, {}) if base is not None else {}
+        if any(route is None for route in routes):
+            categories = list(dict.fromkeys(list(base_spans) + list(self.partitions.get(domain, {}))))
+        else:
+            categories = list(dict.fromkeys(category for route in routes for category in route))
+        spans, delta_rows, delta_labels = [], [], []
+        for i, category in enumerate(categories):
+            # Whole spans are scored in place; their tombstoned rows are masked rather than gathered out
+            spans.extend((start, end, i) for start, end in base_spans.get(category, []))
+            rows = self._delta_rows(domain, [category], size, alive)
+            delta_rows.append(rows)
+            delta_labels.append(np.full(len(rows), i))
+        empty = np.zeros(0, dtype=np.int64)
+        return (spans, np.concatenate(delta_rows + [empty]).astype(np.int64),
+                np.concatenate(delta_labels + [empty]).astype(np.int64),
+                route_mask(np.arange(len(categories)), categories, routes))
+
+    def search_many(self, query_embeddings: np.ndarray, domain: str, top_k: int) -> List[List[Tuple[float, str]]]:
+        """search for a batch of queries: each is routed on its own, then every routed span is scored in place"""
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        if queries.shape[1] != self.dim:
+            return [[] for _ in range(len(queries))]
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = np.divide(queries, norms, out=np.zeros_like(queries), where=norms > 0)
+        routes = [self.route(domain, top_k, query=query) for query in queries]
+        size, matrix, alive, has_embedding = self.delta_view()
+        base_spans, delta_rows, delta_labels, allowed = self._batch_spans(domain, routes, size, alive)
+        base = self.base
+        scores, embedded = [], []
+        for start, end, label in base_spans:
+            scores.append(base.matrix[start:end] @ queries.T)
+            live = base.has_embedding[start:end] & self.base_alive[start:end]
+            embedded.append(live[:, None] & allowed[label][None, :])
+        scores.append(matrix[delta_rows] @ queries.T)
+        embedded.append(has_embedding[delta_rows][:, None] & allowed[delta_labels])
+        scores = np.concatenate(scores)
+        scores[~(np.concatenate(embedded) & (norms[:, 0] > 0)[None, :])] = -np.inf
+        return top_k_per_query(scores, self._position_ids(base_spans, delta_rows), top_k)
+
+    def keyword_search_many(self, query_keywords: List[Set[str]], domain: str,
+                            top_k: int) -> List[List[Tuple[int, str]]]:
+        """keyword_search for a batch of queries in a single pass over the routed rows"""
+        routes = [self.route(domain, top_k, query_keywords=keywords) for keywords in query_keywords]
+        size, _, alive, _ = self.delta_view()
+        base_spans, delta_rows, delta_labels, allowed = self._batch_spans(domain, routes, size, alive)
+        base = self.base
+        overlaps = []
+        for start, end, label in base_spans:
+            span_overlaps = base.keyword_overlaps(start, end, query_keywords)
+            span_overlaps[~(self.base_alive[start:end][:, None] & allowed[label][None, :])] = 0
+            overlaps.append(span_overlaps)
+        delta_overlaps = keyword_overlaps([self.keywords[row] for row in delta_rows], query_keywords)
+        delta_overlaps[~allowed[delta_labels]] = 0
+        overlaps.append(delta_overlaps)
+        return keyword_top_k(np.concatenate(overlaps), self._position_ids(base_spans, delta_rows), top_k)
+
+
+class LiveIndex:
+    """Keeps this worker's IndexState current by consuming changes to the embeddings collection"""
+
+    def __init__(self, embeddings_collection, snapshots: SnapshotIndex, model_name: Optional[str] = None,
+                 poll_interval: float = Config.INDEX_SYNC_POLL_SEC,
+                 use_change_streams: bool = Config.INDEX_SYNC_CHANGE_STREAMS,
+                 lookback_sec: float = Config.INDEX_SYNC_LOOKBACK_SEC,
+                 compaction_threshold: float = Config.INDEX_COMPACTION_THRESHOLD,
+                 compaction_retry_sec: float = Config.INDEX_COMPACTION_RETRY_SEC):
+        self.embeddings_collection = embeddings_collection
+        self.snapshots = snapshots
+        self.model_name = model_name
+        self.poll_interval = poll_interval
+        self.use_change_streams = use_change_streams
+        self.lookback = timedelta(seconds=lookback_sec)
+        self.compaction_threshold = compaction_threshold
+        self.compaction_retry_sec = compaction_retry_sec
+        self.state: Optional[IndexState] = None
+        self.mode = "stopped"
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        # Rows applied to the serving state while a replacement loads, replayed onto it before the swap
+        self._journal: Optional[List[Dict[str, Any]]] = None
+        self._load_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._last_poll: Optional[datetime] = None
+        self._last_sync = 0.0
+        self._compacting = threading.Lock()
+        self._compactions = 0
+        # After an attempt that leaves the ratio over the threshold, wait before the next one
+        self._compaction_backoff = 0.0
+        self._next_compaction = 0.0
+
+    def current(self) -> Optional[IndexState]:
+        """The state to serve from, starting the sync thread in this process if needed; None until loaded"""
+        if self._pid != os.getpid():
+            self._start()
+        return self.state
+
+    def _start(self):
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # Threads do not survive fork: each worker starts its own sync thread and state
+            self._pid = os.getpid()
+            self.state = None
+            self._stop.clear()
+            threading.Thread(target=self._run, name="index-sync", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def apply(self, row: Dict[str, Any]) -> bool:
+        """Apply a row this process just wrote, ahead of the change feed"""
+        with self._write_lock:
+            return self._apply(row)
+
+    def _apply(self, row: Dict[str, Any]) -> bool:
+        """Apply a row to the serving state; the caller holds the write lock"""
+        if self.state is None:
+            return False
+        if self._journal is not None:
+            self._journal.append(row)
+        return self.state.apply(row)
+
+    def _usable_base(self, snapshot: Optional[IndexSnapshot]) -> Optional[IndexSnapshot]:
+        if snapshot is None:
+            return None
+        if self.model_name and snapshot.dim and snapshot.model not in (None, self.model_name):
+            logger.warning(f"Ignoring index snapshot v{snapshot.version} built with {snapshot.model}")
+            return None
+        return snapshot
+
+    def _load(self, base: Optional[IndexSnapshot]):
+        """Build a fresh state on the base from the rows changed since it, then swap it in"""
+        with self._load_lock:
+            state = IndexState(base)
+            with self._write_lock:
+                self._journal = []
+            try:
+                self._catch_up(state, since_seq=state.base_seq)
+                with self._write_lock:
+                    # Rows the serving state received while this one loaded; older versions are skipped
+                    for row in self._journal:
+                        state.apply(row)
+                    self.state = state
+            finally:
+                with self._write_lock:
+                    self._journal = None
+        logger.info(f"Index sync loaded base {f'v{base.version}' if base else '(none)'} "
+                    f"with {state.size} delta rows at seq {state.last_seq}")
+
+    def _catch_up(self, state: Optional[IndexState], since_seq: int) -> int:
+        """Apply rows changed since since_seq to state, or to the published state if None"""
+        query = {"seq": {"$gt": since_seq}}
+        if self._last_poll is not None:
+            # Rows whose sequence was taken before a higher one but committed after it
+            query = {"$or": [query, {"updated_at": {"$gte": self._last_poll - self.lookback}}]}
+        started = datetime.now()
+        applied = 0
+        for row in self.embeddings_collection.find(query).sort("seq", 1):
+            with self._write_lock:
+                applied += state.apply(row) if state is not None else self._apply(row)
+        self._last_poll = started
+        self._last_sync = time.time()
+        return applied
+
+    def _check_base(self):
+        snapshot = self._usable_base(self.snapshots.maybe_reload())
+        state = self.state
+        if state is not None and snapshot is not None and snapshot is not state.base:
+            self._load(snapshot)
+
+    def _run(self):
+        try:
+            self._load(self._usable_base(self.snapshots.maybe_reload()))
+        except PyMongoError as e:
+            logger.error(f"Index sync failed to load: {e}")
+        while not self._stop.is_set():
+            try:
+                if self.state is None:
+                    self._load(self._usable_base(self.snapshots.maybe_reload()))
+                if not (self.use_change_streams and self._watch()):
+                    self.mode = "polling"
+                    self._check_base()
+                    applied = self._catch_up(None, self.state.last_seq)
+                    if applied:
+                        logger.info(f"Index sync applied {applied} changed rows")
+                    self._check_compaction()
+            except Exception as e:
+                # Keep the thread alive; the next pass resumes from the last applied sequence
+                logger.error(f"Index sync error: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def _watch(self) -> bool:
+        """Consume the change stream until it fails; returns False if change streams are unsupported"""
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+        try:
+            stream = self.embeddings_collection.watch(pipeline, full_document="updateLookup",
+                                                      max_await_time_ms=int(self.poll_interval * 1000))
+        except ConnectionFailure:
+            raise
+        except Exception as e:
+            # Standalone servers (and mongomock) have no change streams
+            logger.info(f"Change streams unavailable, polling every {self.poll_interval}s: {e}")
+            self.use_change_streams = False
+            return False
+        self.mode = "change_stream"
+        with stream:
+            # Anything written before the stream opened
+            self._catch_up(None, self.state.last_seq)
+            while not self._stop.is_set() and stream.alive:
+                change = stream.try_next()
+                if change is None:
+                    self._check_base()
+                    self._check_compaction()
+                    self._last_sync = time.time()
+                    continue
+                # Physical deletes arrive without the document; removals are applied from the deleted flag
+                row = change.get("fullDocument")
+                if row is not None:
+                    with self._write_lock:
+                        self._apply(row)
+                    self._last_sync = time.time()
+        return True
+
+    def _check_compaction(self):
+        state = self.state
+        if state is None or state.tombstone_ratio < self.compaction_threshold or self._compacting.locked():
+            return
+        if time.monotonic() < self._next_compaction:
+            return
+        if state.base_tombstones and build_lease_held(self.embeddings_collection.database, self.snapshots.directory):
+            # Another worker is publishing the snapshot that clears them; it arrives through _check_base
+            return
+        threading.Thread(target=self.compact, name="index-compact", daemon=True).start()
+
+    def compact(self) -> Dict[str, Any]:
+        """Drop tombstoned rows by rebuilding dense arrays; safe to call from any thread"""
+        if not self._compacting.acquire(blocking=False):
+            return {"compacted": False, "reason": "compaction already running"}
+        try:
+            state = self.current()
+            if state is None:
+                return {"compacted": False, "reason": "index not loaded"}
+            result = {"base_tombstones": state.base_tombstones, "delta_tombstones": state.delta_tombstones,
+                      "snapshot_version": None, "purged_rows": 0}
+            if state.base_tombstones:
+                # Masked base rows live in the shared snapshot: one worker per node republishes it
+                try:
+                    result.update(self._rebuild_snapshot())
+                except Exception as e:
+                    logger.error(f"Index snapshot rebuild failed: {e}")
+                    result["reason"] = f"snapshot rebuild failed: {e}"
+                self._check_base()
+            if self.state is state and state.delta_tombstones:
+                # No new base was adopted; rebuild this worker's delta without its dead rows
+                self._load(state.base)
+            result["compacted"] = self.state is not state
+            if self.state.tombstone_ratio >= self.compaction_threshold:
+                # Still over the threshold (lease held elsewhere, build failed): do not retry on every poll
+                self._compaction_backoff = min(max(self._compaction_backoff * 2, self.compaction_retry_sec),
+                                               Config.INDEX_COMPACTION_LEASE_SEC)
+                self._next_compaction = time.monotonic() + self._compaction_backoff
+                result["retry_in_sec"] = self._compaction_backoff
+            else:
+                self._compaction_backoff = 0.0
+                self._next_compaction = 0.0
+            if result["compacted"]:
+                self._compactions += 1
+            logger.info(f"Index compaction finished: {result}")
+            return result
+        finally:
+            self._compacting.release()
+
+    def _rebuild_snapshot(self) -> Dict[str, Any]:
+        now = datetime.now()
+        try:
+            version = build_snapshot(self.embeddings_collection, self.snapshots.directory, self.model_name)
+        except SnapshotBusyError:
+            # Another worker holds the lease; its snapshot reaches this one through _check_base
+            return {"reason": "another worker is building a snapshot"}
+        snapshot = self.snapshots.maybe_reload(force=True)
+        # Deleted markers are still needed by workers whose base predates the delete
+        purged = self.embeddings_collection.delete_many({
+            "deleted": True,
+            "seq": {"$lte": snapshot.max_seq if snapshot else 0},
+            "updated_at": {"$lt": now - timedelta(seconds=Config.INDEX_TOMBSTONE_RETENTION_SEC)}
+        }).deleted_count
+        return {"snapshot_version": version, "purged_rows": purged}
+
+    def stats(self) -> Dict[str, Any]:
+        state = self.state
+        return {
+            "pid": os.getpid(),
+            "mode": self.mode,
+            "ready": state is not None,
+            "base_version": state.base.version if state and state.base else None,
+            "base_seq": state.base_seq if state else None,
+            "last_seq": state.last_seq if state else None,
+            "delta_rows": state.size if state else 0,
+            "base_tombstones": state.base_tombstones if state else 0,
+            "delta_tombstones": state.delta_tombstones if state else 0,
+            "tombstone_ratio": round(state.tombstone_ratio, 4) if state else 0.0,
+            "compactions": self._compactions,
+            "live_rows": state.live_rows if state else 0,
+            "seconds_since_sync": round(time.time() - self._last_sync, 1) if self._last_sync else None
+        }
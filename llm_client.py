@@ -0,0 +1,248 @@
+import time
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Dict, Optional
+import numpy as np
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+try:
+    # The AI21 client raises httpx's connection and read errors as they are
+    import httpx
+    TRANSIENT_ERRORS = (httpx.TransportError, ConnectionError, TimeoutError)
+except ImportError:
+    TRANSIENT_ERRORS = (ConnectionError, TimeoutError)
+
+
+class LLMUnavailableError(Exception):
+    """Raised when the LLM provider could not produce a response"""
+
+
+class LLMTimeoutError(LLMUnavailableError):
+    """Raised when a call does not complete before its deadline"""
+
+
+class CircuitOpenError(LLMUnavailableError):
+    """Raised when the circuit breaker is failing calls fast"""
+
+
+# Request timeouts, rate limiting and server errors are worth another attempt; other statuses mean the
+# request itself is wrong and would fail the same way again
+RETRYABLE_STATUS_CODES = {408, 429}
+
+
+def is_retryable(error: Exception) -> bool:
+    """Return True if the error is transient on the provider side rather than a client-side mistake"""
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    status_code = getattr(error, "status_code", None)
+    return isinstance(status_code, int) and (status_code in RETRYABLE_STATUS_CODES or status_code >= 500)
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = Config.LLM_BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = Config.LLM_BREAKER_RESET_SEC):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow_request(self) -> bool:
+        """Return True if a call may go through; admits a single trial call once the reset timeout expires"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self._state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """End a half-open trial call that says nothing about the provider's health"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning("LLM circuit breaker opened after %d consecutive failures", self._consecutive_failures)
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 500):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Return the p-th percentile of the recent latencies in seconds, or None without samples"""
+        with self._lock:
+            if not self._samples:
+                return None
+            return float(np.percentile(list(self._samples), p))
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        return {f"p{p}": self.percentile(p) for p in (50, 95, 99)}
+
+
+class ResilientLLM:
+    """Wraps an AI21 client with per-call deadlines, bounded retries, hedged requests and a circuit breaker"""
+
+    def __init__(self, client, timeout_sec: float = Config.LLM_TIMEOUT_SEC,
+                 max_retries: int = Config.LLM_MAX_RETRIES,
+                 hedge_enabled: bool = Config.LLM_HEDGE_ENABLED,
+                 hedge_percentile: float = Config.LLM_HEDGE_PERCENTILE,
+                 hedge_min_samples: int = Config.LLM_HEDGE_MIN_SAMPLES,
+                 breaker: Optional[CircuitBreaker] = None,
+                 max_workers: int = Config.LLM_MAX_WORKERS):
+        self.client = client
+        self.timeout_sec = timeout_sec
+        self.max_retries = max_retries
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies = LatencyTracker()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        self._counters = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "client_errors": 0,
+            "timeouts": 0,
+            "retries": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "short_circuited": 0
+        }
+        self._counters_lock = threading.Lock()
+
+    def _count(self, name: str, amount: int = 1):
+        with self._counters_lock:
+            self._counters[name] += amount
+
+    def create(self, timeout_sec: Optional[float] = None, **kwargs) -> Any:
+        """Call chat.completions.create with the configured deadline, retries, hedging and breaker"""
+        self._count("calls")
+        if not self.breaker.allow_request():
+            self._count("short_circuited")
+            raise CircuitOpenError("LLM provider is unavailable (circuit open)")
+
+        deadline = time.monotonic() + (timeout_sec or self.timeout_sec)
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                response = self._call_with_deadline(kwargs, deadline)
+            except LLMTimeoutError:
+                self._count("timeouts")
+                self._count("failures")
+                self.breaker.record_failure()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    # A bad request or credentials fail every attempt and are not the provider's fault
+                    self._count("client_errors")
+                    self.breaker.release_trial()
+                    raise
+                backoff = min(0.25 * (2 ** attempt), 2.0) * random.uniform(0.5, 1.0)
+                if attempt < self.max_retries and deadline - time.monotonic() > backoff:
+                    attempt += 1
+                    self._count("retries")
+                    logger.warning("LLM call failed (%s), retrying in %.2fs", e, backoff)
+                    time.sleep(backoff)
+                    continue
+                self._count("failures")
+                self.breaker.record_failure()
+                raise LLMUnavailableError(f"LLM call failed: {e}") from e
+
+            self.latencies.record(time.monotonic() - started)
+            self._count("successes")
+            self.breaker.record_success()
+            return response
+
+    def _invoke(self, kwargs: Dict[str, Any]) -> Any:
+        return self.client.chat.completions.create(**kwargs)
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before sending a duplicate request, or None if hedging is off or uncalibrated"""
+        if not self.hedge_enabled or len(self.latencies) < self.hedge_min_samples:
+            return None
+        return self.latencies.percentile(self.hedge_percentile)
+
+    def _call_with_deadline(self, kwargs: Dict[str, Any], deadline: float) -> Any:
+        primary = self._executor.submit(self._invoke, kwargs)
+        pending = {primary}
+
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is not None and hedge_delay < deadline - time.monotonic():
+            done, _ = wait(pending, timeout=hedge_delay)
+            if not done:
+                self._count("hedges")
+                pending.add(self._executor.submit(self._invoke, kwargs))
+
+        error = None
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+
+        if pending:
+            # The abandoned calls keep running in the pool but their results are discarded
+            raise LLMTimeoutError("LLM call exceeded its deadline")
+        raise error
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counters_lock:
+            counters = dict(self._counters)
+        return {
+            **counters,
+            "breaker_state": self.breaker.state,
+            "latency_sec": self.latencies.summary(),
+            "hedge_delay_sec": self._hedge_delay()
+        }
@@ -0,0 +1,289 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import itertools
+import threading
+import urllib.request
+import urllib.error
+from typing import Any, Dict, Iterator, List, Optional
+import numpy as np
+
+# Load generator for capacity planning. Virtual users run /analyze + /chat sessions
+# (synthesized, or replayed from a JSONL file) at stepped concurrency levels and the
+# report gives throughput, latency percentiles and error rates per route.
+#
+#   python loadtest.py --concurrency 1,4,16 --duration 30                      # in-process app, mongomock, stub LLM
+#   python loadtest.py --mongo mongodb://localhost:27017 --llm-latency lognormal:1.5,0.4
+#   python loadtest.py --target http://127.0.0.1:8000 --concurrency 8,32      # an already running deployment
+
+CHAT_MESSAGES = {
+    "acknowledgement": ["thanks!", "ok", "got it", "great, thank you"],
+    "clarification": ["what does that mean?", "can you explain the score?", "why is it high?"],
+    "deep": [
+        "How should I rebalance my portfolio over the next five years given my risk tolerance and current debt?",
+        "What concrete steps can I take this quarter to reduce my overall risk score, and in what order?",
+        "Compare paying down my liabilities against building a larger emergency fund for my situation."
+    ]
+}
+
+
+def synthetic_profile(domain: str) -> Dict[str, Any]:
+    if domain == "finance":
+        return {
+            "name": f"LoadUser{random.randint(1, 10 ** 6)}",
+            "age": str(random.randint(22, 70)),
+            "income": str(random.randrange(20000, 250000, 1000)),
+            "monthly_expenses": str(random.randrange(1000, 12000, 100)),
+            "emergency_fund": str(random.randrange(0, 60000, 500)),
+            "liabilities": str(random.randrange(0, 300000, 1000)),
+            "tolerance": random.choice(["conservative", "moderate", "aggressive"]),
+            "time_horizon": str(random.randint(1, 30)),
+            "savings_rate": str(random.randint(0, 40))
+        }
+    return {
+        "name": f"LoadUser{random.randint(1, 10 ** 6)}",
+        "age": str(random.randint(18, 85)),
+        "height": str(random.randint(150, 200)),
+        "weight": str(random.randint(45, 130)),
+        "exercise": random.choice(["none", "light", "moderate", "heavy"]),
+        "smoking": random.choice(["never", "former", "occasional", "regular"]),
+        "alcohol": random.choice(["none", "moderate", "heavy"]),
+        "stress": str(random.randint(1, 10)),
+        "sleep": str(random.choice([5, 6, 7, 8, 9, 10])),
+        "family_history": random.choice(["none", "heart", "diabetes", "cancer", "multiple"]),
+        "diet": random.choice(["poor", "average", "good", "excellent"])
+    }
+
+
+def synthetic_session(chat_turns: int, think_time: float, fast_ratio: float) -> List[Dict[str, Any]]:
+    """One /analyze followed by a mix of short and deep chat questions"""
+    domain = random.choice(["finance", "health"])
+    analyze = {"domain": domain, "data": synthetic_profile(domain)}
+    if random.random() < fast_ratio:
+        analyze["mode"] = "fast"
+    steps = [{"method": "POST", "path": "/analyze", "json": analyze, "think": think_time}]
+    for _ in range(random.randint(0, chat_turns)):
+        kind = random.choices(list(CHAT_MESSAGES), weights=[2, 3, 5])[0]
+        steps.append({
+            "method": "POST", "path": "/chat",
+            "json": {"message": random.choice(CHAT_MESSAGES[kind])},
+            "think": think_time
+        })
+    return steps
+
+
+def load_sessions(path: str) -> List[List[Dict[str, Any]]]:
+    """Read recorded sessions, one JSON object per line: {"steps": [{"method", "path", "json", "think"}, ...]}"""
+    sessions = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                sessions.append(json.loads(line)["steps"])
+    return sessions
+
+
+def route_name(path: str) -> str:
+    # Collapse ids so /chat/history/<id> style paths aggregate into one row
+    parts = path.split("?")[0].rstrip("/").split("/")
+    return "/".join(p if len(p) < 20 else "<id>" for p in parts) or "/"
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, route: str, status: str, latency: float, ok: bool):
+        with self._lock:
+            self.samples.setdefault(route, []).append(latency)
+            counts = self.statuses.setdefault(route, {})
+            counts[status] = counts.get(status, 0) + 1
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+    def report(self, elapsed: float) -> Dict[str, Dict[str, Any]]:
+        routes = {}
+        for route, samples in sorted(self.samples.items()):
+            latencies = np.array(samples)
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            routes[route] = {
+                "requests": len(samples),
+                "throughput_rps": round(len(samples) / elapsed, 2),
+                "p50_ms": round(p50 * 1000, 1),
+                "p95_ms": round(p95 * 1000, 1),
+                "p99_ms": round(p99 * 1000, 1),
+                "error_rate": round(self.errors.get(route, 0) / len(samples), 4),
+                "statuses": self.statuses[route]
+            }
+        return routes
+
+
+class LoadTester:
+    def __init__(self, target: str, sessions: Optional[List[List[Dict[str, Any]]]] = None,
+                 chat_turns: int = 4, think_time: float = 0.0, fast_ratio: float = 0.0,
+                 timeout: float = 60.0):
+        self.target = target.rstrip("/")
+        self.sessions = sessions
+        self.chat_turns = chat_turns
+        self.think_time = think_time
+        self.fast_ratio = fast_ratio
+        self.timeout = timeout
+        self._clients = itertools.count(1)
+
+    def _session_steps(self) -> List[Dict[str, Any]]:
+        if self.sessions:
+            return random.choice(self.sessions)
+        return synthetic_session(self.chat_turns, self.think_time, self.fast_ratio)
+
+    def _send(self, step: Dict[str, Any], client_ip: str, recorder: Recorder) -> Optional[bytes]:
+        payload = None
+        body = json.dumps(step["json"]).encode("utf-8") if "json" in step else None
+        req = urllib.request.Request(
+            self.target + step["path"],
+            data=body,
+            method=step.get("method", "POST" if body else "GET"),
+            headers={"Content-Type": "application/json", "X-Forwarded-For": client_ip}
+        )
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                payload = resp.read()
+                status, ok = str(resp.status), True
+                # The app reports some failures inside a 200 body
+                if b'"error"' in payload[:200]:
+                    ok = False
+        except urllib.error.HTTPError as e:
+            e.read()
+            status, ok = str(e.code), False
+        except Exception as e:
+            status, ok = type(e).__name__, False
+        recorder.record(route_name(step["path"]), status, time.perf_counter() - started, ok)
+        return payload
+
+    def _virtual_user(self, deadline: float, recorder: Recorder):
+        while time.monotonic() < deadline:
+            # Each session looks like a distinct client so per-client rate limits apply as in production
+            n = next(self._clients)
+            client_ip = f"10.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255}"
+            assessment_id = None
+            for step in self._session_steps():
+                if time.monotonic() >= deadline:
+                    return
+                if step["path"] == "/chat" and assessment_id:
+                    # Chat follow-ups name the analysis they continue, as the browser client does
+                    step = {**step, "json": {**step["json"], "assessment_id": assessment_id}}
+                payload = self._send(step, client_ip, recorder)
+                if step["path"] == "/analyze" and payload:
+                    assessment_id = json.loads(payload).get("assessment_id")
+                if step.get("think"):
+                    time.sleep(step["think"])
+
+    def run_step(self, concurrency: int, duration: float) -> Dict[str, Any]:
+        recorder = Recorder()
+        deadline = time.monotonic() + duration
+        started = time.perf_counter()
+        threads = [threading.Thread(target=self._virtual_user, args=(deadline, recorder), daemon=True)
+                   for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return {"concurrency": concurrency, "elapsed_sec": round(elapsed, 2), "routes": recorder.report(elapsed)}
+
+    def run(self, levels: List[int], duration: float, warmup: float = 0.0) -> Iterator[Dict[str, Any]]:
+        if warmup:
+            self.run_step(max(1, levels[0]), warmup)
+        for concurrency in levels:
+            yield self.run_step(concurrency, duration)
+
+
+def print_step(step: Dict[str, Any]):
+    print(f"\n== concurrency {step['concurrency']} ({step['elapsed_sec']}s) ==")
+    print(f"{'route':<24}{'reqs':>7}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}  statuses")
+    for route, r in step["routes"].items():
+        statuses = " ".join(f"{k}:{v}" for k, v in sorted(r["statuses"].items()))
+        print(f"{route:<24}{r['requests']:>7}{r['throughput_rps']:>9}{r['p50_ms']:>10}{r['p95_ms']:>10}"
+              f"{r['p99_ms']:>10}{r['error_rate']:>9.1%}  {statuses}")
+
+
+def start_local_app(mongo: str, port: int, args: argparse.Namespace) -> str:
+    """Serve the app in-process against a stub LLM and the chosen MongoDB; returns its base URL"""
+    from stub_ai21_server import apply_stub_arguments, start_stub_server
+    apply_stub_arguments(args, prefix="llm_")
+    stub = start_stub_server()
+    stub_host, stub_port = stub.server_address[:2]
+
+    os.environ["AI21_API_HOST"] = f"http://{stub_host}:{stub_port}"
+    os.environ.setdefault("AI21_API_KEY", "loadtest")
+    os.environ.setdefault("DB_NAME", "risk_mirror_loadtest")
+    # Virtual users are told apart by X-Forwarded-For
+    os.environ["ADMISSION_TRUST_FORWARDED"] = "true"
+    if mongo == "mongomock":
+        import mongomock
+        import pymongo
+        pymongo.MongoClient = mongomock.MongoClient
+    else:
+        os.environ["MONGODB_URL"] = mongo
+        os.environ["MONGODB_URI"] = mongo
+
+    from werkzeug.serving import make_server
+    from app import app
+    # Per-request access logs would drown the report
+    for name in ("werkzeug", "httpx"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def main():
+    from stub_ai21_server import add_stub_arguments
+    parser = argparse.ArgumentParser(description="Stepped-concurrency load test for /analyze and /chat")
+    parser.add_argument("--target", help="Base URL of a running app; omit to serve the app in-process")
+    parser.add_argument("--mongo", default="mongomock", help="In-process mode: 'mongomock' or a MongoDB URI")
+    parser.add_argument("--port", type=int, default=0, help="In-process mode: port to serve on (0 = any free port)")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated virtual user counts, one step each")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per concurrency step")
+    parser.add_argument("--warmup", type=float, default=0, help="Seconds of unreported load before the first step")
+    parser.add_argument("--replay", help="JSONL file of recorded sessions to replay instead of synthetic ones")
+    parser.add_argument("--chat-turns", type=int, default=4, help="Max chat messages per synthetic session")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Pause after each request in seconds")
+    parser.add_argument("--fast-ratio", type=float, default=0.0, help="Fraction of analyses sent with mode=fast")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Client-side request timeout")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible session mixes")
+    parser.add_argument("--output", help="Write the full results as JSON to this file")
+    add_stub_arguments(parser.add_argument_group("stub LLM (in-process mode)"), prefix="llm-")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    target = args.target or start_local_app(args.mongo, args.port, args)
+    tester = LoadTester(
+        target,
+        sessions=load_sessions(args.replay) if args.replay else None,
+        chat_turns=args.chat_turns,
+        think_time=args.think_time,
+        fast_ratio=args.fast_ratio,
+        timeout=args.timeout
+    )
+    levels = [int(level) for level in args.concurrency.split(",")]
+    print(f"Load testing {target} at concurrency {levels}, {args.duration}s per step", file=sys.stderr)
+
+    results = []
+    for step in tester.run(levels, args.duration, args.warmup):
+        print_step(step)
+        results.append(step)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"target": target, "steps": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
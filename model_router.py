@@ -0,0 +1,164 @@
+import re
+import json
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from config import Config
+from llm_client import LatencyTracker
+
+logger = logging.getLogger(__name__)
+
+# Model tiers and their prices in USD per 1K tokens
+DEFAULT_TIERS = {
+    "large": {"model": "jamba-large", "max_tokens": 2048, "input_cost_per_1k": 0.002, "output_cost_per_1k": 0.008},
+    "mini": {"model": "jamba-mini", "max_tokens": 512, "input_cost_per_1k": 0.0002, "output_cost_per_1k": 0.0004}
+}
+
+# Evaluated in order; the first rule whose conditions all hold picks the tier and token budget
+DEFAULT_RULES = [
+    {"route": "analyze", "tier": "large", "max_tokens": 2048},
+    {"route": "chat", "intent": ["acknowledgement"], "tier": "mini", "max_tokens": 128},
+    {"route": "chat", "intent": ["clarification"], "max_chars": 200, "tier": "mini", "max_tokens": 384},
+    {"route": "chat", "intent": ["deep"], "tier": "large", "max_tokens": 1024},
+    {"route": "chat", "has_context": False, "tier": "mini", "max_tokens": 512},
+    {"route": "chat", "tier": "large", "max_tokens": 768}
+]
+
+ACKNOWLEDGEMENT_PATTERN = re.compile(
+    r"^\s*(thanks?( you)?|thank u|thx|ok(ay)?|cool|great|got it|perfect|awesome|nice|bye|goodbye|understood|sounds good)[\s!.,]*$",
+    re.IGNORECASE
+)
+DEEP_KEYWORDS = {
+    "plan", "strategy", "strategies", "compare", "comparison", "detailed", "explain", "breakdown",
+    "step", "steps", "portfolio", "scenario", "scenarios", "analyze", "analysis", "projection", "optimize"
+}
+QUESTION_WORDS = {"what", "why", "how", "when", "which", "who", "where", "is", "are", "can", "should", "does", "do"}
+
+
+def classify_message(message: str) -> str:
+    """Cheaply label a chat message as acknowledgement, clarification or deep"""
+    if not message or ACKNOWLEDGEMENT_PATTERN.match(message):
+        return "acknowledgement"
+    words = re.findall(r"[a-z']+", message.lower())
+    if DEEP_KEYWORDS.intersection(words) or len(words) > 40:
+        return "deep"
+    if len(words) <= 8 or (len(words) <= 20 and (message.strip().endswith("?") or words[0] in QUESTION_WORDS)):
+        return "clarification"
+    return "deep"
+
+
+@dataclass
+class RoutingDecision:
+    tier: str
+    model: str
+    max_tokens: int
+    signals: Dict[str, Any] = field(default_factory=dict)
+
+
+class TierStats:
+    def __init__(self, input_cost_per_1k: float, output_cost_per_1k: float):
+        self.input_cost_per_1k = input_cost_per_1k
+        self.output_cost_per_1k = output_cost_per_1k
+        self.latencies = LatencyTracker()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost_usd = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency_sec: float, prompt_tokens: int, completion_tokens: int):
+        self.latencies.record(latency_sec)
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.cost_usd += (prompt_tokens * self.input_cost_per_1k + completion_tokens * self.output_cost_per_1k) / 1000
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cost_usd": round(self.cost_usd, 6),
+                "avg_cost_usd": round(self.cost_usd / self.calls, 6) if self.calls else None,
+                "latency_sec": self.latencies.summary()
+            }
+
+
+class ModelRouter:
+    """Picks a model tier and output token budget per request from cheap local signals"""
+
+    def __init__(self, tiers: Optional[Dict[str, Dict[str, Any]]] = None, rules: Optional[List[Dict[str, Any]]] = None):
+        self.tiers = tiers or _load_json_setting(Config.LLM_TIERS, DEFAULT_TIERS)
+        self.rules = rules or _load_json_setting(Config.LLM_ROUTING_RULES, DEFAULT_RULES)
+        for rule in self.rules:
+            if rule.get("tier") not in self.tiers:
+                raise ValueError(f"Routing rule references unknown tier: {rule.get('tier')}")
+        self.stats = {
+            name: TierStats(tier.get("input_cost_per_1k", 0.0), tier.get("output_cost_per_1k", 0.0))
+            for name, tier in self.tiers.items()
+        }
+
+    def route(self, route: str, message: str = "", domain: Optional[str] = None, has_context: bool = False) -> RoutingDecision:
+        signals = {
+            "route": route,
+            "intent": classify_message(message) if route == "chat" else None,
+            "chars": len(message or ""),
+            "domain": domain,
+            "has_context": has_context
+        }
+        for rule in self.rules:
+            if self._matches(rule, signals):
+                return self._decision(rule["tier"], rule.get("max_tokens"), signals)
+        # No rule matched: fall back to the largest tier with its default budget
+        fallback = max(self.tiers, key=lambda name: self.tiers[name]["max_tokens"])
+        return self._decision(fallback, None, signals)
+
+    def _matches(self, rule: Dict[str, Any], signals: Dict[str, Any]) -> bool:
+        if "route" in rule and rule["route"] != signals["route"]:
+            return False
+        if "intent" in rule and signals["intent"] not in rule["intent"]:
+            return False
+        if "domain" in rule and signals["domain"] not in rule["domain"]:
+            return False
+        if "has_context" in rule and rule["has_context"] != signals["has_context"]:
+            return False
+        if "max_chars" in rule and signals["chars"] > rule["max_chars"]:
+            return False
+        if "min_chars" in rule and signals["chars"] < rule["min_chars"]:
+            return False
+        return True
+
+    def _decision(self, tier: str, max_tokens: Optional[int], signals: Dict[str, Any]) -> RoutingDecision:
+        tier_config = self.tiers[tier]
+        return RoutingDecision(
+            tier=tier,
+            model=tier_config["model"],
+            max_tokens=min(max_tokens or tier_config["max_tokens"], tier_config["max_tokens"]),
+            signals=signals
+        )
+
+    def record(self, decision: RoutingDecision, latency_sec: float, response: Any = None):
+        """Record latency and token usage of a completed call against its tier"""
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        self.stats[decision.tier].record(latency_sec, prompt_tokens, completion_tokens)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "tiers": {name: stats.summary() for name, stats in self.stats.items()},
+            "rules": self.rules
+        }
+
+
+def _load_json_setting(raw: Optional[str], default):
+    if not raw:
+        return default
+    try:
+        return json.loads(raw)
+    except ValueError as e:
+        logger.error(f"Invalid routing configuration, using defaults: {e}")
+        return default
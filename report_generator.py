@@ -0,0 +1,245 @@
+from typing import List, Dict, Any, Optional, Tuple
+
+# Deterministic Risk Mirror report built from locally computed risk factors and
+# retrieved guidelines. Mirrors the section layout requested from the LLM in app.analyze().
+
+HIGH = "High"
+MODERATE = "Moderate"
+LOW = "Low"
+
+
+def _to_float(value, default: float) -> Optional[float]:
+    try:
+        return float(value if value not in (None, "") else default)
+    except (ValueError, TypeError):
+        return None
+
+
+def _fmt(value: Optional[float]) -> str:
+    return f"{value:g}" if value is not None else "n/a"
+
+
+def _factor(name: str, category: str, level: str, finding: str, recommendation: str) -> Dict[str, str]:
+    return {
+        "name": name,
+        "category": category,
+        "level": level,
+        "finding": finding,
+        "recommendation": recommendation
+    }
+
+
+def financial_risk_factors(data: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Break a financial profile down into the five risk areas of the Risk Mirror report"""
+    factors = []
+    income = _to_float(data.get('income'), 0)
+    monthly_expenses = _to_float(data.get('monthly_expenses'), 0)
+    emergency_fund = _to_float(data.get('emergency_fund'), 0)
+    liabilities = _to_float(data.get('liabilities'), 0)
+    savings_rate = _to_float(data.get('savings_rate'), 10)
+    time_horizon = _to_float(data.get('time_horizon'), 10)
+    age = _to_float(data.get('age'), 35)
+    tolerance = data.get('tolerance', 'moderate')
+
+    # Liquidity
+    if monthly_expenses and emergency_fund is not None:
+        months = emergency_fund / monthly_expenses
+        level = HIGH if months < 3 else LOW if months > 6 else MODERATE
+        factors.append(_factor(
+            "Liquidity Risk", "liquidity_risk", level,
+            f"Emergency fund covers {months:.1f} months of expenses (target: 3-6 months).",
+            "Build the emergency fund to at least 3 months of expenses in a liquid savings account."
+            if level == HIGH else "Keep the emergency fund in liquid, low-risk accounts and top it up as expenses grow."
+        ))
+    else:
+        factors.append(_factor(
+            "Liquidity Risk", "liquidity_risk", MODERATE,
+            "Monthly expenses were not provided, so emergency fund coverage could not be measured.",
+            "Track monthly expenses and hold 3-6 months of them in an emergency fund."
+        ))
+
+    # Debt
+    if income and liabilities is not None:
+        debt_ratio = liabilities / income
+        level = HIGH if debt_ratio > 0.4 else LOW if debt_ratio < 0.2 else MODERATE
+        factors.append(_factor(
+            "Debt Risk", "debt_risk", level,
+            f"Liabilities are {debt_ratio:.0%} of annual income.",
+            "Prioritize paying down high-interest debt and avoid new borrowing until the ratio falls below 36%."
+            if level == HIGH else "Maintain current repayment discipline and keep the debt ratio below 36%."
+        ))
+    else:
+        factors.append(_factor(
+            "Debt Risk", "debt_risk", MODERATE,
+            "Income or liabilities were not provided, so the debt ratio could not be measured.",
+            "Keep total debt payments below 36% of income."
+        ))
+
+    # Investment
+    if time_horizon is not None:
+        if tolerance == 'aggressive' and time_horizon < 5:
+            level, finding = HIGH, f"Aggressive risk tolerance with a short {time_horizon:.0f}-year horizon."
+            recommendation = "Shift short-horizon money toward bonds and cash to reduce drawdown risk."
+        elif tolerance == 'conservative' and time_horizon > 20:
+            level, finding = MODERATE, f"Conservative allocation over a long {time_horizon:.0f}-year horizon may limit growth."
+            recommendation = "Consider a higher equity share for long-term goals to offset inflation."
+        else:
+            level, finding = LOW, f"{str(tolerance).title()} risk tolerance is consistent with a {time_horizon:.0f}-year horizon."
+            recommendation = "Rebalance annually to keep the allocation aligned with your risk tolerance."
+        factors.append(_factor("Investment Risk", "investment_risk", level, finding, recommendation))
+
+    # Income
+    if income and monthly_expenses is not None:
+        expense_ratio = monthly_expenses * 12 / income
+        level = HIGH if expense_ratio > 0.8 else LOW if expense_ratio < 0.5 else MODERATE
+        factors.append(_factor(
+            "Income Risk", "income_risk", level,
+            f"Annual expenses consume {expense_ratio:.0%} of income.",
+            "Reduce fixed expenses and develop a secondary income source to widen the margin."
+            if level == HIGH else "Invest in skills and keep expenses well below income to protect against income shocks."
+        ))
+
+    # Retirement
+    if savings_rate is not None:
+        level = HIGH if savings_rate < 10 else LOW if savings_rate > 20 else MODERATE
+        age_note = f" at age {age:.0f}" if age is not None else ""
+        factors.append(_factor(
+            "Retirement Risk", "retirement_risk", level,
+            f"Saving {savings_rate:.0f}% of income{age_note} (target: 10-15%).",
+            "Raise the savings rate to at least 10% using tax-advantaged retirement accounts."
+            if level == HIGH else "Continue contributing to tax-advantaged accounts and review the plan yearly."
+        ))
+    return factors
+
+
+def health_risk_factors(data: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Break a health profile down into the five risk areas of the Risk Mirror report"""
+    factors = []
+    height = _to_float(data.get('height'), 170)
+    weight = _to_float(data.get('weight'), 70)
+    stress = _to_float(data.get('stress'), 5)
+    sleep = _to_float(data.get('sleep'), 7)
+    exercise = data.get('exercise', 'none')
+    smoking = data.get('smoking', 'never')
+    alcohol = data.get('alcohol', 'none')
+    diet = data.get('diet', 'average')
+    family_history = data.get('family_history', 'none')
+
+    # Cardiovascular
+    cv_points = {'regular': 2, 'occasional': 1}.get(smoking, 0)
+    cv_points += 1 if family_history in ('heart', 'multiple') else 0
+    cv_points += 1 if stress is not None and stress >= 8 else 0
+    cv_level = HIGH if cv_points >= 2 else MODERATE if cv_points == 1 else LOW
+    factors.append(_factor(
+        "Cardiovascular Risk", "cardiovascular_risk", cv_level,
+        f"Smoking: {smoking}; family history: {family_history}; stress level: {_fmt(stress)}/10.",
+        "Schedule a blood pressure and cholesterol check and address smoking and stress first."
+        if cv_level == HIGH else "Keep blood pressure below 130/80 and cholesterol below 200 mg/dL with regular checkups."
+    ))
+
+    # Metabolic
+    if height and weight is not None:
+        bmi = weight / ((height / 100) ** 2)
+        level = HIGH if bmi < 18.5 or bmi > 30 else MODERATE if bmi > 25 else LOW
+        factors.append(_factor(
+            "Metabolic Risk", "metabolic_risk", level,
+            f"BMI is {bmi:.1f} (normal range: 18.5-24.9).",
+            "Work with a clinician on a nutrition plan to move BMI toward the normal range."
+            if level != LOW else "Maintain current weight with a balanced diet and regular activity."
+        ))
+
+    # Lifestyle
+    lifestyle_points = {'none': 2, 'light': 1}.get(exercise, 0)
+    lifestyle_points += 1 if sleep is not None and (sleep < 6 or sleep > 9) else 0
+    lifestyle_points += 1 if stress is not None and stress >= 6 else 0
+    lifestyle_level = HIGH if lifestyle_points >= 3 else MODERATE if lifestyle_points >= 1 else LOW
+    factors.append(_factor(
+        "Lifestyle Risk", "lifestyle_risk", lifestyle_level,
+        f"Exercise: {exercise}; sleep: {_fmt(sleep)} hours; stress level: {_fmt(stress)}/10.",
+        "Aim for 150 minutes of moderate exercise weekly and 7-9 hours of sleep nightly."
+        if lifestyle_level != LOW else "Keep up regular exercise, consistent sleep and stress management."
+    ))
+
+    # Behavioral
+    behavioral_points = {'regular': 2, 'occasional': 1, 'former': 0}.get(smoking, 0)
+    behavioral_points += {'heavy': 2, 'moderate': 1}.get(alcohol, 0)
+    behavioral_points += 1 if diet == 'poor' else 0
+    behavioral_level = HIGH if behavioral_points >= 2 else MODERATE if behavioral_points == 1 else LOW
+    factors.append(_factor(
+        "Behavioral Risk", "lifestyle_risk", behavioral_level,
+        f"Smoking: {smoking}; alcohol: {alcohol}; diet: {diet}.",
+        "Seek support to stop smoking, limit alcohol and improve diet quality."
+        if behavioral_level != LOW else "Maintain healthy habits around diet, alcohol and tobacco."
+    ))
+
+    # Genetic
+    genetic_level = HIGH if family_history == 'multiple' else MODERATE if family_history in ('heart', 'diabetes', 'cancer') else LOW
+    factors.append(_factor(
+        "Genetic Risk", "cardiovascular_risk", genetic_level,
+        f"Family history: {family_history}.",
+        "Discuss earlier and more frequent screenings with your doctor based on family history."
+        if genetic_level != LOW else "Follow standard age-appropriate preventive screenings."
+    ))
+    return factors
+
+
+# Domains with a Risk Mirror report; a ruleset alone is enough for scoring and /whatif but not for a report
+REPORT_TEMPLATES = {
+    "finance": {"label": "Financial", "factors": financial_risk_factors},
+    "health": {"label": "Health", "factors": health_risk_factors}
+}
+
+
+def _executive_summary(label: str, risk_score: float, risk_category: str, factors: List[Dict[str, str]]) -> List[str]:
+    high = [f["name"] for f in factors if f["level"] == HIGH]
+    low = [f["name"] for f in factors if f["level"] == LOW]
+    lines = [
+        "🎯 EXECUTIVE SUMMARY",
+        f"- Overall {label} Risk Score: {risk_score:.1f}/10 (calculated)",
+        f"- Risk Category: {risk_category}"
+    ]
+    if high:
+        lines.append(f"- Areas needing attention: {', '.join(high)}")
+    if low:
+        lines.append(f"- Strengths: {', '.join(low)}")
+    return lines
+
+
+def _guideline_for(category: str, documents: List[Dict[str, Any]]) -> Optional[str]:
+    for doc in documents:
+        if doc.get("category") == category:
+            return doc.get("title")
+    return None
+
+
+def generate_report(domain: str, personal_data: Dict[str, Any], risk_score: float, risk_category: str,
+                    documents: Optional[List[Dict[str, Any]]] = None) -> Tuple[str, List[Dict[str, str]]]:
+    """Render the Risk Mirror report without the LLM; returns the report text and the factors used"""
+    documents = documents or []
+    template = REPORT_TEMPLATES.get(domain)
+    if template is None:
+        raise ValueError(f"No report template for domain: {domain}")
+    label = template["label"]
+    factors = template["factors"](personal_data)
+    analysis_heading = f"📊 COMPREHENSIVE {label.upper()} ANALYSIS"
+    recommendations_heading = f"💡 PERSONALIZED {label.upper()} RECOMMENDATIONS"
+
+    lines = _executive_summary(label, risk_score, risk_category, factors)
+    lines += ["", analysis_heading]
+    for i, factor in enumerate(factors, 1):
+        lines.append(f"{i}. **{factor['name']}** ({factor['level']}) - {factor['finding']}")
+        guideline = _guideline_for(factor["category"], documents)
+        if guideline:
+            lines.append(f"   Reference: {guideline}")
+
+    # Highest-risk areas first so the most urgent actions lead
+    order = {HIGH: 0, MODERATE: 1, LOW: 2}
+    lines += ["", recommendations_heading]
+    for factor in sorted(factors, key=lambda f: order[f["level"]]):
+        lines.append(f"- {factor['recommendation']}")
+
+    if documents:
+        lines += ["", "📚 GUIDELINES CONSULTED"]
+        lines += [f"- {doc.get('title')}" for doc in documents]
+
+    return "\n".join(lines), factors
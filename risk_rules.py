@@ -0,0 +1,514 @@
+import os
+import json
+import math
+import time
+import operator
+import logging
+import threading
+from bisect import bisect_right
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Risk scoring rules as data. A ruleset lists typed input fields, derived values computed from them,
+# and rules evaluated in order; each rule is an if/elif ladder of bands, the first band whose
+# conditions all hold adds its weight. The total starts at base and is clamped.
+#
+# Every rule is compiled once into a lookup table: the thresholds it compares a value against
+# split that value's range into regions, and the table holds the weight of every combination of
+# regions. Scoring a profile is then one bisect per value and one table read per rule, and scoring arrays
+# is the same with np.searchsorted and fancy indexing, so both paths give bit-identical results.
+
+DEFAULT_RULESETS = {
+    "finance": {
+        "version": 1,
+        "base": 5.0,
+        "clamp": [1.0, 10.0],
+        "fields": {
+            "age": {"type": "int", "default": 35},
+            "income": {"type": "float", "default": 0},
+            "monthly_expenses": {"type": "float", "default": 0},
+            "emergency_fund": {"type": "float", "default": 0},
+            "liabilities": {"type": "float", "default": 0},
+            "tolerance": {"type": "str", "default": "moderate"},
+            "time_horizon": {"type": "int", "default": 10},
+            "savings_rate": {"type": "float", "default": 10}
+        },
+        "derived": {
+            "annual_expenses": ["mul", "monthly_expenses", 12],
+            "expense_ratio": ["div", "annual_expenses", "income"],
+            "months_covered": ["div", "emergency_fund", "monthly_expenses"],
+            "debt_ratio": ["div", "liabilities", "income"]
+        },
+        "rules": [
+            {"name": "age", "field": "age", "bands": [
+                {"lt": 30, "weight": 0.5}, {"gt": 55, "weight": -0.5}]},
+            {"name": "expense_ratio", "field": "expense_ratio",
+             "requires": {"income": {"gt": 0}, "annual_expenses": {"gt": 0}}, "bands": [
+                {"gt": 0.8, "weight": 1.0}, {"lt": 0.5, "weight": -0.5}]},
+            {"name": "emergency_fund", "field": "months_covered", "requires": {"monthly_expenses": {"gt": 0}}, "bands": [
+                {"lt": 3, "weight": 1.0}, {"gt": 6, "weight": -0.5}]},
+            {"name": "debt", "field": "debt_ratio", "requires": {"income": {"gt": 0}}, "bands": [
+                {"gt": 0.4, "weight": 1.0}, {"lt": 0.2, "weight": -0.3}]},
+            {"name": "horizon", "bands": [
+                {"when": {"tolerance": {"eq": "aggressive"}, "time_horizon": {"lt": 5}}, "weight": 0.8},
+                {"when": {"tolerance": {"eq": "conservative"}, "time_horizon": {"gt": 20}}, "weight": 0.3}]},
+            {"name": "savings_rate", "field": "savings_rate", "bands": [
+                {"lt": 10, "weight": 0.7}, {"gt": 20, "weight": -0.5}]}
+        ],
+        "categories": [{"gt": 7, "label": "High Risk"}, {"gt": 4, "label": "Moderate Risk"}, {"label": "Low Risk"}]
+    },
+    "health": {
+        "version": 1,
+        "base": 5.0,
+        "clamp": [1.0, 10.0],
+        "fields": {
+            "height": {"type": "float", "default": 170, "positive": True},
+            "weight": {"type": "float", "default": 70},
+            "age": {"type": "int", "default": 35},
+            "exercise": {"type": "str", "default": "none"},
+            "smoking": {"type": "str", "default": "never"},
+            "alcohol": {"type": "str", "default": "none"},
+            "stress": {"type": "int", "default": 5},
+            "sleep": {"type": "float", "default": 7},
+            "family_history": {"type": "str", "default": "none"},
+            "diet": {"type": "str", "default": "average"}
+        },
+        "derived": {
+            "bmi": ["div", "weight", ["pow", ["div", "height", 100], 2]]
+        },
+        "rules": [
+            {"name": "bmi", "field": "bmi", "bands": [
+                {"lt": 18.5, "weight": 1.5}, {"gt": 30, "weight": 1.5},
+                {"gt": 25, "weight": 0.8}, {"ge": 18.5, "le": 24.9, "weight": -0.5}]},
+            {"name": "age", "field": "age", "bands": [
+                {"gt": 65, "weight": 1.0}, {"gt": 50, "weight": 0.5}, {"lt": 30, "weight": -0.3}]},
+            {"name": "exercise", "field": "exercise", "bands": [
+                {"eq": "none", "weight": 1.2}, {"eq": "light", "weight": 0.3},
+                {"in": ["moderate", "heavy"], "weight": -0.5}]},
+            {"name": "smoking", "field": "smoking", "bands": [
+                {"eq": "regular", "weight": 2.0}, {"eq": "occasional", "weight": 1.0}, {"eq": "former", "weight": 0.3}]},
+            {"name": "alcohol", "field": "alcohol", "bands": [
+                {"eq": "heavy", "weight": 1.0}, {"eq": "moderate", "weight": 0.3}]},
+            {"name": "stress", "field": "stress", "bands": [
+                {"ge": 8, "weight": 1.0}, {"ge": 6, "weight": 0.5}, {"le": 3, "weight": -0.3}]},
+            {"name": "sleep", "field": "sleep", "bands": [
+                {"lt": 6, "weight": 0.8}, {"gt": 9, "weight": 0.8}, {"ge": 7, "le": 8, "weight": -0.3}]},
+            {"name": "family_history", "field": "family_history", "bands": [
+                {"eq": "multiple", "weight": 1.0}, {"in": ["heart", "diabetes", "cancer"], "weight": 0.5}]},
+            {"name": "diet", "field": "diet", "bands": [
+                {"eq": "poor", "weight": 0.8}, {"eq": "excellent", "weight": -0.5}]}
+        ],
+        "categories": [{"gt": 7, "label": "High Risk"}, {"gt": 4, "label": "Moderate Risk"}, {"label": "Low Risk"}]
+    }
+}
+
+FIELD_TYPES = ("int", "float", "str")
+NUMERIC_OPS = ("lt", "le", "gt", "ge", "eq")
+CATEGORICAL_OPS = ("eq", "in")
+DERIVED_OPS = ("add", "sub", "mul", "div", "pow")
+
+
+def _compare(op: str, value, operand) -> bool:
+    if op == "lt":
+        return value < operand
+    if op == "le":
+        return value <= operand
+    if op == "gt":
+        return value > operand
+    if op == "ge":
+        return value >= operand
+    if op == "eq":
+        return value == operand
+    return value in operand
+
+
+def _divide(a: float, b: float) -> float:
+    # IEEE results like NumPy's, so the scalar and vectorized paths agree on every input
+    try:
+        return a / b
+    except ZeroDivisionError:
+        if a == 0 or a != a:
+            return math.nan
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+
+
+def _power(a: float, b: float) -> float:
+    try:
+        result = a ** b
+    except (OverflowError, ZeroDivisionError):
+        return math.inf
+    # A negative base with a fractional exponent is complex in Python and NaN in NumPy
+    return math.nan if isinstance(result, complex) else result
+
+
+SCALAR_OPS = {"add": operator.add, "sub": operator.sub, "mul": operator.mul, "div": _divide, "pow": _power}
+ARRAY_OPS = {"add": np.add, "sub": np.subtract, "mul": np.multiply, "div": np.divide, "pow": np.power}
+
+
+class Encoder:
+    """Maps one value to its region index: the regions are where the rule's predicates are constant"""
+
+    def __init__(self, name: str, categorical: bool, operands: Sequence[Tuple[str, Any]]):
+        self.name = name
+        self.categorical = categorical
+        if categorical:
+            # One region per known string plus one for anything else
+            self.keys = list(dict.fromkeys(item for op, operand in operands
+                                           for item in (operand if op == "in" else [operand])))
+            self.index = {key: i for i, key in enumerate(self.keys)}
+            self.size = len(self.keys) + 1
+        else:
+            # Regions are [e0, e1), [e1, e2), ... so bisect_right finds one in a single call: x <= t is
+            # x < nextafter(t), so le/gt thresholds move up one ulp and eq needs both edges
+            edges = set()
+            for op, operand in operands:
+                if op in ("lt", "ge", "eq"):
+                    edges.add(float(operand))
+                if op in ("le", "gt", "eq"):
+                    edges.add(math.nextafter(float(operand), math.inf))
+            self.edges = sorted(edges)
+            # Below every edge, one region per edge, and NaN, for which every comparison is false
+            self.size = len(self.edges) + 2
+
+    def representatives(self) -> List[Any]:
+        """One value inside each region, in region order"""
+        if self.categorical:
+            return self.keys + [None]
+        return [-math.inf] + self.edges + [math.nan]
+
+    def region_function(self) -> Callable[[Any], int]:
+        """Region of a single value; bound to locals so no attribute lookups happen per call"""
+        if self.categorical:
+            index, other = self.index, len(self.keys)
+            return lambda value: index.get(value, other) if isinstance(value, str) else other
+        edges, nan_region = self.edges, self.size - 1
+        return lambda value: bisect_right(edges, value) if value == value else nan_region
+
+    def regions(self, values: np.ndarray) -> np.ndarray:
+        if self.categorical:
+            if not self.keys:
+                return np.zeros(np.shape(values), dtype=np.intp)
+            return np.select([values == key for key in self.keys], range(len(self.keys)), default=len(self.keys))
+        values = np.asarray(values, dtype=float)
+        return np.where(np.isnan(values), self.size - 1, np.searchsorted(self.edges, values, "right"))
+
+
+class CompiledRule:
+    """An ordered ladder of bands compiled to a lookup table over its values' regions"""
+
+    def __init__(self, name: str, encoders: List[Encoder], table: np.ndarray):
+        self.name = name
+        self.encoders = encoders
+        self.table = table
+        self.strides = [stride // table.itemsize for stride in table.strides]
+        self.delta = self._delta_function(table.ravel().tolist())
+
+    def _delta_function(self, flat: List[float]) -> Callable[[Dict[str, Any]], float]:
+        """Weight for one profile's values: the table entry at the values' regions"""
+        if len(self.encoders) == 1:
+            # Most rules read one value; inline its region lookup
+            encoder, = self.encoders
+            name = encoder.name
+            if encoder.categorical:
+                index, other = encoder.index, len(encoder.keys)
+                return lambda values: flat[index.get(values[name], other) if isinstance(values[name], str) else other]
+            edges, nan_region = encoder.edges, encoder.size - 1
+            return lambda values: flat[bisect_right(edges, values[name]) if values[name] == values[name] else nan_region]
+        parts = [(encoder.name, encoder.region_function(), stride) for encoder, stride in zip(self.encoders, self.strides)]
+        if len(parts) == 2:
+            # A value plus one condition, the other common shape
+            (first, first_region, stride), (second, second_region, _) = parts
+            return lambda values: flat[stride * first_region(values[first]) + second_region(values[second])]
+        return lambda values: flat[sum(stride * region(values[name]) for name, region, stride in parts)]
+
+    def deltas(self, columns: Dict[str, np.ndarray]) -> np.ndarray:
+        return self.table[tuple(encoder.regions(columns[encoder.name]) for encoder in self.encoders)]
+
+
+def _compile_ladder(name: str, bands: List[Dict[str, Any]], default_value: Optional[str],
+                    requires: Dict[str, Dict[str, Any]], kinds: Dict[str, str], outputs: List[float],
+                    default: float = 0.0, output_key: str = "weight") -> CompiledRule:
+    """Compile bands (first match wins) into a CompiledRule; outputs[i] is band i's result, default if none match"""
+    required = [(value_name, op, operand) for value_name, ops in requires.items() for op, operand in ops.items()]
+    conditions = []
+    for band in bands:
+        unknown = set(band) - set(NUMERIC_OPS + CATEGORICAL_OPS) - {"when", output_key}
+        if unknown:
+            raise ValueError(f"Rule '{name}' has unknown band keys: {', '.join(sorted(unknown))}")
+        own = [(default_value, op, band[op]) for op in NUMERIC_OPS + CATEGORICAL_OPS if op in band]
+        if own and default_value is None:
+            raise ValueError(f"Rule '{name}' compares values without naming a field")
+        when = [(value_name, op, operand) for value_name, ops in band.get("when", {}).items()
+                for op, operand in ops.items()]
+        conditions.append(required + own + when)
+    value_names = list(dict.fromkeys(value_name for predicates in conditions for value_name, _, _ in predicates))
+
+    encoders = []
+    for value_name in value_names:
+        if value_name not in kinds:
+            raise ValueError(f"Rule '{name}' references unknown value '{value_name}'")
+        categorical = kinds[value_name] == "str"
+        allowed = CATEGORICAL_OPS if categorical else NUMERIC_OPS
+        operands = [(op, operand) for predicates in conditions
+                    for predicate_value, op, operand in predicates if predicate_value == value_name]
+        for op, operand in operands:
+            if op not in allowed:
+                raise ValueError(f"Rule '{name}' cannot apply '{op}' to {kinds[value_name]} value '{value_name}'")
+            if categorical:
+                items = operand if op == "in" else [operand]
+                if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+                    raise ValueError(f"Rule '{name}' needs string operands for '{value_name}'")
+            elif isinstance(operand, bool) or not isinstance(operand, (int, float)) or not math.isfinite(operand):
+                raise ValueError(f"Rule '{name}' needs a finite numeric threshold for '{value_name}'")
+        encoders.append(Encoder(value_name, categorical, operands))
+
+    # Evaluate the ladder once on a representative of every combination of regions
+    table = np.full([encoder.size for encoder in encoders], default, dtype=float)
+    axes = {encoder.name: encoder.representatives() for encoder in encoders}
+    for position in np.ndindex(*table.shape):
+        sample = {encoder.name: axes[encoder.name][region] for encoder, region in zip(encoders, position)}
+        for predicates, output in zip(conditions, outputs):
+            if all(sample[value_name] is not None and _compare(op, sample[value_name], operand)
+                   for value_name, op, operand in predicates):
+                table[position] = output
+                break
+    return CompiledRule(name, encoders, table)
+
+
+class CompiledRuleset:
+    """A validated ruleset with a scalar scorer for one profile and a vectorized one for field arrays"""
+
+    def __init__(self, domain: str, spec: Dict[str, Any]):
+        self.domain = domain
+        self.spec = spec
+        self.version = spec.get("version", 1)
+        self.base = float(spec.get("base", 0.0))
+        self.low, self.high = (float(bound) for bound in spec.get("clamp", [-math.inf, math.inf]))
+        if self.low > self.high:
+            raise ValueError("clamp must be [low, high]")
+
+        # field: (default, kind) with kind "int" (truncated like int()), "float" or "str"
+        self.fields: Dict[str, Tuple[Any, str]] = {}
+        self.positive: List[str] = []
+        for field_name, field in spec.get("fields", {}).items():
+            kind = field.get("type")
+            if kind not in FIELD_TYPES:
+                raise ValueError(f"Field '{field_name}' has unknown type '{kind}'")
+            self.fields[field_name] = (field.get("default"), kind)
+            if field.get("positive"):
+                if kind == "str":
+                    raise ValueError(f"Field '{field_name}' is a string and cannot be required positive")
+                self.positive.append(field_name)
+        kinds = {field_name: kind for field_name, (_, kind) in self.fields.items()}
+
+        # Derived values may reference fields and earlier derived values
+        self.derived: Dict[str, Any] = {}
+        self.inputs: Dict[str, set] = {field_name: {field_name} for field_name in self.fields}
+        for value_name, expression in spec.get("derived", {}).items():
+            if value_name in kinds:
+                raise ValueError(f"Derived value '{value_name}' shadows another value")
+            self.inputs[value_name] = self._check_expression(value_name, expression, kinds)
+            self.derived[value_name] = expression
+            kinds[value_name] = "float"
+
+        self.rules: List[CompiledRule] = []
+        self.first_use: Dict[str, int] = {}
+        for i, rule in enumerate(spec.get("rules", [])):
+            bands = rule.get("bands") or []
+            for band in bands:
+                if isinstance(band.get("weight"), bool) or not isinstance(band.get("weight"), (int, float)):
+                    raise ValueError(f"Every band of rule '{rule.get('name', i)}' needs a numeric weight")
+            compiled = _compile_ladder(rule.get("name", str(i)), bands, rule.get("field"), rule.get("requires", {}),
+                                       kinds, [float(band["weight"]) for band in bands])
+            self.rules.append(compiled)
+            for encoder in compiled.encoders:
+                for field_name in self.inputs[encoder.name]:
+                    self.first_use.setdefault(field_name, i)
+
+        self._array_derived = [(value_name, self._compile_expression(expression, ARRAY_OPS))
+                               for value_name, expression in self.derived.items()]
+        self._score = self._scalar_scorer()
+
+        categories = spec.get("categories") or [{"label": "Unrated"}]
+        if not all("label" in band for band in categories) or set(categories[-1]) != {"label"}:
+            raise ValueError("categories need a label on every band and a last band without conditions")
+        self.category_bands = categories
+        self.labels = [band["label"] for band in categories]
+        self.label_array = np.array(self.labels)
+        self._categories = _compile_ladder("categories", categories[:-1], "score", {}, {"score": "float"},
+                                           list(range(len(categories) - 1)), default=len(categories) - 1,
+                                           output_key="label")
+
+    def _check_expression(self, value_name: str, expression, kinds: Dict[str, str]) -> set:
+        """Validate a derived expression and return the fields it reads"""
+        if isinstance(expression, bool):
+            raise ValueError(f"Derived value '{value_name}' uses a boolean operand")
+        if isinstance(expression, (int, float)):
+            return set()
+        if isinstance(expression, str):
+            if kinds.get(expression) not in ("int", "float"):
+                raise ValueError(f"Derived value '{value_name}' references unknown numeric value '{expression}'")
+            return set(self.inputs[expression])
+        if not isinstance(expression, list) or len(expression) != 3 or expression[0] not in DERIVED_OPS:
+            raise ValueError(f"Derived value '{value_name}' must be [op, a, b] with op in {', '.join(DERIVED_OPS)}")
+        return self._check_expression(value_name, expression[1], kinds) | \
+            self._check_expression(value_name, expression[2], kinds)
+
+    def _compile_expression(self, expression, ops: Dict[str, Callable]) -> Callable[[Dict[str, Any]], Any]:
+        if isinstance(expression, str):
+            return lambda values: values[expression]
+        if isinstance(expression, list):
+            op = ops[expression[0]]
+            left, right = self._compile_expression(expression[1], ops), self._compile_expression(expression[2], ops)
+            return lambda values: op(left(values), right(values))
+        return lambda values: expression
+
+    def _scalar_scorer(self) -> Callable[[Dict[str, Any]], float]:
+        """Scorer for one profile: parse the fields, then per rule one bisect per value and one table read.
+
+        Derived values are computed just before the first rule that reads them. A numeric field that
+        does not parse ends scoring at the first rule reading it, as the hand-written scorers did."""
+        parsers = [(field_name, default, None if kind == "str" else int if kind == "int" else float,
+                    self.first_use.get(field_name, len(self.rules)))
+                   for field_name, (default, kind) in self.fields.items()]
+        computed: set = set(self.fields)
+        steps = []
+        for rule in self.rules:
+            derived: List[Tuple[str, Callable]] = []
+            for encoder in rule.encoders:
+                self._derived_steps(encoder.name, computed, derived)
+            steps.append((derived, rule.delta))
+        base, low, high, rule_count = self.base, self.low, self.high, len(self.rules)
+
+        def score(data: Dict[str, Any]) -> float:
+            get = data.get
+            values = {}
+            stop = rule_count
+            for field_name, default, parse, first_use in parsers:
+                value = get(field_name, default)
+                if parse is None:
+                    values[field_name] = value
+                    continue
+                try:
+                    values[field_name] = parse(value)
+                except (ValueError, TypeError, OverflowError):
+                    stop = min(stop, first_use)
+            total = base
+            for derived, delta in steps[:stop]:
+                for value_name, evaluate in derived:
+                    values[value_name] = evaluate(values)
+                total += delta(values)
+            return max(low, min(high, total))
+
+        return score
+
+    def _derived_steps(self, value_name: str, computed: set, steps: List[Tuple[str, Callable]]):
+        """Append the derived values value_name needs, dependencies first, that are not computed yet"""
+        if value_name in computed:
+            return
+        pending = [self.derived[value_name]]
+        while pending:
+            expression = pending.pop()
+            if isinstance(expression, str):
+                self._derived_steps(expression, computed, steps)
+            elif isinstance(expression, list):
+                pending += expression[1:]
+        computed.add(value_name)
+        steps.append((value_name, self._compile_expression(self.derived[value_name], SCALAR_OPS)))
+
+    def score(self, data: Dict[str, Any]) -> float:
+        """Score one profile of raw request values"""
+        return self._score(data)
+
+    def scores(self, columns: Dict[str, np.ndarray]) -> np.ndarray:
+        """Vectorized score over broadcastable field arrays, as produced by coerce()"""
+        values = dict(columns)
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            for value_name, evaluate in self._array_derived:
+                values[value_name] = evaluate(values)
+        score = self.base
+        for rule in self.rules:
+            score = score + rule.deltas(values)
+        return np.clip(score, self.low, self.high)
+
+    def category(self, score: float) -> str:
+        return self.labels[int(self._categories.delta({"score": score}))]
+
+    def categories(self, scores: np.ndarray) -> np.ndarray:
+        return self.label_array[self._categories.deltas({"score": scores}).astype(int)]
+
+    def summary(self) -> Dict[str, Any]:
+        return {"version": self.version, "fields": list(self.fields), "rules": [rule.name for rule in self.rules]}
+
+
+def coerce(values, kind: str) -> np.ndarray:
+    """Field values as an array of the field's kind"""
+    if kind == "str":
+        return np.asarray(values, dtype=object).astype(str)
+    array = np.asarray(values, dtype=float)
+    return np.trunc(array) if kind == "int" else array
+
+
+class RiskRules:
+    """Compiled rulesets by domain, hot-reloaded from RISK_RULES_DIR when a file changes.
+
+    The directory holds one <domain>.json ruleset per file, overriding or adding to the defaults.
+    A file that fails validation is logged and the previously compiled version keeps serving."""
+
+    def __init__(self, directory: Optional[str] = Config.RISK_RULES_DIR,
+                 check_interval: float = Config.RISK_RULES_CHECK_SEC):
+        self.directory = directory
+        self.check_interval = check_interval
+        self.rulesets: Dict[str, CompiledRuleset] = {
+            domain: CompiledRuleset(domain, spec) for domain, spec in DEFAULT_RULESETS.items()
+        }
+        self._mtimes: Dict[str, float] = {}
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self.maybe_reload(force=True)
+
+    def get(self, domain: str) -> CompiledRuleset:
+        self.maybe_reload()
+        ruleset = self.rulesets.get(domain)
+        if ruleset is None:
+            raise ValueError(f"Unknown domain: {domain}")
+        return ruleset
+
+    def maybe_reload(self, force: bool = False) -> List[str]:
+        """Recompile rulesets whose files changed; returns the domains that were reloaded"""
+        now = time.monotonic()
+        if not self.directory or (not force and now - self._last_check < self.check_interval):
+            return []
+        with self._lock:
+            if not force and now - self._last_check < self.check_interval:
+                return []
+            self._last_check = now
+            try:
+                names = sorted(name for name in os.listdir(self.directory) if name.endswith(".json"))
+            except FileNotFoundError:
+                return []
+            reloaded = []
+            for name in names:
+                path = os.path.join(self.directory, name)
+                domain = name[:-len(".json")]
+                try:
+                    mtime = os.path.getmtime(path)
+                    if self._mtimes.get(path) == mtime:
+                        continue
+                    self._mtimes[path] = mtime
+                    with open(path) as f:
+                        ruleset = CompiledRuleset(domain, json.load(f))
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    logger.error(f"Failed to load risk rules {path}: {e}")
+                    continue
+                # Swap the reference; requests in flight finish on the version they started with
+                self.rulesets = {**self.rulesets, domain: ruleset}
+                reloaded.append(domain)
+                logger.info(f"Loaded {domain} risk rules v{ruleset.version}")
+            return reloaded
+
+    def summary(self) -> Dict[str, Any]:
+        return {domain: ruleset.summary() for domain, ruleset in self.rulesets.items()}
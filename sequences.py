@@ -0,0 +1,21 @@
+from pymongo import ReturnDocument
+
+# Monotonic counters in the counters collection. Every write to the embeddings collection takes the
+# next value, so workers can ask for "everything after sequence N" with one indexed query.
+
+EMBEDDINGS_SEQUENCE = "embeddings"
+
+
+def next_sequence(db, name: str) -> int:
+    counter = db.counters.find_one_and_update(
+        {"_id": name},
+        {"$inc": {"value": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter["value"]
+
+
+def current_sequence(db, name: str) -> int:
+    counter = db.counters.find_one({"_id": name})
+    return counter["value"] if counter else 0
@@ -0,0 +1,138 @@
+import json
+import zlib
+import logging
+import itertools
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, Optional
+import numpy as np
+from bson import ObjectId
+from flask import Response, request, stream_with_context
+from flask.json.provider import JSONProvider
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# JSON encoding for API responses. orjson is used when installed (several times faster and
+# natively handles datetime and NumPy); otherwise the standard library encoder with the same
+# type coverage. Both paths render ObjectId as its hex string and datetimes as ISO 8601.
+
+try:
+    import orjson
+    HAS_ORJSON = True
+    ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+except ImportError:
+    HAS_ORJSON = False
+
+
+def _default(value: Any):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    # Remaining BSON types (Decimal128, Binary, ...) render as their string form rather than failing a stream
+    return str(value)
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode obj as UTF-8 JSON bytes"""
+    if HAS_ORJSON:
+        try:
+            return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits or non-contiguous arrays; the stdlib path handles them
+            pass
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data):
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(JSONProvider):
+    """Flask JSON provider backed by dumps/loads, so jsonify and request.json use the fast path"""
+
+    mimetype = "application/json"
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return dumps(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        return loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj) + b"\n", mimetype=self.mimetype)
+
+
+def accepts_gzip() -> bool:
+    """Whether the current request's Accept-Encoding allows gzip"""
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Gzip-compress a byte stream on the fly"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def json_list_chunks(key: str, items: Iterable[Any], extra: Optional[Dict[str, Any]] = None,
+                     chunk_bytes: int = Config.EXPORT_CHUNK_BYTES) -> Iterator[bytes]:
+    """Encode {key: [items...], **extra} incrementally, one item at a time.
+
+    If items raises part-way, the document still closes, with an "error" member after the partial
+    list: the status line is already sent by then, so that member is how a reader detects the failure."""
+    head = dumps(extra)[:-1] + b"," if extra else b"{"
+    buffer = [head + dumps(key) + b":["]
+    size = len(buffer[0])
+    first = True
+    try:
+        for item in items:
+            data = dumps(item) if first else b"," + dumps(item)
+            first = False
+            buffer.append(data)
+            size += len(data)
+            if size >= chunk_bytes:
+                yield b"".join(buffer)
+                buffer = []
+                size = 0
+    except Exception as e:
+        logger.error(f"Streaming {key} failed after the response started: {e}")
+        buffer.append(b"]," + dumps("error") + b":" + dumps(f"stream interrupted: {e}") + b"}\n")
+        yield b"".join(buffer)
+        return
+    buffer.append(b"]}\n")
+    yield b"".join(buffer)
+
+
+def stream_json_list(key: str, items: Iterable[Any], extra: Optional[Dict[str, Any]] = None) -> Response:
+    """Stream a large list response, gzip-encoded when the client accepts it.
+
+    The first item is read before the response is built: a cursor runs its query on the first read,
+    so a failing query raises here, while the caller can still answer with an error status."""
+    items = iter(items)
+    first = list(itertools.islice(items, 1))
+    body = json_list_chunks(key, itertools.chain(first, items), extra)
+    headers = {"Vary": "Accept-Encoding"}
+    if accepts_gzip():
+        body = gzip_chunks(body)
+        headers["Content-Encoding"] = "gzip"
+    return Response(stream_with_context(body), mimetype="application/json", headers=headers)
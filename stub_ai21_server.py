@@ -0,0 +1,190 @@
+import json
+import math
+import time
+import uuid
+import random
+import argparse
+import threading
+from typing import Callable
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Local stand-in for the AI21 chat completions API. Point the app at it with
+# AI21_API_HOST=http://127.0.0.1:8021 to exercise deadlines, hedging and the circuit breaker,
+# or start it from loadtest.py for capacity planning.
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """Build a latency sampler in seconds from a spec such as
+    const:0.2, uniform:0.1,0.5, normal:0.8,0.2 or lognormal:1.2,0.5 (median, sigma)"""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "const":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class StubSettings:
+    delay = 0.2
+    jitter = 0.0
+    latency = None
+    slow_rate = 0.0
+    slow_delay = 10.0
+    error_rate = 0.0
+    error_status = 503
+    # Streaming: the sampled latency is the time to first token, then token_delay per token
+    token_delay = 0.0
+    # Pad responses to this many tokens (0 = echo the prompt only)
+    completion_tokens = 0
+
+
+class StubAI21Handler(BaseHTTPRequestHandler):
+    settings = StubSettings
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"detail": "Not Found"})
+            return
+
+        if self.settings.latency:
+            delay = self.settings.latency()
+        else:
+            delay = self.settings.delay + random.uniform(0, self.settings.jitter)
+        if random.random() < self.settings.slow_rate:
+            delay = self.settings.slow_delay
+        time.sleep(delay)
+
+        if random.random() < self.settings.error_rate:
+            self._send_json(self.settings.error_status, {"detail": "Injected stub failure"})
+            return
+
+        messages = body.get("messages", [])
+        last_message = messages[-1]["content"] if messages else ""
+        words = f"[stub:{body.get('model')}] Response to: {last_message[:200]}".split()
+        if self.settings.completion_tokens:
+            # Pad to the configured length, capped by the request's max_tokens
+            target = min(body.get("max_tokens") or self.settings.completion_tokens, self.settings.completion_tokens)
+            words += ["lorem"] * max(0, target - len(words))
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in messages)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(words),
+            "total_tokens": prompt_tokens + len(words)
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+        if body.get("stream"):
+            self._stream(completion_id, words, usage)
+            return
+        time.sleep(self.settings.token_delay * len(words))
+        self._send_json(200, {
+            "id": completion_id,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": " ".join(words)},
+                "finish_reason": "stop"
+            }],
+            "usage": usage
+        })
+
+    def _stream(self, completion_id: str, words, usage: dict):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for i, word in enumerate(words):
+            chunk = {
+                "id": completion_id,
+                "choices": [{
+                    "index": 0,
+                    "delta": {"role": "assistant", "content": word if i == 0 else f" {word}"},
+                    "finish_reason": None
+                }]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(self.settings.token_delay)
+        final = {
+            "id": completion_id,
+            "choices": [{"index": 0, "delta": {"content": ""}, "finish_reason": "stop"}],
+            "usage": usage
+        }
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        self.wfile.flush()
+        self.close_connection = True
+
+    def _send_json(self, status: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser, prefix: str = ""):
+    """Register the stub's tuning flags, optionally prefixed (e.g. --llm-latency)"""
+    parser.add_argument(f"--{prefix}delay", type=float, default=StubSettings.delay, help="Base response delay in seconds")
+    parser.add_argument(f"--{prefix}jitter", type=float, default=StubSettings.jitter, help="Extra uniform random delay in seconds")
+    parser.add_argument(f"--{prefix}latency", default=None,
+                        help="Latency distribution, e.g. lognormal:1.2,0.5 (overrides delay/jitter)")
+    parser.add_argument(f"--{prefix}slow-rate", type=float, default=StubSettings.slow_rate, help="Fraction of requests that stall")
+    parser.add_argument(f"--{prefix}slow-delay", type=float, default=StubSettings.slow_delay, help="Delay for stalled requests")
+    parser.add_argument(f"--{prefix}error-rate", type=float, default=StubSettings.error_rate, help="Fraction of requests that fail")
+    parser.add_argument(f"--{prefix}error-status", type=int, default=StubSettings.error_status)
+    parser.add_argument(f"--{prefix}token-delay", type=float, default=StubSettings.token_delay, help="Seconds per generated token")
+    parser.add_argument(f"--{prefix}completion-tokens", type=int, default=StubSettings.completion_tokens,
+                        help="Tokens generated per response")
+
+
+def apply_stub_arguments(args: argparse.Namespace, prefix: str = ""):
+    options = vars(args)
+    key = prefix.replace("-", "_")
+    StubSettings.delay = options[f"{key}delay"]
+    StubSettings.jitter = options[f"{key}jitter"]
+    StubSettings.latency = parse_latency(options[f"{key}latency"]) if options[f"{key}latency"] else None
+    StubSettings.slow_rate = options[f"{key}slow_rate"]
+    StubSettings.slow_delay = options[f"{key}slow_delay"]
+    StubSettings.error_rate = options[f"{key}error_rate"]
+    StubSettings.error_status = options[f"{key}error_status"]
+    StubSettings.token_delay = options[f"{key}token_delay"]
+    StubSettings.completion_tokens = options[f"{key}completion_tokens"]
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Start the stub in a background thread; port 0 picks a free port (see server.server_address)"""
+    server = ThreadingHTTPServer((host, port), StubAI21Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub AI21 chat completions server with injectable delays and errors")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8021)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    apply_stub_arguments(args)
+
+    server = ThreadingHTTPServer((args.host, args.port), StubAI21Handler)
+    server.daemon_threads = True
+    print(f"Stub AI21 server listening on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
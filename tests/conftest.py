@@ -0,0 +1,7 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# database.py opens its (lazy) client at import; tests pass their own mongomock collections
+os.environ.setdefault("DB_NAME", "test")
@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+from flask import Flask, jsonify, request
+
+import admission
+from admission import AdmissionController, TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission.time, "monotonic", clock)
+    return clock
+
+
+def test_token_bucket_refills_at_its_rate(clock):
+    bucket = TokenBucket(rate_per_sec=2.0, burst=2)
+    assert bucket.take() == 0.0 and bucket.take() == 0.0
+    assert bucket.take() == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.take() == 0.0
+    clock.now += 60
+    assert bucket.tokens == pytest.approx(0.0)
+    bucket.take()
+    # Idle time refills up to the burst, never beyond it
+    assert bucket.tokens == pytest.approx(1.0)
+
+
+def test_rate_limits_are_per_client_and_route(clock):
+    controller = AdmissionController(rate_limits={"chat": (60, 1), "analyze": (60, 1)})
+    assert controller.check_rate("chat", "a") == 0.0
+    assert controller.check_rate("chat", "a") == pytest.approx(1.0)
+    assert controller.check_rate("chat", "b") == 0.0
+    assert controller.check_rate("analyze", "a") == 0.0
+    assert controller.check_rate("whatif", "a") == 0.0
+    assert controller.stats()["rate_limited"] == 1
+
+
+def test_requests_are_shed_when_the_queue_would_exceed_the_target():
+    controller = AdmissionController(max_concurrent=1, queue_target_sec=0.05, rate_limits={})
+    assert controller.acquire("analyze") == 0.0
+    # Nothing is known about service times yet, so the request waits and times out
+    assert controller.acquire("analyze") is None
+    controller.release(1.0)
+    assert controller.acquire("analyze") == 0.0
+    # A one-second typical service time already exceeds the target: rejected without waiting (shed_early)
+    assert controller.acquire("analyze") is None
+    stats = controller.stats()
+    assert (stats["shed_timeout"], stats["shed_early"], stats["active"]) == (1, 1, 1)
+    assert controller.retry_after() == 1
+
+
+def test_chat_follow_ups_are_admitted_before_new_analyses():
+    controller = AdmissionController(max_concurrent=1, queue_target_sec=5, rate_limits={})
+    controller.acquire("analyze")
+    order = []
+
+    def waiter(route_class):
+        controller.acquire(route_class)
+        order.append(route_class)
+        controller.release(0.0)
+
+    threads = [threading.Thread(target=waiter, args=(route_class,)) for route_class in ("analyze", "chat")]
+    for thread in threads:
+        thread.start()
+        while len(controller._waiters) < threads.index(thread) + 1:
+            time.sleep(0.001)
+    controller.release(0.0)
+    for thread in threads:
+        thread.join(timeout=5)
+    assert order == ["chat", "analyze"]
+
+
+def test_guard_rejects_with_retry_after_and_bypasses_fast_requests():
+    controller = AdmissionController(max_concurrent=1, rate_limits={"analyze": (60, 1)})
+    app = Flask(__name__)
+
+    @app.route("/analyze", methods=["POST"])
+    @controller.guard("analyze", bypass=lambda: request.get_json(silent=True).get("mode") == "fast")
+    def analyze():
+        return jsonify({"ok": True})
+
+    client = app.test_client()
+    assert client.post("/analyze", json={}).status_code == 200
+    limited = client.post("/analyze", json={})
+    assert limited.status_code == 429 and int(limited.headers["Retry-After"]) >= 1
+    for _ in range(3):
+        assert client.post("/analyze", json={"mode": "fast"}).status_code == 200
+    stats = controller.stats()
+    assert stats["bypassed"] == 3 and stats["admitted"] == 1
+    assert len(controller.service_times) == 1
@@ -0,0 +1,86 @@
+from datetime import datetime
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from analytics import RiskAnalytics, category_key
+from risk_rules import DEFAULT_RULESETS, CompiledRuleset, RiskRules
+
+DAY = datetime(2024, 3, 1, 9, 30)
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().testdb
+
+
+@pytest.fixture
+def rules():
+    return RiskRules(directory=None)
+
+
+def assess(db, analytics, domain, scores):
+    for score in scores:
+        db.assessments.insert_one({"domain": domain, "risk_score": score, "timestamp": DAY})
+        analytics.record_assessment(domain, score, DAY)
+
+
+def test_percentiles_stay_inside_the_observed_range(db, rules):
+    analytics = RiskAnalytics(db, rules)
+    # All scores fall in one 0.5-wide bin; interpolation alone would report values above the maximum
+    assess(db, analytics, "finance", [5.0, 5.1, 5.2])
+    summary = analytics.query(domain="finance")["summary"]
+    assert summary["count"] == 3
+    assert summary["min_score"] == 5.0 and summary["max_score"] == 5.2
+    for value in summary["percentiles"].values():
+        assert 5.0 <= value <= 5.2
+    assert summary["percentiles"]["p99"] == pytest.approx(5.2)
+
+
+def test_empty_range(db, rules):
+    summary = RiskAnalytics(db, rules).query(domain="finance")["summary"]
+    assert summary["count"] == 0
+    assert summary["percentiles"]["p50"] is None
+
+
+def test_categories_follow_the_ruleset(db, rules):
+    analytics = RiskAnalytics(db, rules)
+    assess(db, analytics, "finance", [3.0, 5.0, 8.0])
+    assert analytics.query(domain="finance")["summary"]["categories"] == {"high": 1, "moderate": 1, "low": 1}
+
+    # After a ruleset change, live rollups and rebuilds bucket with the new ladder
+    spec = {**DEFAULT_RULESETS["finance"], "categories": [
+        {"ge": 6, "label": "Needs Review"}, {"when": {"score": {"gt": 4, "lt": 6}}, "label": "Watch"}, {"label": "Fine"}
+    ]}
+    rules.rulesets["finance"] = CompiledRuleset("finance", spec)
+    assess(db, analytics, "finance", [2.0, 5.5, 6.0])
+    live = analytics.query(domain="finance")["summary"]["categories"]
+    assert live["needs_review"] == 1 and live["watch"] == 1 and live["fine"] == 1
+
+    assert analytics.rebuild() == 1
+    rebuilt = analytics.query(domain="finance")["summary"]["categories"]
+    expected = {}
+    for score in [3.0, 5.0, 8.0, 2.0, 5.5, 6.0]:
+        key = category_key(rules.get("finance").category(score))
+        expected[key] = expected.get(key, 0) + 1
+    assert {key: count for key, count in rebuilt.items() if count} == expected == {"needs_review": 2, "watch": 2, "fine": 2}
+
+
+def test_rebuild_matches_incremental_rollups(db, rules):
+    analytics = RiskAnalytics(db, rules)
+    assess(db, analytics, "finance", [1.0, 4.0, 4.01, 7.0, 7.5, 10.0])
+    assess(db, analytics, "health", [2.5, 6.0])
+    before = analytics.query()["days"]
+    analytics.rebuild()
+    after = analytics.query()["days"]
+    for incremental, rebuilt in zip(before, after):
+        for field in ("domain", "day", "count", "min_score", "max_score", "histogram", "categories"):
+            assert incremental[field] == rebuilt[field]
+        assert incremental["sum_score"] == pytest.approx(rebuilt["sum_score"])
+
+
+def test_category_keys():
+    assert category_key("High Risk") == "high"
+    assert category_key("Needs a.Review$") == "needs_a_review"
+    assert category_key("!!!") == "unrated"
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import ServerSelectionTimeoutError
+
+mongomock = pytest.importorskip("mongomock")
+
+from chat_store import ChatStore
+
+START = datetime(2024, 1, 1, 12, 0)
+OPENING = [{"role": "system", "content": "prompt"}, {"role": "user", "content": "profile"},
+           {"role": "assistant", "content": "report"}]
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().testdb
+
+
+def test_session_is_shared_between_store_instances(db):
+    # Two workers each build their own ChatStore over the same database
+    first, second = ChatStore(db), ChatStore(db)
+    assessment_id = ObjectId()
+    first.start_session(assessment_id, "finance", OPENING, has_context=True)
+    first.append_turn(assessment_id, "question", "answer")
+
+    session = second.load_session(str(assessment_id))
+    assert session["domain"] == "finance"
+    assert session["has_context"] is True
+    assert session["messages"] == OPENING
+    assert [turn["user_message"] for turn in session["turns"]] == ["question"]
+
+
+def test_unknown_session(db):
+    assert ChatStore(db).load_session(ObjectId()) is None
+
+
+def test_session_keeps_only_recent_turns(db):
+    store = ChatStore(db, bucket_size=3)
+    assessment_id = ObjectId()
+    store.start_session(assessment_id, "health", OPENING, has_context=False)
+    for i in range(7):
+        store.append_turn(assessment_id, f"q{i}", f"a{i}", START + timedelta(seconds=i))
+    turns = store.load_session(assessment_id, max_turns=4)["turns"]
+    assert [turn["user_message"] for turn in turns] == ["q3", "q4", "q5", "q6"]
+
+
+def test_full_bucket_rolls_over(db):
+    store = ChatStore(db, bucket_size=3)
+    assessment_id = ObjectId()
+    for i in range(7):
+        store.append_turn(assessment_id, f"q{i}", f"a{i}", START + timedelta(seconds=i))
+    buckets = list(db.chat_buckets.find({"assessment_id": assessment_id}).sort("start_ts", 1))
+    assert [bucket["count"] for bucket in buckets] == [3, 3, 1]
+    assert [len(bucket["turns"]) for bucket in buckets] == [3, 3, 1]
+    assert buckets[1]["start_ts"] == START + timedelta(seconds=3)
+    assert buckets[1]["end_ts"] == START + timedelta(seconds=5)
+
+
+def test_late_turns_keep_the_bucket_sorted(db):
+    store = ChatStore(db, bucket_size=5)
+    assessment_id = ObjectId()
+    for i in (2, 0, 1):
+        store.append_turn(assessment_id, f"q{i}", f"a{i}", START + timedelta(seconds=i))
+    bucket = db.chat_buckets.find_one({"assessment_id": assessment_id})
+    assert [turn["user_message"] for turn in bucket["turns"]] == ["q0", "q1", "q2"]
+    assert bucket["start_ts"] == START and bucket["end_ts"] == START + timedelta(seconds=2)
+
+
+def test_pages_walk_back_across_buckets(db):
+    store = ChatStore(db, bucket_size=3)
+    assessment_id = ObjectId()
+    for i in range(8):
+        store.append_turn(assessment_id, f"q{i}", f"a{i}", START + timedelta(seconds=i))
+    seen = []
+    before = None
+    while True:
+        page = store.get_turns(assessment_id, limit=3, before=before)
+        seen = [turn["user_message"] for turn in page["turns"]] + seen
+        if not page["next_before"]:
+            break
+        before = datetime.fromisoformat(page["next_before"])
+    assert seen == [f"q{i}" for i in range(8)]
+
+
+def test_index_failures_do_not_stop_startup(db, monkeypatch):
+    def unavailable(*args, **kwargs):
+        raise ServerSelectionTimeoutError("no primary")
+
+    monkeypatch.setattr(mongomock.collection.Collection, "create_index", unavailable)
+    store = ChatStore(db)
+    store.append_turn(ObjectId(), "question", "answer")
@@ -0,0 +1,51 @@
+from context_packer import EMPTY_CONTEXT, HEADER, estimate_tokens, pack_documents, split_sentences
+
+DOCUMENTS = [
+    {"title": "Emergency Funds", "content": "Keep three to six months of expenses in savings. "
+                                            "Store the emergency fund in a liquid account. "
+                                            "Review the target after major life changes."},
+    {"title": "Savings Basics", "content": "Keep three to six months of expenses in savings! "
+                                           "Automate transfers into a high-yield savings account."},
+    {"title": "Debt Management", "content": "Pay high-interest credit card debt first. "
+                                            "Keep total debt payments below 36% of gross income."}
+]
+
+
+def test_split_sentences():
+    assert split_sentences("One. Two! 3 is next? (Four) ok. e.g. lower") == ["One.", "Two!", "3 is next?",
+                                                                            "(Four) ok. e.g. lower"]
+    assert split_sentences("") == []
+
+
+def test_everything_fits_under_a_generous_budget():
+    context, stats = pack_documents(DOCUMENTS, token_budget=10000)
+    assert context.startswith(HEADER)
+    assert stats["documents_used"] == 3
+    # The repeated sentence of the second document is dropped as a near-duplicate
+    assert stats["duplicates_removed"] == 1
+    assert context.count("Keep three to six months") == 1
+    assert "2. Savings Basics:\nAutomate transfers" in context
+    assert stats["packed_tokens"] == estimate_tokens(context) < stats["original_tokens"]
+
+
+def test_packing_respects_the_budget_and_covers_each_document_first():
+    budget = 90
+    context, stats = pack_documents(DOCUMENTS, token_budget=budget)
+    assert estimate_tokens(context) <= budget
+    assert stats["documents_used"] == 3
+    assert "Review the target" not in context
+
+
+def test_query_relevant_sentences_win_the_remaining_budget():
+    # With room for one sentence past each document's first, rank order alone picks the second
+    # sentence of the top document; a query moves that slot to the sentence it matches
+    context, _ = pack_documents(DOCUMENTS, token_budget=90)
+    assert "liquid account" in context and "36%" not in context
+    context, _ = pack_documents(DOCUMENTS, query="debt payments gross income", token_budget=90)
+    assert "36% of gross income" in context and "liquid account" not in context
+
+
+def test_nothing_fits():
+    context, stats = pack_documents(DOCUMENTS, token_budget=10)
+    assert context == EMPTY_CONTEXT and stats["documents_used"] == 0
+    assert pack_documents([])[1]["original_tokens"] == 0
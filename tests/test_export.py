@@ -0,0 +1,79 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from database import iter_analysis_history
+from export import DEFAULT_CSV_FIELDS, export_fields, stream_export
+
+DOCS = [
+    {"user_id": "a", "domain": "finance", "risk_score": 4.5, "timestamp": datetime(2024, 1, 2),
+     "personal_data": {"age": "30"}},
+    {"user_id": "b", "domain": "finance", "risk_score": 7.0, "timestamp": datetime(2024, 1, 1),
+     "report_source": "template", "guidelines": ["Emergency fund"]},
+    {"user_id": "c", "domain": "health", "risk_score": 2.0, "timestamp": datetime(2024, 1, 3)}
+]
+
+
+@pytest.fixture
+def collection():
+    collection = mongomock.MongoClient().testdb.assessments
+    collection.insert_many([dict(doc) for doc in DOCS])
+    return collection
+
+
+def read_csv(chunks):
+    return list(csv.reader(io.StringIO(b"".join(chunks).decode("utf-8"))))
+
+
+def test_fields_are_the_query_projection(collection):
+    docs = list(iter_analysis_history(collection, domain="finance", fields=["risk_score", "report_source"]))
+    assert docs == [{"risk_score": 4.5}, {"risk_score": 7.0, "report_source": "template"}]
+    docs = list(iter_analysis_history(collection, domain="health", fields=["_id", "user_id"]))
+    assert set(docs[0]) == {"_id", "user_id"}
+    assert "_id" not in next(iter_analysis_history(collection))
+
+
+def test_csv_header_is_the_requested_fields(collection):
+    fields = export_fields("csv", "risk_score,report_source,user_id")
+    rows = read_csv(stream_export(iter_analysis_history(collection, domain="finance", fields=fields), "csv", fields))
+    # The first document has no report_source; the header still lists it and its cell is empty
+    assert rows == [["risk_score", "report_source", "user_id"], ["4.5", "", "a"], ["7.0", "template", "b"]]
+
+
+def test_csv_without_fields_uses_the_fixed_schema(collection):
+    fields = export_fields("csv")
+    docs = iter_analysis_history(collection, start=datetime(2024, 1, 1), fields=fields)
+    rows = read_csv(stream_export(docs, "csv", fields))
+    assert rows[0] == DEFAULT_CSV_FIELDS
+    assert [row[0] for row in rows[1:]] == ["b", "a", "c"]
+    assert rows[1][DEFAULT_CSV_FIELDS.index("guidelines")] == '["Emergency fund"]'
+    assert rows[1][DEFAULT_CSV_FIELDS.index("timestamp")] == "2024-01-01T00:00:00"
+
+
+def test_empty_csv_export_still_has_a_header():
+    assert read_csv(stream_export(iter([]), "csv", ["user_id"])) == [["user_id"]]
+
+
+def test_ndjson_export_is_compressed_on_request(collection):
+    fields = export_fields("ndjson", "user_id")
+    body = gzip.decompress(b"".join(stream_export(iter_analysis_history(collection, fields=fields),
+                                                  "ndjson", fields, compress=True)))
+    assert [json.loads(line) for line in body.splitlines()] == [{"user_id": "a"}, {"user_id": "b"}, {"user_id": "c"}]
+    assert export_fields("ndjson") is None
+
+
+@pytest.mark.parametrize("fields", ["personal_data.age", "$where", " , "])
+def test_invalid_fields_are_rejected(fields):
+    with pytest.raises(ValueError):
+        export_fields("csv", fields)
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        stream_export(iter([]), "xml")
@@ -0,0 +1,107 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from index_snapshot import IndexSnapshot, SnapshotIndex, build_snapshot
+from sequences import EMBEDDINGS_SEQUENCE, next_sequence
+
+DIM = 8
+CATEGORIES = ["budgeting", "debt", "investing", "liquidity"]
+
+
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient().testdb
+    rng = np.random.default_rng(7)
+    for i in range(120):
+        row = {"document_id": f"doc-{i:03d}", "domain": "finance" if i % 5 else "health",
+               "category": CATEGORIES[i % len(CATEGORIES)], "seq": next_sequence(db, EMBEDDINGS_SEQUENCE),
+               "keywords": [f"k{j}" for j in rng.choice(12, size=rng.integers(0, 4), replace=False)]}
+        if i % 11:
+            row["embedding"] = list(rng.normal(size=DIM))
+        db.embeddings.insert_one(row)
+    return db
+
+
+@pytest.fixture
+def snapshot(db, tmp_path):
+    version = build_snapshot(db.embeddings, str(tmp_path))
+    return IndexSnapshot(str(tmp_path), version)
+
+
+def test_per_row_data_is_memory_mapped(snapshot):
+    for array in (snapshot.matrix, snapshot.ids, snapshot.has_embedding, snapshot.keyword_ids,
+                  snapshot.keyword_offsets, snapshot.vocabulary):
+        assert isinstance(array, np.memmap)
+    assert not hasattr(snapshot, "document_ids")
+
+
+def test_rows_round_trip(db, snapshot):
+    assert snapshot.size == 120
+    for row in db.embeddings.find():
+        n = snapshot.row_of(row["document_id"])
+        assert snapshot.document_id(n) == row["document_id"]
+        assert snapshot.partition_of(n) == (row["domain"], row["category"])
+        assert snapshot.row_keywords(n) == set(row["keywords"])
+        assert bool(snapshot.has_embedding[n]) == ("embedding" in row)
+    assert snapshot.row_of("missing") is None
+
+
+def test_partition_totals_match_the_rows(db, snapshot):
+    stats = snapshot.category_stats["finance"]["debt"]
+    rows = list(db.embeddings.find({"domain": "finance", "category": "debt"}))
+    assert stats.count == len(rows)
+    assert stats.embedded == sum("embedding" in row for row in rows)
+    assert stats.keyword_docs == sum(bool(row["keywords"]) for row in rows)
+    expected = sum(np.asarray(row["embedding"]) / np.linalg.norm(row["embedding"]) for row in rows if "embedding" in row)
+    assert np.allclose(stats.vector_sum, expected)
+
+
+def test_batched_search_matches_single_queries(snapshot):
+    queries = np.random.default_rng(1).normal(size=(5, DIM))
+    for route in (True, False):
+        batch = snapshot.search_many(queries, "finance", 7, route=route)
+        for query, results in zip(queries, batch):
+            single = snapshot.search(query, "finance", 7, route=route)
+            assert [doc_id for _, doc_id in results] == [doc_id for _, doc_id in single]
+            assert [score for score, _ in results] == pytest.approx([score for score, _ in single], abs=1e-5)
+
+
+def test_keyword_search_counts_overlaps(db, snapshot):
+    query_keywords = [{"k1", "k2"}, {"k3"}, {"unknown"}, set()]
+    expected = []
+    for keywords in query_keywords:
+        scores = [(len(keywords & set(row["keywords"])), row["document_id"])
+                  for row in db.embeddings.find({"domain": "finance"})]
+        expected.append(sorted([score for score in scores if score[0] > 0], reverse=True)[:6])
+    for keywords, wanted in zip(query_keywords, expected):
+        assert snapshot.keyword_search(keywords, "finance", 6, route=False) == wanted
+    assert snapshot.keyword_search_many(query_keywords, "finance", 6, route=False) == expected
+    routed = snapshot.keyword_search_many(query_keywords, "finance", 6)
+    assert routed == [snapshot.keyword_search(keywords, "finance", 6) for keywords in query_keywords]
+
+
+def test_legacy_snapshots_are_rejected(db, tmp_path):
+    directory = str(tmp_path)
+    version = build_snapshot(db.embeddings, directory)
+    meta_path = os.path.join(directory, f"index-v{version}.json")
+    with open(meta_path) as f:
+        meta = json.load(f)
+    meta.pop("format")
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+    with pytest.raises(ValueError, match="rebuild"):
+        IndexSnapshot(directory, version)
+    assert SnapshotIndex(directory).current is None
+
+
+def test_old_versions_are_removed_with_their_arrays(db, tmp_path):
+    directory = str(tmp_path)
+    for _ in range(4):
+        version = build_snapshot(db.embeddings, directory)
+    versions = {name.split(".")[0] for name in os.listdir(directory) if name.startswith("index-v")}
+    assert versions == {f"index-v{version - 1}", f"index-v{version}"}
@@ -0,0 +1,211 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from index_snapshot import SnapshotIndex, build_lease, build_snapshot
+from live_index import LiveIndex
+from sequences import EMBEDDINGS_SEQUENCE, next_sequence
+
+DIM = 4
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().testdb
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path):
+    return str(tmp_path / "snapshots")
+
+
+def put(db, doc_id, category="liquidity", deleted=False):
+    """Write a document's embeddings row the way KnowledgeBase does: one current row per document"""
+    row = {"document_id": doc_id, "domain": "finance", "category": category, "keywords": [doc_id],
+           "seq": next_sequence(db, EMBEDDINGS_SEQUENCE), "updated_at": datetime.now()}
+    if deleted:
+        row["deleted"] = True
+    else:
+        row["embedding"] = list(np.random.default_rng(abs(hash(doc_id)) % 2 ** 32).random(DIM) + 0.1)
+    db.embeddings.find_one_and_replace({"document_id": doc_id}, row, upsert=True)
+    return row
+
+
+def start(db, snapshot_dir, **kwargs):
+    """A loaded index driven by the test instead of its sync thread"""
+    index = LiveIndex(db.embeddings, SnapshotIndex(snapshot_dir, check_interval=0), **kwargs)
+    index._pid = os.getpid()
+    index._load(index._usable_base(index.snapshots.maybe_reload(force=True)))
+    return index
+
+
+def sync(index):
+    """One pass of the polling loop"""
+    index._check_base()
+    index._catch_up(None, index.state.last_seq)
+
+
+class _NoThread:
+    def start(self):
+        pass
+
+
+def live_ids(index):
+    return {doc_id for _, doc_id in index.state.search(np.ones(DIM), "finance", 100)}
+
+
+def test_insert_and_delete_reach_another_index(db, snapshot_dir):
+    first, second = start(db, snapshot_dir), start(db, snapshot_dir)
+    first.apply(put(db, "a"))
+    first.apply(put(db, "b"))
+    assert live_ids(first) == {"a", "b"}
+    sync(second)
+    assert live_ids(second) == {"a", "b"}
+
+    first.apply(put(db, "a", deleted=True))
+    sync(second)
+    assert live_ids(first) == live_ids(second) == {"b"}
+
+
+def test_changes_are_replayed_onto_a_new_base(db, snapshot_dir):
+    index = start(db, snapshot_dir)
+    for doc_id in ("a", "b", "c"):
+        index.apply(put(db, doc_id))
+    index.apply(put(db, "a", deleted=True))
+    build_snapshot(db.embeddings, snapshot_dir)
+    # Written after the snapshot, so only the replay can bring them in
+    index.apply(put(db, "b", category="debt"))
+    index.apply(put(db, "c", deleted=True))
+    index.apply(put(db, "d"))
+
+    sync(index)
+    state = index.state
+    assert state.base is not None and [state.base.document_id(row) for row in range(state.base.size)] == ["b", "c"]
+    assert live_ids(index) == {"b", "d"}
+    assert state.base_tombstones == 2 and state.size == 2
+    # Only changes newer than the base are tracked; the delete of "a" is covered by it
+    assert set(state.doc_seq) == {"b", "c", "d"}
+    assert set(state.locations) == {"b", "d"}
+
+
+def test_compaction_publishes_a_snapshot_and_resets_tombstones(db, snapshot_dir):
+    for doc_id in "abcdef":
+        put(db, doc_id)
+    build_snapshot(db.embeddings, snapshot_dir)
+    index = start(db, snapshot_dir, compaction_threshold=0.2)
+    index.apply(put(db, "a", deleted=True))
+    index.apply(put(db, "b", deleted=True))
+    index.apply(put(db, "g"))
+    assert index.state.tombstone_ratio >= 0.2
+
+    result = index.compact()
+    assert result["compacted"] and result["snapshot_version"] == 2
+    state = index.state
+    assert state.base.version == 2
+    assert state.base_tombstones == state.delta_tombstones == 0
+    assert live_ids(index) == set("cdefg")
+
+
+def test_delta_compaction_drops_dead_rows(db, snapshot_dir):
+    index = start(db, snapshot_dir)
+    for doc_id in "abcd":
+        index.apply(put(db, doc_id))
+    index.apply(put(db, "a", deleted=True))
+    index.apply(put(db, "b", category="debt"))
+    assert index.state.delta_tombstones == 2
+
+    index.compact()
+    assert index.state.delta_tombstones == 0 and index.state.size == 3
+    assert live_ids(index) == set("bcd")
+
+
+def test_compaction_backs_off_while_another_worker_holds_the_lease(db, snapshot_dir, monkeypatch):
+    for doc_id in "abcdef":
+        put(db, doc_id)
+    build_snapshot(db.embeddings, snapshot_dir)
+    index = start(db, snapshot_dir, compaction_threshold=0.2, compaction_retry_sec=60)
+    index.apply(put(db, "a", deleted=True))
+    index.apply(put(db, "b", deleted=True))
+    started = []
+    monkeypatch.setattr("live_index.threading.Thread", lambda **kwargs: started.append(kwargs) or _NoThread())
+
+    with build_lease(db, snapshot_dir):
+        # The other worker's build is in progress: this one neither builds nor keeps retrying
+        result = index.compact()
+        assert not result["compacted"] and result["snapshot_version"] is None
+        assert result["retry_in_sec"] == 60
+        assert index.state.base_tombstones == 2
+        index._check_compaction()
+        index._next_compaction = 0.0
+        index._check_compaction()
+        assert started == []
+
+    # The other worker publishes; this one adopts the snapshot instead of compacting
+    build_snapshot(db.embeddings, snapshot_dir)
+    sync(index)
+    assert index.state.base.version == 2 and index.state.tombstones == 0
+    index._check_compaction()
+    assert started == []
+
+
+def test_failed_snapshot_build_backs_off(db, snapshot_dir, monkeypatch):
+    for doc_id in "abcd":
+        put(db, doc_id)
+    build_snapshot(db.embeddings, snapshot_dir)
+    index = start(db, snapshot_dir, compaction_threshold=0.2, compaction_retry_sec=60)
+    index.apply(put(db, "a", deleted=True))
+
+    def fail(*args, **kwargs):
+        raise PermissionError("snapshot directory is read-only")
+    monkeypatch.setattr("live_index.build_snapshot", fail)
+    result = index.compact()
+    assert not result["compacted"] and "read-only" in result["reason"]
+    assert index._next_compaction > 0 and index.compact()["retry_in_sec"] == 120
+
+
+def test_base_stats_are_seeded_from_the_snapshot(db, snapshot_dir):
+    for doc_id, category in zip("abcde", ["liquidity", "debt", "liquidity", "debt", "liquidity"]):
+        put(db, doc_id, category=category)
+    build_snapshot(db.embeddings, snapshot_dir)
+    index = start(db, snapshot_dir)
+    state = index.state
+
+    def expected(category, doc_ids):
+        vectors = [np.asarray(row["embedding"]) / np.linalg.norm(row["embedding"])
+                   for row in db.embeddings.find({"document_id": {"$in": list(doc_ids)}})]
+        stats = state.stats["finance"][category]
+        assert stats.count == stats.embedded == stats.keyword_docs == len(doc_ids)
+        assert {keyword: n for keyword, n in stats.keyword_counts.items() if n} == {doc_id: 1 for doc_id in doc_ids}
+        np.testing.assert_allclose(stats.vector_sum, np.sum(vectors, axis=0), rtol=1e-6)
+
+    expected("liquidity", "ace")
+    expected("debt", "bd")
+    # The worker's stats are its own copy: removing a base row leaves the snapshot's totals alone
+    index.apply(put(db, "a", deleted=True))
+    expected("liquidity", "ce")
+    assert state.base.category_stats["finance"]["liquidity"].count == 3
+
+
+def test_batched_search_reads_base_spans_and_delta_alike(db, snapshot_dir):
+    for i, doc_id in enumerate("abcdefgh"):
+        put(db, doc_id, category=["liquidity", "debt"][i % 2])
+    build_snapshot(db.embeddings, snapshot_dir)
+    index = start(db, snapshot_dir)
+    index.apply(put(db, "a", deleted=True))
+    index.apply(put(db, "c", category="debt"))
+    index.apply(put(db, "i"))
+    state = index.state
+
+    queries = np.random.default_rng(3).random((3, DIM))
+    for query, results in zip(queries, state.search_many(queries, "finance", 5)):
+        single = state.search(query, "finance", 5)
+        assert [doc_id for _, doc_id in results] == [doc_id for _, doc_id in single]
+        assert [score for score, _ in results] == pytest.approx([score for score, _ in single], abs=1e-5)
+    keywords = [{"a", "b", "c"}, {"i", "h"}, {"z"}]
+    assert state.keyword_search_many(keywords, "finance", 5) == \
+        [state.keyword_search(query_keywords, "finance", 5) for query_keywords in keywords]
+    assert state.keyword_search({"a", "b", "c"}, "finance", 5) == [(1, "c"), (1, "b")]
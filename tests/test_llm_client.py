@@ -0,0 +1,154 @@
+import itertools
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import llm_client
+from llm_client import (CircuitBreaker, CircuitOpenError, LLMTimeoutError, LLMUnavailableError, ResilientLLM,
+                        is_retryable)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+class FakeClient:
+    """chat.completions.create returning or raising the scripted outcomes in order"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = iter(outcomes)
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        with self._lock:
+            self.calls += 1
+            outcome = next(self.outcomes)
+        if callable(outcome):
+            outcome = outcome()
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(llm_client.random, "uniform", lambda low, high: 0.0)
+
+
+def test_breaker_opens_after_consecutive_failures_and_recovers_through_one_trial(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_client.time, "monotonic", clock)
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow_request()
+
+    clock.now += 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request() and not breaker.allow_request()
+    # A failed trial reopens the breaker for another full reset timeout
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 29
+    assert not breaker.allow_request()
+
+    clock.now += 1
+    assert breaker.allow_request()
+    breaker.release_trial()
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow_request() and breaker.allow_request()
+
+
+@pytest.mark.parametrize("error,retryable", [
+    (ConnectionError(), True), (TimeoutError(), True), (StatusError(429), True), (StatusError(503), True),
+    (StatusError(400), False), (StatusError(401), False), (ValueError(), False)
+])
+def test_is_retryable(error, retryable):
+    assert is_retryable(error) is retryable
+
+
+def test_transient_errors_are_retried(no_backoff):
+    client = FakeClient(StatusError(503), ConnectionError(), "ok")
+    llm = ResilientLLM(client, max_retries=2, hedge_enabled=False)
+    assert llm.create(model="m") == "ok"
+    stats = llm.stats()
+    assert (client.calls, stats["retries"], stats["successes"], stats["failures"]) == (3, 2, 1, 0)
+
+
+def test_exhausted_retries_count_against_the_breaker(no_backoff):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    llm = ResilientLLM(FakeClient(*[StatusError(500)] * 4), max_retries=1, hedge_enabled=False, breaker=breaker)
+    for _ in range(2):
+        with pytest.raises(LLMUnavailableError):
+            llm.create(model="m")
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        llm.create(model="m")
+    assert llm.client.calls == 4
+    assert llm.stats()["short_circuited"] == 1
+
+
+def test_client_errors_are_not_retried_and_do_not_trip_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    llm = ResilientLLM(FakeClient(StatusError(400), "ok"), max_retries=3, hedge_enabled=False, breaker=breaker)
+    with pytest.raises(StatusError):
+        llm.create(model="m")
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert llm.create(model="m") == "ok"
+    assert llm.stats()["client_errors"] == 1
+
+
+def test_calls_past_the_deadline_time_out():
+    llm = ResilientLLM(FakeClient(lambda: time.sleep(0.5) or "late"), timeout_sec=0.05, hedge_enabled=False,
+                       breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+    with pytest.raises(LLMTimeoutError):
+        llm.create(model="m")
+    assert llm.stats()["timeouts"] == 1
+    assert llm.breaker.state == CircuitBreaker.OPEN
+
+
+def test_slow_calls_are_hedged_once_latency_is_calibrated():
+    release = threading.Event()
+    # The primary stalls until the test ends; its duplicate answers right away
+    client = FakeClient(lambda: release.wait(5) and "primary", "hedge")
+    llm = ResilientLLM(client, timeout_sec=5, hedge_enabled=True, hedge_percentile=50, hedge_min_samples=3)
+    assert llm._hedge_delay() is None
+    for _ in range(3):
+        llm.latencies.record(0.02)
+    try:
+        assert llm.create(model="m") == "hedge"
+    finally:
+        release.set()
+    stats = llm.stats()
+    assert (client.calls, stats["hedges"], stats["hedge_wins"]) == (2, 1, 1)
+    assert stats["hedge_delay_sec"] == pytest.approx(0.02, abs=0.01)
+
+
+def test_fast_calls_are_not_hedged():
+    llm = ResilientLLM(FakeClient(*itertools.repeat("ok", 5)), hedge_enabled=True, hedge_percentile=50,
+                       hedge_min_samples=1)
+    llm.latencies.record(1.0)
+    for _ in range(5):
+        assert llm.create(model="m") == "ok"
+    assert llm.stats()["hedges"] == 0 and llm.client.calls == 5
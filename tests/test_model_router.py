@@ -0,0 +1,58 @@
+import pytest
+
+from context_packer import pack_documents
+from model_router import ModelRouter, classify_message
+
+
+@pytest.mark.parametrize("message,intent", [
+    ("thanks!", "acknowledgement"),
+    ("", "acknowledgement"),
+    ("What is a good emergency fund?", "clarification"),
+    ("Can you give me a detailed plan to pay down my credit cards?", "deep"),
+    (" ".join(["word"] * 41), "deep")
+])
+def test_classify_message(message, intent):
+    assert classify_message(message) == intent
+
+
+def test_analyze_routes_to_the_large_tier():
+    decision = ModelRouter().route("analyze", domain="finance")
+    assert decision.tier == "large"
+    assert decision.max_tokens == 2048
+
+
+def test_chat_budget_follows_intent():
+    router = ModelRouter()
+    assert router.route("chat", message="thanks", has_context=True).max_tokens == 128
+    assert router.route("chat", message="Why?", has_context=True).tier == "mini"
+    assert router.route("chat", message="Explain my portfolio allocation", has_context=True).tier == "large"
+
+
+def test_ungrounded_chat_goes_to_the_small_tier():
+    router = ModelRouter()
+    # A question too long for the clarification budget falls through to the grounding rules
+    message = ("Is the recommended proportion of gross household earnings allocated toward comprehensive homeowners "
+               "insurance premiums, including supplementary catastrophe protections, internationally uncontroversial?")
+    assert classify_message(message) == "clarification" and len(message) > 200
+    assert router.route("chat", message=message, has_context=True).tier == "large"
+    assert router.route("chat", message=message, has_context=False).tier == "mini"
+
+
+def test_empty_packing_does_not_count_as_context():
+    # /analyze derives has_context from documents_used, not from the (placeholder) context text
+    context, stats = pack_documents([])
+    assert context
+    assert stats["documents_used"] == 0
+    long_document = {"title": "Guide", "content": "A sentence that is far too long to fit. " * 50}
+    _, stats = pack_documents([long_document], token_budget=20)
+    assert stats["documents_used"] == 0
+
+
+def test_max_tokens_is_capped_by_the_tier():
+    router = ModelRouter(rules=[{"route": "chat", "tier": "mini", "max_tokens": 100000}])
+    assert router.route("chat", message="hello there friend").max_tokens == router.tiers["mini"]["max_tokens"]
+
+
+def test_unknown_tier_is_rejected():
+    with pytest.raises(ValueError):
+        ModelRouter(rules=[{"route": "chat", "tier": "huge"}])
@@ -0,0 +1,59 @@
+import pytest
+
+from report_generator import HIGH, LOW, MODERATE, financial_risk_factors, generate_report, health_risk_factors
+
+FINANCE = {"age": "30", "income": "60000", "monthly_expenses": "3000", "emergency_fund": "1500",
+           "liabilities": "10000", "tolerance": "moderate", "time_horizon": "10", "savings_rate": "15"}
+HEALTH = {"height": "175", "weight": "70", "stress": "3", "sleep": "8", "exercise": "regular",
+          "smoking": "never", "alcohol": "none", "diet": "good", "family_history": "none"}
+
+
+def levels(factors):
+    return {factor["name"]: factor["level"] for factor in factors}
+
+
+def test_financial_factors_follow_the_profile():
+    factors = levels(financial_risk_factors(FINANCE))
+    assert factors["Liquidity Risk"] == HIGH
+    assert factors["Debt Risk"] == LOW
+    assert levels(financial_risk_factors({**FINANCE, "emergency_fund": "30000"}))["Liquidity Risk"] == LOW
+    assert levels(financial_risk_factors({**FINANCE, "liabilities": "30000"}))["Debt Risk"] == HIGH
+
+
+def test_missing_and_malformed_inputs_do_not_fail():
+    factors = levels(financial_risk_factors({"income": "lots", "monthly_expenses": ""}))
+    assert factors["Liquidity Risk"] == MODERATE and factors["Debt Risk"] == MODERATE
+    assert len(health_risk_factors({})) == 5
+
+
+def test_health_factors_follow_the_profile():
+    assert set(levels(health_risk_factors(HEALTH)).values()) == {LOW}
+    risky = levels(health_risk_factors({**HEALTH, "smoking": "regular", "weight": "110", "exercise": "none",
+                                        "family_history": "multiple"}))
+    assert risky["Cardiovascular Risk"] == risky["Metabolic Risk"] == risky["Genetic Risk"] == HIGH
+
+
+def test_report_mirrors_the_llm_sections_and_cites_guidelines():
+    documents = [{"title": "Emergency Fund Basics", "category": "liquidity_risk"},
+                 {"title": "Debt Ratios", "category": "debt_risk"}]
+    report, factors = generate_report("finance", FINANCE, 6.2, "Moderate Risk", documents)
+    for heading in ("🎯 EXECUTIVE SUMMARY", "📊 COMPREHENSIVE FINANCIAL ANALYSIS",
+                    "💡 PERSONALIZED FINANCIAL RECOMMENDATIONS", "📚 GUIDELINES CONSULTED"):
+        assert heading in report
+    assert "Overall Financial Risk Score: 6.2/10" in report
+    assert "Areas needing attention: Liquidity Risk" in report
+    assert "   Reference: Emergency Fund Basics" in report
+    # The most urgent recommendation leads
+    recommendations = report.split("💡 PERSONALIZED FINANCIAL RECOMMENDATIONS\n")[1].splitlines()
+    assert recommendations[0] == f"- {factors[0]['recommendation']}"
+
+
+def test_report_without_guidelines():
+    report, _ = generate_report("health", HEALTH, 2.0, "Low Risk")
+    assert "COMPREHENSIVE HEALTH ANALYSIS" in report
+    assert "GUIDELINES CONSULTED" not in report and "Reference:" not in report
+
+
+def test_domains_without_a_template_are_rejected():
+    with pytest.raises(ValueError):
+        generate_report("travel", {}, 5.0, "Moderate Risk")
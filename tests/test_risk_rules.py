@@ -0,0 +1,90 @@
+import json
+import math
+
+import numpy as np
+import pytest
+
+from risk_rules import DEFAULT_RULESETS, CompiledRuleset, RiskRules, coerce
+
+FINANCE = CompiledRuleset("finance", DEFAULT_RULESETS["finance"])
+HEALTH = CompiledRuleset("health", DEFAULT_RULESETS["health"])
+
+PROFILE = {"age": "30", "income": "60000", "monthly_expenses": "3000", "emergency_fund": "5000",
+           "liabilities": "10000", "tolerance": "aggressive", "time_horizon": "3", "savings_rate": "15"}
+
+
+def test_finance_profile_score():
+    # 5 base + 1.0 (under 3 months covered) - 0.3 (debt ratio under 0.2) + 0.8 (aggressive, short horizon)
+    assert FINANCE.score(PROFILE) == pytest.approx(6.5)
+    assert FINANCE.category(FINANCE.score(PROFILE)) == "Moderate Risk"
+
+
+def test_unparseable_field_ends_scoring_at_its_first_rule():
+    assert FINANCE.score({"age": "20", "savings_rate": "5"}) == pytest.approx(6.2)
+    # The savings rule is never reached, rather than scored with the default
+    assert FINANCE.score({"age": "20", "savings_rate": "lots"}) == pytest.approx(5.5)
+
+
+def test_thresholds_are_inclusive_as_written():
+    assert HEALTH.score({"stress": 8}) - HEALTH.score({"stress": 7}) == pytest.approx(0.5)
+    # bmi 24.9 is in the healthy band (le), just above it is not
+    height = 2.0
+    healthy = HEALTH.score({"height": height * 100, "weight": 24.9 * height ** 2})
+    overweight = HEALTH.score({"height": height * 100, "weight": math.nextafter(24.9, 30) * height ** 2})
+    assert healthy < overweight
+    assert HEALTH.score({"sleep": float("nan")}) == HEALTH.score({"sleep": 6.5})
+
+
+@pytest.mark.parametrize("ruleset", [FINANCE, HEALTH], ids=lambda ruleset: ruleset.domain)
+def test_scalar_and_vectorized_scores_agree(ruleset):
+    rng = np.random.default_rng(7)
+    edges = [edge for rule in ruleset.rules for encoder in rule.encoders if not encoder.categorical
+             for edge in encoder.edges]
+    strings = sorted({key for rule in ruleset.rules for encoder in rule.encoders if encoder.categorical
+                      for key in encoder.keys}) + ["other"]
+    columns = {}
+    for name, (_, kind) in ruleset.fields.items():
+        if kind == "str":
+            values = rng.choice(strings, 2000)
+        else:
+            # Thresholds, the values next to them, and anything in between
+            values = np.concatenate([edges, np.nextafter(edges, -np.inf), rng.uniform(-10, 200000, 2000)])
+            values = rng.choice(np.concatenate([values, rng.uniform(0, 40, 2000)]), 2000)
+        columns[name] = coerce(values, kind)
+    vectorized = ruleset.scores(columns)
+    for i in range(2000):
+        profile = {name: column[i].item() for name, column in columns.items()}
+        assert ruleset.score(profile) == vectorized[i]
+    assert list(ruleset.categories(vectorized[:50])) == [ruleset.category(score) for score in vectorized[:50]]
+
+
+@pytest.mark.parametrize("spec, message", [
+    ({"fields": {"a": {"type": "decimal"}}}, "unknown type"),
+    ({"fields": {"a": {"type": "float"}}, "rules": [{"field": "b", "bands": [{"lt": 1, "weight": 1}]}]},
+     "unknown value"),
+    ({"fields": {"a": {"type": "str"}}, "rules": [{"field": "a", "bands": [{"lt": 1, "weight": 1}]}]},
+     "cannot apply"),
+    ({"fields": {"a": {"type": "float"}}, "rules": [{"field": "a", "bands": [{"lt": "x", "weight": 1}]}]},
+     "finite numeric threshold"),
+    ({"fields": {"a": {"type": "float"}}, "derived": {"b": ["mod", "a", 2]}}, "must be [op, a, b]"),
+])
+def test_invalid_rulesets_are_rejected(spec, message):
+    with pytest.raises(ValueError, match=message.replace("[", r"\[").replace("]", r"\]")):
+        CompiledRuleset("custom", spec)
+
+
+def test_rulesets_reload_from_directory(tmp_path):
+    rules = RiskRules(str(tmp_path), check_interval=0)
+    spec = {"fields": {"x": {"type": "float", "default": 0}}, "base": 1,
+            "rules": [{"field": "x", "bands": [{"gt": 10, "weight": 2}]}]}
+    (tmp_path / "custom.json").write_text(json.dumps(spec))
+    assert rules.maybe_reload(force=True) == ["custom"]
+    assert rules.get("custom").score({"x": 11}) == 3
+
+    # A broken file is logged and the compiled version keeps serving
+    (tmp_path / "custom.json").write_text("{not json")
+    rules._mtimes.clear()
+    assert rules.maybe_reload(force=True) == []
+    assert rules.get("custom").score({"x": 11}) == 3
+    with pytest.raises(ValueError):
+        rules.get("unknown")
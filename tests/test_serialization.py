@@ -0,0 +1,67 @@
+import gzip
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from bson import ObjectId
+from flask import Flask
+
+import serialization
+from serialization import accepts_gzip, dumps, gzip_chunks, json_list_chunks, stream_json_list
+
+app = Flask(__name__)
+DOC = {"_id": ObjectId("65f000000000000000000001"), "at": datetime(2024, 3, 1, 9, 30),
+       "score": np.float32(6.5), "bins": np.arange(3), "tags": {"a"}, "amount": Decimal("1.5")}
+EXPECTED = {"_id": "65f000000000000000000001", "at": "2024-03-01T09:30:00", "score": 6.5, "bins": [0, 1, 2],
+            "tags": ["a"], "amount": 1.5}
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_both_encoders_render_bson_and_numpy_types_alike(monkeypatch, use_orjson):
+    if use_orjson and not serialization.HAS_ORJSON:
+        pytest.skip("orjson is not installed")
+    monkeypatch.setattr(serialization, "HAS_ORJSON", use_orjson)
+    assert json.loads(dumps(DOC)) == EXPECTED
+
+
+def test_list_chunks_form_one_document():
+    items = [{"n": i, "text": "x" * 50} for i in range(40)]
+    chunks = list(json_list_chunks("history", items, extra={"count": 40}, chunk_bytes=256))
+    assert len(chunks) > 1
+    assert json.loads(b"".join(chunks)) == {"count": 40, "history": items}
+    assert json.loads(b"".join(json_list_chunks("history", []))) == {"history": []}
+
+
+def test_gzip_chunks_round_trip():
+    chunks = [b"line %d\n" % i for i in range(1000)]
+    assert gzip.decompress(b"".join(gzip_chunks(chunks))) == b"".join(chunks)
+
+
+@pytest.mark.parametrize("header,expected", [
+    ("gzip, deflate", True), ("br;q=1.0, *", True), ("gzip;q=0", False), ("identity", False), ("", False)
+])
+def test_accepts_gzip(header, expected):
+    with app.test_request_context(headers={"Accept-Encoding": header}):
+        assert accepts_gzip() is expected
+
+
+def failing_after(count):
+    for i in range(count):
+        yield {"n": i}
+    raise RuntimeError("cursor lost")
+
+
+def test_query_errors_surface_before_the_response_starts():
+    with app.test_request_context():
+        with pytest.raises(RuntimeError):
+            stream_json_list("history", failing_after(0))
+
+
+def test_mid_stream_errors_end_with_an_error_member():
+    with app.test_request_context():
+        response = stream_json_list("history", failing_after(3))
+        body = json.loads(b"".join(response.response))
+    assert body["history"] == [{"n": 0}, {"n": 1}, {"n": 2}]
+    assert "cursor lost" in body["error"]
@@ -0,0 +1,91 @@
+import pytest
+
+from config import Config
+from risk_rules import DEFAULT_RULESETS, CompiledRuleset
+from whatif import evaluate_whatif
+
+FINANCE = CompiledRuleset("finance", DEFAULT_RULESETS["finance"])
+PROFILE = {"age": "30", "income": "60000", "monthly_expenses": "3000", "emergency_fund": "5000",
+           "liabilities": "10000", "tolerance": "moderate", "time_horizon": "10", "savings_rate": "15"}
+
+
+def test_grid_matches_single_profile_scores():
+    result = evaluate_whatif(FINANCE, PROFILE, [
+        {"param": "savings_rate", "start": 0, "stop": 30, "step": 10},
+        {"param": "tolerance", "values": ["conservative", "aggressive"]}
+    ])
+    assert result["params"][0]["values"] == [0, 10, 20, 30]
+    assert len(result["scores"]) == 4 and len(result["scores"][0]) == 2
+    for i, rate in enumerate(result["params"][0]["values"]):
+        for j, tolerance in enumerate(result["params"][1]["values"]):
+            expected = FINANCE.score({**PROFILE, "savings_rate": rate, "tolerance": tolerance})
+            assert result["scores"][i][j] == pytest.approx(expected, abs=1e-4)
+    assert result["base"]["risk_score"] == pytest.approx(FINANCE.score(PROFILE))
+
+
+def test_stop_on_the_grid_is_included():
+    result = evaluate_whatif(FINANCE, PROFILE, [{"param": "savings_rate", "start": 0.1, "stop": 0.3, "step": 0.1}])
+    assert len(result["params"][0]["values"]) == 3
+
+
+def test_int_field_swept_in_fractional_steps_collapses_to_distinct_values():
+    result = evaluate_whatif(FINANCE, PROFILE, [{"param": "age", "start": 30, "stop": 32, "step": 0.5}])
+    assert result["params"][0]["values"] == [30, 31, 32]
+
+
+def test_category_flips_are_reported_along_each_axis():
+    profile = {**PROFILE, "tolerance": "aggressive", "time_horizon": "2", "savings_rate": "30"}
+    result = evaluate_whatif(FINANCE, profile, [
+        {"param": "emergency_fund", "values": [0, 3000, 9000]},
+        {"param": "liabilities", "values": [0, 100000]}
+    ])
+    assert result["categories"] == [["Moderate Risk", "High Risk"], ["Moderate Risk", "High Risk"],
+                                    ["Moderate Risk", "Moderate Risk"]]
+    assert result["flips"][0] == {"param": "emergency_fund", "from_value": 3000.0, "to_value": 9000.0,
+                                  "from_category": "High Risk", "to_category": "Moderate Risk",
+                                  "at": {"liabilities": 100000.0}}
+    assert [flip["at"] for flip in result["flips"][1:]] == [{"emergency_fund": 0.0}, {"emergency_fund": 3000.0}]
+
+
+@pytest.mark.parametrize("sweeps", [
+    {"param": "savings_rate", "start": 0, "stop": 10},
+    ["savings_rate"],
+    [{"start": 0, "stop": 10}],
+    [{"param": ["savings_rate"], "values": [1]}],
+    [],
+    [{"param": "savings_rate", "values": [1]}] * 3
+])
+def test_malformed_sweeps_are_value_errors(sweeps):
+    with pytest.raises(ValueError):
+        evaluate_whatif(FINANCE, PROFILE, sweeps)
+
+
+@pytest.mark.parametrize("spec", [
+    {"param": "unknown", "values": [1]},
+    {"param": "savings_rate", "start": 10, "stop": 0},
+    {"param": "savings_rate", "start": 0, "stop": 10, "step": 0},
+    {"param": "savings_rate", "start": 0, "stop": float("inf")},
+    {"param": "savings_rate", "values": []},
+    {"param": "savings_rate", "values": [[1, 2]]},
+    {"param": "tolerance", "start": 0, "stop": 1}
+])
+def test_invalid_sweep_specs(spec):
+    with pytest.raises(ValueError):
+        evaluate_whatif(FINANCE, PROFILE, [spec])
+
+
+def test_scenario_limit_is_checked_before_allocation():
+    limit = Config.WHATIF_MAX_SCENARIOS
+    with pytest.raises(ValueError, match="limit"):
+        evaluate_whatif(FINANCE, PROFILE, [{"param": "income", "start": 0, "stop": 1e300, "step": 1}])
+    side = int(limit ** 0.5) + 1
+    with pytest.raises(ValueError, match="limit"):
+        evaluate_whatif(FINANCE, PROFILE, [
+            {"param": "income", "start": 1, "stop": side, "step": 1},
+            {"param": "savings_rate", "start": 1, "stop": side, "step": 1}
+        ])
+
+
+def test_non_object_profile_is_rejected():
+    with pytest.raises(ValueError):
+        evaluate_whatif(FINANCE, ["age"], [{"param": "age", "values": [30]}])
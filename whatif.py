@@ -0,0 +1,118 @@
+import math
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from config import Config
+from risk_rules import CompiledRuleset, coerce
+
+# Grid evaluation of the compiled risk rules: swept parameters are laid along their own axes and
+# the vectorized scorer evaluates every scenario at once by broadcasting.
+
+
+def _sweep_range(spec: Dict[str, Any]) -> Tuple[float, float, int]:
+    """Start, step and point count of a start/stop/step sweep, validated before anything is allocated"""
+    start, stop = float(spec["start"]), float(spec["stop"])
+    step = float(spec.get("step", 1))
+    if not all(math.isfinite(value) for value in (start, stop, step)):
+        raise ValueError(f"Sweep for '{spec['param']}' needs finite start, stop and step")
+    if step <= 0 or stop < start:
+        raise ValueError(f"Sweep for '{spec['param']}' needs start <= stop and a positive step")
+    intervals = (stop - start) / step
+    if not intervals < Config.WHATIF_MAX_SCENARIOS:
+        raise ValueError(f"Sweep for '{spec['param']}' exceeds the limit of {Config.WHATIF_MAX_SCENARIOS} scenarios")
+    # Include stop when it lands on the grid, allowing for rounding in the division
+    whole = math.floor(intervals)
+    if math.isclose(intervals, whole + 1, rel_tol=1e-12):
+        whole += 1
+    return start, step, whole + 1
+
+
+def _sweep_size(spec: Dict[str, Any], kind: str) -> int:
+    if "values" in spec:
+        values = spec["values"]
+        if not isinstance(values, list) or not values or not all(isinstance(v, (int, float, str)) for v in values):
+            raise ValueError(f"Sweep for '{spec['param']}' needs a non-empty 'values' list of numbers or strings")
+        return len(values)
+    if kind == "str":
+        raise ValueError(f"Sweep for categorical '{spec['param']}' needs a 'values' list")
+    return _sweep_range(spec)[2]
+
+
+def _sweep_values(spec: Dict[str, Any], kind: str) -> np.ndarray:
+    if "values" in spec:
+        return coerce(spec["values"], kind)
+    start, step, count = _sweep_range(spec)
+    # Score the values /analyze would see; an int field swept in fractional steps collapses to distinct ints
+    values = coerce(start + step * np.arange(count), kind)
+    return np.unique(values) if kind == "int" else values
+
+
+def evaluate_whatif(ruleset: CompiledRuleset, base: Dict[str, Any], sweeps: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Score a base profile across a grid of one or two swept parameters"""
+    fields = ruleset.fields
+    if not isinstance(base, dict):
+        raise ValueError("'data' must be an object of profile fields")
+    if not isinstance(sweeps, list) or not all(isinstance(spec, dict) and isinstance(spec.get("param"), str) for spec in sweeps):
+        raise ValueError("'sweep' must be a list of objects, each with a 'param' name")
+    if not 1 <= len(sweeps) <= 2:
+        raise ValueError("Provide one or two parameter sweeps")
+
+    params = [spec["param"] for spec in sweeps]
+    for param in params:
+        if param not in fields:
+            raise ValueError(f"Unknown {ruleset.domain} parameter: {param}")
+    if len(set(params)) != len(params):
+        raise ValueError("Sweep parameters must be distinct")
+
+    # Check the grid size before any axis is materialized
+    scenarios = math.prod(_sweep_size(spec, fields[spec["param"]][1]) for spec in sweeps)
+    if scenarios > Config.WHATIF_MAX_SCENARIOS:
+        raise ValueError(f"Sweep produces {scenarios} scenarios; the limit is {Config.WHATIF_MAX_SCENARIOS}")
+    axes = [_sweep_values(spec, fields[spec["param"]][1]) for spec in sweeps]
+    shape = tuple(len(axis) for axis in axes)
+
+    base_columns = {}
+    for name, (default, kind) in fields.items():
+        value = base.get(name, default)
+        base_columns[name] = coerce(default if value in (None, "") else value, kind)
+    columns = dict(base_columns)
+    # Lay each swept axis along its own dimension so the grid is evaluated by broadcasting
+    for i, (param, axis) in enumerate(zip(params, axes)):
+        columns[param] = axis.reshape([-1 if j == i else 1 for j in range(len(axes))])
+
+    for name in ruleset.positive:
+        if np.any(columns[name] <= 0) or np.any(base_columns[name] <= 0):
+            raise ValueError(f"{name.replace('_', ' ').capitalize()} must be positive")
+
+    scores = np.broadcast_to(ruleset.scores(columns), shape)
+    categories = ruleset.categories(scores)
+    base_score = float(ruleset.scores(base_columns))
+
+    return {
+        "base": {"risk_score": base_score, "risk_category": ruleset.category(base_score)},
+        "params": [{"param": param, "values": axis.tolist()} for param, axis in zip(params, axes)],
+        "scores": np.round(scores, 4).tolist(),
+        "categories": categories.tolist(),
+        "flips": _category_flips(params, axes, categories)
+    }
+
+
+def _category_flips(params: List[str], axes: List[np.ndarray], categories: np.ndarray) -> List[Dict[str, Any]]:
+    """List the adjacent grid points along each swept axis where the risk category changes"""
+    flips = []
+    for axis_index, (param, axis) in enumerate(zip(params, axes)):
+        moved = np.moveaxis(categories, axis_index, -1)
+        changed = moved[..., 1:] != moved[..., :-1]
+        for position in zip(*np.nonzero(changed)):
+            *fixed, i = position
+            flip = {
+                "param": param,
+                "from_value": axis[i].item(),
+                "to_value": axis[i + 1].item(),
+                "from_category": str(moved[position]),
+                "to_category": str(moved[tuple(fixed) + (i + 1,)])
+            }
+            if fixed:
+                other = 1 - axis_index
+                flip["at"] = {params[other]: axes[other][fixed[0]].item()}
+            flips.append(flip)
+    return flips
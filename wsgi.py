@@ -0,0 +1,4 @@
+from app import app
+
+# WSGI entry point for production servers, e.g. `gunicorn -c gunicorn.conf.py wsgi:app`
+application = app